@@ -1,10 +1,39 @@
-from .config import OrchestratorConfig, ModelConfig
+from .config import OrchestratorConfig, ModelCatalog, ModelConfig, load_catalog
 from .llm_client import LLMClient, LLMResponse
 from .context import ContextManager, ContextItem
-from .state import CentralizedStateManager, StateUpdate
+from .blobs import BlobRef, BlobStore, BlobStoreFullError
+from .state import (
+    CentralizedStateManager,
+    HistoryPolicy,
+    StateBackend,
+    StateConflictError,
+    StateSnapshot,
+    StateUpdate,
+)
+from .state_sqlite import SQLiteStateManager
+from .wal import WriteAheadLog
+from .histogram import LatencyHistogram
+from .log_pipeline import GzipSink, LogPipeline, RotatingJSONLSink, StreamSink
+from .metrics import Counter, Gauge, Histogram, MetricsRegistry
 from .observability import AgentObservability, ObservabilityMetrics
-from .resilience import RetryConfig, execute_with_retry
+from .tracing import Span, Tracer
+from .run_history import MetricComparison, RunHistoryStore
+from .profiling import Profiler, SectionStats
+from .progress import ProgressDisplay
+from .prompt_analysis import render_with_composition
+from .resilience import (
+    CircuitBreaker,
+    CircuitBreakerConfig,
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+    RetryAttempt,
+    RetryBudget,
+    RetryConfig,
+    aexecute_with_retry,
+    execute_with_retry,
+)
 from .cost import CostRouter, TaskType
+from .routing import LatencyModel, LearnedRouter, RoutingDecision, TierStats
 from .agents import BaseAgent, ManagerAgent, WorkerAgent, StatefulAgentMixin
 from .chaining import ChainStep, ChainRunner
 from .prd_generator import PRDGeneratorWorkflow, PRDInput, PRDOutput
@@ -12,18 +41,57 @@ from .prd_generator import PRDGeneratorWorkflow, PRDInput, PRDOutput
 __all__ = [
     "OrchestratorConfig",
     "ModelConfig",
+    "ModelCatalog",
+    "load_catalog",
     "LLMClient",
     "LLMResponse",
     "ContextManager",
     "ContextItem",
+    "BlobRef",
+    "BlobStore",
+    "BlobStoreFullError",
     "CentralizedStateManager",
+    "HistoryPolicy",
+    "StateBackend",
+    "StateConflictError",
+    "StateSnapshot",
     "StateUpdate",
+    "SQLiteStateManager",
+    "WriteAheadLog",
+    "LatencyHistogram",
+    "LogPipeline",
+    "StreamSink",
+    "RotatingJSONLSink",
+    "GzipSink",
+    "MetricsRegistry",
+    "Counter",
+    "Gauge",
+    "Histogram",
     "AgentObservability",
     "ObservabilityMetrics",
+    "Span",
+    "Tracer",
+    "RunHistoryStore",
+    "MetricComparison",
+    "Profiler",
+    "SectionStats",
+    "ProgressDisplay",
+    "render_with_composition",
     "RetryConfig",
+    "RetryAttempt",
+    "RetryBudget",
     "execute_with_retry",
+    "aexecute_with_retry",
+    "CircuitBreaker",
+    "CircuitBreakerConfig",
+    "CircuitBreakerRegistry",
+    "CircuitOpenError",
     "CostRouter",
     "TaskType",
+    "LatencyModel",
+    "LearnedRouter",
+    "RoutingDecision",
+    "TierStats",
     "BaseAgent",
     "ManagerAgent",
     "WorkerAgent",
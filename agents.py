@@ -2,13 +2,17 @@ from __future__ import annotations
 
 import json
 import re
+import time
 from dataclasses import dataclass
-from typing import Dict, Any, Optional, Protocol
+from typing import Dict, Any, List, Optional, Protocol
 
+from .config import ModelConfig
 from .llm_client import LLMClient, LLMResponse
 from .observability import AgentObservability
-from .state import CentralizedStateManager
+from .state import StateBackend, StateUpdate
 from .cost import CostRouter, TaskType
+from .profiling import llm_wait, section
+from .resilience import CircuitOpenError
 
 
 class Agent(Protocol):
@@ -45,29 +49,59 @@ class BaseAgent:
         task_type: TaskType,
         max_tokens: int = 2048,
         temperature: float = 0.7,
+        model_cfg: Optional[ModelConfig] = None,
     ) -> LLMResponse:
         """
         Invoke the LLM through the cost router and log the call.
+
+        ``model_cfg`` skips routing, for callers that already selected a model.
         """
-        model_cfg = self.cost_router.select_model(prompt, task_type)
-        resp = self.llm.call(
-            model=model_cfg.name,
-            prompt=prompt,
-            max_tokens=max_tokens,
-            temperature=temperature,
-        )
-        cost = self.cost_router.estimate_cost(
-            model_cfg, resp.input_tokens, resp.output_tokens
-        )
-        self.observability.log_agent_call(
-            agent_id=self.agent_id,
-            task=prompt,
-            input_tokens=resp.input_tokens,
-            output_tokens=resp.output_tokens,
-            latency_ms=resp.latency_ms,
-            success=True,
-            cost_usd=cost,
-        )
+        with section(f"agent.call_llm:{self.agent_id}"):
+            if model_cfg is None:
+                model_cfg = self.cost_router.select_model(
+                    prompt, task_type, route=self.agent_id, max_output_tokens=max_tokens
+                )
+            start = time.perf_counter()
+            try:
+                with self.observability.tracer.span(
+                    "llm.call", agent_id=self.agent_id, model=model_cfg.name, task_type=task_type
+                ) as span, llm_wait():
+                    resp = self.llm.call(
+                        model=model_cfg.name,
+                        prompt=prompt,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                    )
+                    if span is not None:
+                        span.set(input_tokens=resp.input_tokens, output_tokens=resp.output_tokens)
+            except CircuitOpenError:
+                raise
+            except Exception:
+                self.cost_router.record_outcome(
+                    self.agent_id,
+                    model_cfg,
+                    (time.perf_counter() - start) * 1000.0,
+                    0.0,
+                    output_tokens=max_tokens,
+                    error=True,
+                )
+                raise
+            cost = self.cost_router.estimate_cost(
+                model_cfg, resp.input_tokens, resp.output_tokens
+            )
+            self.observability.log_agent_call(
+                agent_id=self.agent_id,
+                task=prompt,
+                input_tokens=resp.input_tokens,
+                output_tokens=resp.output_tokens,
+                latency_ms=resp.latency_ms,
+                success=True,
+                cost_usd=cost,
+                model=model_cfg.name,
+            )
+            self.cost_router.record_outcome(
+                self.agent_id, model_cfg, resp.latency_ms, cost, output_tokens=resp.output_tokens
+            )
         return resp
 
 
@@ -77,7 +111,7 @@ class StatefulAgentMixin:
     Mixin providing read/write access to shared state.
     """
 
-    state_manager: CentralizedStateManager
+    state_manager: StateBackend
 
     def read_state(self, keys: Optional[list[str]] = None) -> Dict[str, Any]:
         return self.state_manager.read_state(keys)
@@ -87,11 +121,33 @@ class StatefulAgentMixin:
         agent_id: str,
         updates: Dict[str, Any],
         update_type: str = "task_completion",
+        expected_version: Optional[int] = None,
+        expected_revision: Optional[int] = None,
     ) -> int:
         return self.state_manager.update_state(
-            agent_id=agent_id, updates=updates, update_type=update_type
+            agent_id=agent_id,
+            updates=updates,
+            update_type=update_type,
+            expected_version=expected_version,
+            expected_revision=expected_revision,
         )
 
+    def watch_state(
+        self,
+        keys: Optional[list[str]] = None,
+        since_version: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[StateUpdate]:
+        return self.state_manager.watch(keys, since_version, timeout)
+
+    async def awatch_state(
+        self,
+        keys: Optional[list[str]] = None,
+        since_version: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[StateUpdate]:
+        return await self.state_manager.awatch(keys, since_version, timeout)
+
 
 @dataclass
 class WorkerAgent(BaseAgent, StatefulAgentMixin):
@@ -105,6 +161,10 @@ class WorkerAgent(BaseAgent, StatefulAgentMixin):
     description: str
 
     def run(self, task: str, **kwargs: Any) -> str:
+        with self.observability.tracer.span("agent.run", agent_id=self.agent_id, task=task[:120]):
+            return self._run(task, **kwargs)
+
+    def _run(self, task: str, **kwargs: Any) -> str:
         ctx: Dict[str, Any] = kwargs.get("context", {})
         context_str = ""
         if ctx:
@@ -174,13 +234,18 @@ Return ONLY a JSON object with:
         """
         Execute the delegation plan by invoking workers in order and synthesizing results.
         """
+        with self.observability.tracer.span("agent.run", agent_id=self.agent_id, task=task[:120]):
+            return self._run(task)
+
+    def _run(self, task: str) -> str:
         plan = self.plan(task)
         step_to_agent: Dict[str, str] = plan.get("step_to_agent", {})
         results: Dict[str, str] = {}
         for step in plan["execution_order"]:
             agent_name = step_to_agent.get(step, plan["primary_agent"])
             worker = self.workers[agent_name]
-            result = worker.run(step, context=results)
+            with self.observability.tracer.span("manager.step", step=step, agent=agent_name):
+                result = worker.run(step, context=results)
             results[step] = result
         # Synthesis of final answer
         synth_prompt = f"""
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark shared state backends.
+
+Compares the in-memory CentralizedStateManager with SQLiteStateManager for
+single-threaded updates and reads, and for concurrent writers (threads for
+the in-memory backend, processes for SQLite).
+
+Prerequisites:
+- The orchestrator package must be importable (see docs/PYTHON_PACKAGE_STRUCTURE.md)
+
+Usage:
+    python bench_state_backends.py [--ops 2000] [--workers 4]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from orchestrator.state import CentralizedStateManager, StateBackend
+from orchestrator.state_sqlite import SQLiteStateManager
+
+
+REPORT = "Lorem ipsum dolor sit amet. " * 400
+
+
+def _updates(mgr: StateBackend, worker: str, ops: int) -> None:
+    for i in range(ops):
+        mgr.update_state(worker, {f"{worker}_step": i, "final_report": REPORT})
+
+
+def _reads(mgr: StateBackend, ops: int) -> None:
+    for _ in range(ops):
+        mgr.read_state(["final_report"])
+
+
+def _timed(label: str, ops: int, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<42} {ops / elapsed:>12,.0f} ops/s  {elapsed * 1e6 / ops:>9.1f} us/op")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark shared state backends.")
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    ops, workers = args.ops, args.workers
+
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = CentralizedStateManager()
+        sqlite = SQLiteStateManager(os.path.join(tmp, "state.db"))
+
+        _timed("in-memory update (1 thread)", ops, lambda: _updates(memory, "w", ops))
+        _timed("sqlite update (1 thread)", ops, lambda: _updates(sqlite, "w", ops))
+        _timed("in-memory read (1 thread)", ops, lambda: _reads(memory, ops))
+        _timed("sqlite read (1 thread)", ops, lambda: _reads(sqlite, ops))
+
+        def threaded() -> None:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for f in [pool.submit(_updates, memory, f"t{i}", ops) for i in range(workers)]:
+                    f.result()
+
+        def multiprocess() -> None:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for f in [pool.submit(_updates, sqlite, f"p{i}", ops) for i in range(workers)]:
+                    f.result()
+
+        _timed(f"in-memory update ({workers} threads)", ops * workers, threaded)
+        _timed(f"sqlite update ({workers} processes)", ops * workers, multiprocess)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class BlobRef:
+    """
+    Reference to a value held in a BlobStore.
+
+    Attributes:
+        digest: SHA-256 hex digest of the UTF-8 encoded value.
+        size: Size of the encoded value in bytes.
+    """
+
+    digest: str
+    size: int
+
+
+class BlobStoreFullError(RuntimeError):
+    """
+    Raised when a memory-only BlobStore has no room for a new blob.
+
+    Attributes:
+        size: Size of the rejected blob in bytes.
+        memory_bytes: Bytes already held.
+        max_memory_bytes: The store's budget.
+    """
+
+    def __init__(self, size: int, memory_bytes: int, max_memory_bytes: int) -> None:
+        self.size = size
+        self.memory_bytes = memory_bytes
+        self.max_memory_bytes = max_memory_bytes
+        super().__init__(
+            f"Blob of {size} bytes does not fit: {memory_bytes} of {max_memory_bytes} bytes in use."
+        )
+
+
+class BlobStore:
+    """
+    Content-addressed store for large string values.
+
+    Values are keyed by their SHA-256 digest, so identical values are stored
+    once no matter how many keys, versions or checkpoints refer to them. An
+    in-memory LRU tier serves hot values and is bounded by
+    ``max_memory_bytes``. With a ``directory``, every blob is also written
+    to disk and least recently used blobs leave memory when the budget is
+    exceeded; without one, memory is the only copy and put() raises
+    BlobStoreFullError instead.
+
+    Blobs are never dropped on their own: the owner calls sweep() with the
+    digests it still references (CentralizedStateManager does this on
+    compaction, restore and when the store is full).
+
+    Attributes:
+        directory: Optional directory for the on-disk tier.
+        max_memory_bytes: Budget of the memory tier.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+    ) -> None:
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._memory: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = Lock()
+
+    @property
+    def persistent(self) -> bool:
+        return self.directory is not None
+
+    def put(self, value: str) -> BlobRef:
+        """
+        Store a value and return its reference.
+
+        Raises:
+            BlobStoreFullError: If the store is memory-only and the value does not fit.
+        """
+        encoded = value.encode("utf-8")
+        ref = BlobRef(digest=hashlib.sha256(encoded).hexdigest(), size=len(encoded))
+        with self._lock:
+            if ref.digest in self._memory:
+                self._memory.move_to_end(ref.digest)
+                return ref
+            if self.directory is None and self._memory_bytes + ref.size > self.max_memory_bytes:
+                raise BlobStoreFullError(ref.size, self._memory_bytes, self.max_memory_bytes)
+            if self.directory is not None:
+                path = self._path(ref.digest)
+                if not os.path.exists(path):
+                    tmp_path = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(encoded)
+                    os.replace(tmp_path, path)
+            self._remember(ref, value)
+        return ref
+
+    def get(self, ref: BlobRef) -> str:
+        """
+        Return the value for a reference.
+
+        Raises:
+            KeyError: If the blob is unknown.
+        """
+        with self._lock:
+            entry = self._memory.get(ref.digest)
+            if entry is not None:
+                self._memory.move_to_end(ref.digest)
+                return entry[0]
+            if self.directory is None:
+                raise KeyError(ref.digest)
+            try:
+                with open(self._path(ref.digest), "rb") as f:
+                    value = f.read().decode("utf-8")
+            except FileNotFoundError:
+                raise KeyError(ref.digest) from None
+            self._remember(ref, value)
+            return value
+
+    def sweep(self, live_digests: Iterable[str]) -> int:
+        """
+        Drop every blob, in memory and on disk, whose digest is not in ``live_digests``.
+
+        The store must not be shared with owners whose references are not
+        included. Returns the number of blobs removed.
+        """
+        live = set(live_digests)
+        removed = set()
+        with self._lock:
+            for digest in [d for d in self._memory if d not in live]:
+                _, size = self._memory.pop(digest)
+                self._memory_bytes -= size
+                removed.add(digest)
+            if self.directory is not None:
+                for name in os.listdir(self.directory):
+                    # Skip live blobs and in-flight writes
+                    if name in live or name.endswith(".tmp"):
+                        continue
+                    try:
+                        os.remove(self._path(name))
+                    except FileNotFoundError:
+                        continue
+                    removed.add(name)
+        return len(removed)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the number and total size of blobs held in memory.
+        """
+        with self._lock:
+            return {"memory_blobs": len(self._memory), "memory_bytes": self._memory_bytes}
+
+    def _remember(self, ref: BlobRef, value: str) -> None:
+        self._memory[ref.digest] = (value, ref.size)
+        self._memory_bytes += ref.size
+        if self.directory is None:
+            return
+        # Only blobs that are safe on disk may leave memory
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, (_, size) = self._memory.popitem(last=False)
+            self._memory_bytes -= size
+
+    def _path(self, digest: str) -> str:
+        assert self.directory is not None
+        return os.path.join(self.directory, digest)
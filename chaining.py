@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import time
 from dataclasses import dataclass, field
 from typing import Callable, Dict, Any, List, Optional
 
@@ -7,6 +8,9 @@ from .llm_client import LLMClient
 from .context import ContextManager
 from .observability import AgentObservability
 from .cost import CostRouter, TaskType
+from .profiling import llm_wait, section
+from .prompt_analysis import attribute_tokens, render_with_composition
+from .resilience import CircuitOpenError
 
 
 @dataclass
@@ -20,7 +24,11 @@ class ChainStep:
         inputs: The keys from the chain state used to format the prompt.
         output_key: The key in the chain state into which to store the result.
         task_type: The type of task for model routing.
-        max_tokens: Maximum generation length.
+        max_tokens: Maximum generation length per call.
+        max_total_tokens: If set, output that stops at ``max_tokens`` is continued
+            with further calls up to this many output tokens in total.
+        latency_target_ms: Latency the step's call should finish within; the
+            router downgrades the tier when the chosen one is predicted to miss it.
         temperature: Sampling temperature.
         importance: Importance level for context management.
         tags: Optional tags for context filtering.
@@ -33,6 +41,8 @@ class ChainStep:
     output_key: str
     task_type: TaskType = "analysis"
     max_tokens: int = 2048
+    max_total_tokens: Optional[int] = None
+    latency_target_ms: Optional[float] = None
     temperature: float = 0.7
     importance: str = "medium"
     tags: List[str] = field(default_factory=list)
@@ -61,22 +71,67 @@ class ChainRunner:
         """
         Execute each step, updating state and recording outputs.
         """
-        for step in steps:
-            self._run_step(step)
+        tracer = self.observability.tracer
+        with tracer.span("chain.run", workflow=self.observability.workflow_name, steps=len(steps)):
+            for index, step in enumerate(steps):
+                self.observability.step_started(step.name, index, len(steps))
+                start = time.perf_counter()
+                with tracer.span("chain.step", step=step.name, task_type=step.task_type):
+                    with section(f"chain.step:{step.name}"):
+                        self._run_step(step, remaining_steps=len(steps) - index)
+                self.observability.step_finished(
+                    step.name, index, len(steps), (time.perf_counter() - start) * 1000.0
+                )
         return dict(self.state)
 
-    def _run_step(self, step: ChainStep) -> None:
+    def _run_step(self, step: ChainStep, remaining_steps: int = 1) -> None:
         # Format the prompt
-        input_values = {k: self.state.get(k, "") for k in step.inputs}
-        prompt = step.prompt_template.format(**input_values)
+        with section("chain.format_prompt"):
+            input_values = {k: self.state.get(k, "") for k in step.inputs}
+            prompt, composition = render_with_composition(step.prompt_template, input_values)
         # Select model and call LLM
-        model_cfg = self.cost_router.select_model(prompt, step.task_type)
-        resp = self.llm.call(
-            model=model_cfg.name,
-            prompt=prompt,
-            max_tokens=step.max_tokens,
-            temperature=step.temperature,
+        model_cfg = self.cost_router.select_model(
+            prompt,
+            step.task_type,
+            route=step.name,
+            latency_target_ms=step.latency_target_ms,
+            max_output_tokens=step.max_total_tokens or step.max_tokens,
+            remaining_steps=remaining_steps,
         )
+        call_kwargs: Dict[str, Any] = {}
+        if step.max_total_tokens is not None:
+            call_kwargs["max_total_tokens"] = step.max_total_tokens
+        start = time.perf_counter()
+        try:
+            with self.observability.tracer.span(
+                "llm.call", agent_id=f"chain_step:{step.name}", model=model_cfg.name
+            ) as span, llm_wait():
+                resp = self.llm.call(
+                    model=model_cfg.name,
+                    prompt=prompt,
+                    max_tokens=step.max_tokens,
+                    temperature=step.temperature,
+                    **call_kwargs,
+                )
+                if span is not None:
+                    span.set(
+                        input_tokens=resp.input_tokens,
+                        output_tokens=resp.output_tokens,
+                        continuations=resp.continuations,
+                    )
+        except CircuitOpenError:
+            raise
+        except Exception:
+            # Failed calls count against the tier, so routing learns to avoid it
+            self.cost_router.record_outcome(
+                step.name,
+                model_cfg,
+                (time.perf_counter() - start) * 1000.0,
+                0.0,
+                output_tokens=step.max_total_tokens or step.max_tokens,
+                error=True,
+            )
+            raise
         cost = self.cost_router.estimate_cost(
             model_cfg, resp.input_tokens, resp.output_tokens
         )
@@ -89,15 +144,36 @@ class ChainRunner:
             latency_ms=resp.latency_ms,
             success=True,
             cost_usd=cost,
+            model=model_cfg.name,
+            step=step.name,
+        )
+        self.observability.log_prompt_composition(
+            step.name, attribute_tokens(composition, resp.input_tokens)
         )
         output_text = resp.text
-        # Quality check
-        if step.quality_validator and not step.quality_validator(output_text):
+        passed: Optional[bool] = None
+        if resp.stop_reason == "max_tokens":
             self.observability.log_workflow_step(
                 step_name=step.name,
-                step_type="quality_warning",
-                metadata={"message": "quality_validator_failed"},
+                step_type="truncation_warning",
+                metadata={
+                    "output_tokens": resp.output_tokens,
+                    "continuations": resp.continuations,
+                },
             )
+        # Quality check
+        if step.quality_validator:
+            passed = step.quality_validator(output_text)
+            self.observability.log_validator_result(step.name, passed)
+            if not passed:
+                self.observability.log_workflow_step(
+                    step_name=step.name,
+                    step_type="quality_warning",
+                    metadata={"message": "quality_validator_failed"},
+                )
+        self.cost_router.record_outcome(
+            step.name, model_cfg, resp.latency_ms, cost, passed, output_tokens=resp.output_tokens
+        )
         # Update state
         self.state[step.output_key] = output_text
         # Add to context
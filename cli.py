@@ -2,20 +2,74 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict
+from datetime import datetime
+from typing import Iterator
 
 from .config import OrchestratorConfig
+from .cost import CostRouter
+from .metrics import get_default_registry
+from .observability import AgentObservability
+from .profiling import ENV_VAR as PROFILE_ENV_VAR, start_profiling, stop_profiling
+from .progress import ProgressDisplay
+from .prompt_analysis import format_composition_report
+from .routing import LatencyModel, LearnedRouter
+from .run_history import RunHistoryStore, format_report
+from .tracing import get_default_tracer
 from .workflows import SaaSResearchWorkflow, ContentBlogWorkflow, BlogInput, PRDGeneratorWorkflow, PRDInput
 
 
+@contextmanager
+def _observed_run(
+    args: argparse.Namespace, obs: AgentObservability, cost_router: CostRouter
+) -> Iterator[None]:
+    """
+    Show live progress on stderr, route by learned outcomes and record the
+    run's metrics in the history database, where configured.
+    """
+    store = RunHistoryStore(args.history_db) if args.history_db else None
+    if args.routing_state:
+        cost_router.learned = LearnedRouter(state_path=args.routing_state)
+        cost_router.latency_model = LatencyModel(
+            state_path=os.path.splitext(args.routing_state)[0] + ".latency.json"
+        )
+    cost_router.latency_target_ms = args.latency_target_ms
+    cost_router.set_deadline(args.deadline)
+    progress = None
+    if args.progress:
+        durations = store.step_durations(obs.workflow_name) if store else None
+        progress = ProgressDisplay(step_durations_ms=durations).attach(obs)
+    started_at = time.time()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        if progress is not None:
+            progress.finish()
+            obs.remove_listener(progress.on_event)
+        if store is not None:
+            store.record_run(obs, started_at, status=status)
+        if cost_router.learned is not None:
+            cost_router.learned.save()
+            cost_router.latency_model.save()
+
+
 def _run_saas_research(args: argparse.Namespace) -> None:
     """
     CLI handler for the SaaS research workflow.
     """
     config = OrchestratorConfig.from_env()
-    workflow = SaaSResearchWorkflow(config)
+    workflow = SaaSResearchWorkflow(config, state_dir=args.state_dir)
 
     async def _inner() -> None:
-        result = await workflow.run(args.query)
+        with _observed_run(args, workflow.obs, workflow.cost_router):
+            result = await workflow.run(args.query)
         print("\n===== EXECUTIVE SUMMARY =====\n")
         print(result.final_report)
         print("\n===== METADATA =====\n")
@@ -38,7 +92,8 @@ def _run_blog_generate(args: argparse.Namespace) -> None:
         tone=args.tone or "conversational, authoritative",
         brand_voice=args.brand_voice or None,
     )
-    result = workflow.run(blog_input)
+    with _observed_run(args, workflow.obs, workflow.cost_router):
+        result = workflow.run(blog_input)
 
     print("\n===== FINAL ARTICLE =====\n")
     print(result.final_article)
@@ -67,7 +122,8 @@ def _run_prd_generate(args: argparse.Namespace) -> None:
         target_users=args.target_users or None,
         business_context=args.business_context or None,
     )
-    result = workflow.run(prd_input)
+    with _observed_run(args, workflow.obs, workflow.cost_router):
+        result = workflow.run(prd_input)
 
     print("\n===== PRODUCT REQUIREMENTS DOCUMENT =====\n")
     print(result.full_document)
@@ -79,6 +135,64 @@ def _run_prd_generate(args: argparse.Namespace) -> None:
         print(f"\n===== PRD saved to {args.output} =====\n")
 
 
+def _parse_time(value: str) -> float:
+    return datetime.fromisoformat(value).timestamp()
+
+
+def _run_report(args: argparse.Namespace) -> None:
+    """
+    CLI handler comparing recorded runs and flagging regressions.
+    """
+    if not args.history_db:
+        sys.exit("report needs --history-db or ORCHESTRATOR_HISTORY_DB")
+    store = RunHistoryStore(args.history_db)
+    if args.runs:
+        baseline_ids, candidate_ids = [args.runs[0]], [args.runs[1]]
+    elif args.split:
+        split = _parse_time(args.split)
+        candidate_ids = [
+            r["run_id"] for r in store.list_runs(args.workflow, since=split, limit=args.candidate)
+        ]
+        baseline_ids = [
+            r["run_id"] for r in store.list_runs(args.workflow, until=split, limit=args.baseline)
+        ]
+    else:
+        recent = store.list_runs(args.workflow, limit=args.candidate + args.baseline)
+        candidate_ids = [r["run_id"] for r in recent[: args.candidate]]
+        baseline_ids = [r["run_id"] for r in recent[args.candidate :]]
+    if not baseline_ids or not candidate_ids:
+        sys.exit("not enough recorded runs to compare")
+    comparisons = store.compare(baseline_ids, candidate_ids, alpha=args.alpha)
+    if args.json:
+        print(json.dumps([asdict(c) for c in comparisons], indent=2))
+    else:
+        print(
+            f"{args.workflow}: {len(baseline_ids)} baseline run(s) vs "
+            f"{len(candidate_ids)} candidate run(s)\n"
+        )
+        print(format_report(comparisons))
+    if any(c.regression for c in comparisons):
+        sys.exit(1)
+
+
+def _run_prompt_report(args: argparse.Namespace) -> None:
+    """
+    CLI handler showing which prompt inputs dominate input tokens per step.
+    """
+    if not args.history_db:
+        sys.exit("prompt-report needs --history-db or ORCHESTRATOR_HISTORY_DB")
+    runs, by_step = RunHistoryStore(args.history_db).prompt_composition(
+        args.workflow, last_runs=args.last
+    )
+    if not by_step:
+        sys.exit("no recorded prompt composition for this workflow")
+    if args.json:
+        print(json.dumps({"runs": runs, "tokens_by_step": by_step}, indent=2))
+        return
+    print(f"{args.workflow}: input token share by prompt source over {runs} run(s)\n")
+    print(format_composition_report(by_step, runs=runs))
+
+
 def main() -> None:
     """
     Entry point for the orchestrator CLI.
@@ -86,6 +200,69 @@ def main() -> None:
     parser = argparse.ArgumentParser(
         description="Orchestrator CLI for AI workflows."
     )
+    parser.add_argument(
+        "--trace-chrome",
+        type=str,
+        help="Write trace spans as Chrome trace-event JSON to this path (open in Perfetto).",
+    )
+    parser.add_argument(
+        "--trace-otlp",
+        type=str,
+        help="Write trace spans as OTLP/JSON to this path for an OpenTelemetry collector.",
+    )
+    parser.add_argument(
+        "--history-db",
+        type=str,
+        default=os.environ.get("ORCHESTRATOR_HISTORY_DB"),
+        help="SQLite file recording each run's metrics (default: $ORCHESTRATOR_HISTORY_DB).",
+    )
+    parser.add_argument(
+        "--routing-state",
+        type=str,
+        default=os.environ.get("ORCHESTRATOR_ROUTING_STATE"),
+        help=(
+            "JSON file of per-step tier outcomes; enables learned cost/quality routing. "
+            "Observed latencies are kept next to it in <name>.latency.json "
+            "(default: $ORCHESTRATOR_ROUTING_STATE)."
+        ),
+    )
+    parser.add_argument(
+        "--latency-target-ms",
+        type=float,
+        default=None,
+        help="Per-call latency target; steps switch to faster tiers predicted to meet it.",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        help="Seconds the whole run should finish within; later steps downgrade when time is short.",
+    )
+    parser.add_argument(
+        "--no-progress",
+        dest="progress",
+        action="store_false",
+        help="Disable the live progress display on stderr.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=os.environ.get(PROFILE_ENV_VAR),
+        help=(
+            "Profile orchestration overhead and write reports (per-section table, "
+            "cProfile stats, collapsed stacks) to this directory (default: $ORCHESTRATOR_PROFILE)."
+        ),
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics while running.",
+    )
+    parser.add_argument(
+        "--metrics-textfile",
+        type=str,
+        help="Write Prometheus metrics to this file on exit (node_exporter textfile collector).",
+    )
     subparsers = parser.add_subparsers(dest="command")
 
     # SaaS research subcommand
@@ -97,6 +274,11 @@ def main() -> None:
         type=str,
         help="Research question (e.g. 'What SaaS opportunities exist after X shutdown?')",
     )
+    research_parser.add_argument(
+        "--state-dir",
+        type=str,
+        help="Directory for a write-ahead log of shared state; reruns of the same query resume from it.",
+    )
     research_parser.set_defaults(func=_run_saas_research)
 
     # Blog generation subcommand
@@ -158,11 +340,67 @@ def main() -> None:
     )
     prd_parser.set_defaults(func=_run_prd_generate)
 
+    # Run history report subcommand
+    report_parser = subparsers.add_parser(
+        "report", help="Compare recorded runs and flag significant regressions."
+    )
+    report_parser.add_argument(
+        "workflow", type=str, help="Workflow name, e.g. 'prd_generator' or 'content_blog'."
+    )
+    report_parser.add_argument(
+        "--candidate", type=int, default=5, help="Number of most recent runs to test (default 5)."
+    )
+    report_parser.add_argument(
+        "--baseline", type=int, default=20, help="Number of earlier runs to compare against (default 20)."
+    )
+    report_parser.add_argument(
+        "--split",
+        type=str,
+        help="ISO timestamp; compare runs started before it with runs started after it.",
+    )
+    report_parser.add_argument(
+        "--runs", nargs=2, metavar=("BASELINE_ID", "CANDIDATE_ID"), help="Compare two specific runs."
+    )
+    report_parser.add_argument(
+        "--alpha", type=float, default=0.05, help="Significance level for Welch's t-test (default 0.05)."
+    )
+    report_parser.add_argument("--json", action="store_true", help="Print comparisons as JSON.")
+    report_parser.set_defaults(func=_run_report)
+
+    # Prompt composition report subcommand
+    prompt_report_parser = subparsers.add_parser(
+        "prompt-report", help="Show which template inputs dominate input tokens per chain step."
+    )
+    prompt_report_parser.add_argument("workflow", type=str, help="Workflow name, e.g. 'prd_generator'.")
+    prompt_report_parser.add_argument(
+        "--last", type=int, default=20, help="Number of most recent runs to aggregate (default 20)."
+    )
+    prompt_report_parser.add_argument("--json", action="store_true", help="Print the breakdown as JSON.")
+    prompt_report_parser.set_defaults(func=_run_prompt_report)
+
     args = parser.parse_args()
-    if hasattr(args, "func"):
-        args.func(args)
-    else:
+    if not hasattr(args, "func"):
         parser.print_help()
+        return
+    tracer = get_default_tracer()
+    tracer.enabled = bool(args.trace_chrome or args.trace_otlp)
+    registry = get_default_registry()
+    server = registry.start_http_server(args.metrics_port) if args.metrics_port else None
+    if args.profile:
+        start_profiling(args.profile)
+    try:
+        args.func(args)
+    finally:
+        if args.profile:
+            stop_profiling()
+        if server is not None:
+            server.shutdown()
+        if args.metrics_textfile:
+            registry.write_textfile(args.metrics_textfile)
+        if args.trace_chrome:
+            tracer.export_chrome_trace(args.trace_chrome)
+        if args.trace_otlp:
+            tracer.export_otlp_json(args.trace_otlp)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,21 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Dict
+import json
 import os
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Mapping, Optional, Tuple
+
+try:
+    import tomllib  # type: ignore[import]
+except ImportError:  # pragma: no cover
+    try:
+        import tomli as tomllib  # type: ignore[import,no-redef]
+    except ImportError:
+        tomllib = None  # type: ignore[assignment]
+
+
+CATALOG_ENV_VAR = "ORCHESTRATOR_MODEL_CATALOG"
 
 
 @dataclass(frozen=True)
@@ -14,11 +27,116 @@ class ModelConfig:
         name: The model name understood by the upstream provider.
         input_cost_per_1k: Cost in USD per 1k input tokens.
         output_cost_per_1k: Cost in USD per 1k output tokens.
+        context_window: Maximum input plus output tokens per request.
+        max_output_tokens: Maximum tokens the model generates per request.
+        requests_per_minute: Provider request rate limit, if known.
+        tokens_per_minute: Provider token rate limit, if known.
+        output_tokens_per_s: Typical generation speed, if known. With
+            ``first_token_ms`` it gives a latency prior for models that have
+            not been observed yet.
+        first_token_ms: Typical time to the first output token.
     """
 
     name: str
     input_cost_per_1k: float
     output_cost_per_1k: float
+    context_window: int = 200_000
+    max_output_tokens: int = 8192
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+    output_tokens_per_s: Optional[float] = None
+    first_token_ms: float = 0.0
+
+    def expected_latency_ms(self, output_tokens: float) -> Optional[float]:
+        """
+        Return the catalog latency prior for ``output_tokens``, or None if unknown.
+        """
+        if not self.output_tokens_per_s:
+            return None
+        return self.first_token_ms + output_tokens * 1000.0 / self.output_tokens_per_s
+
+
+@dataclass(frozen=True)
+class ModelCatalog:
+    """
+    Immutable, indexed set of model tiers, resolved once and shared.
+
+    Attributes:
+        tiers: Read-only mapping of tier name to model.
+        by_name: Read-only mapping of provider model name to model.
+        tiers_by_cost: Tier names ordered by combined input and output price, cheapest first.
+        tier_of: Read-only mapping of provider model name to its tier.
+    """
+
+    tiers: Mapping[str, ModelConfig]
+    by_name: Mapping[str, ModelConfig]
+    tiers_by_cost: Tuple[str, ...]
+    tier_of: Mapping[str, str]
+
+    @classmethod
+    def from_tiers(cls, tiers: Mapping[str, ModelConfig]) -> "ModelCatalog":
+        if not tiers:
+            raise ValueError("A model catalog needs at least one tier.")
+        ordered = tuple(
+            sorted(tiers, key=lambda t: tiers[t].input_cost_per_1k + tiers[t].output_cost_per_1k)
+        )
+        return cls(
+            tiers=MappingProxyType(dict(tiers)),
+            by_name=MappingProxyType({m.name: m for m in tiers.values()}),
+            tiers_by_cost=ordered,
+            tier_of=MappingProxyType({tiers[t].name: t for t in reversed(ordered)}),
+        )
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "ModelCatalog":
+        """
+        Build a catalog from ``{"tiers": {tier: {name, input_cost_per_1k, ...}}}``.
+        """
+        tiers = data.get("tiers")
+        if not isinstance(tiers, Mapping):
+            raise ValueError("Model catalog must have a 'tiers' table.")
+        try:
+            return cls.from_tiers({tier: ModelConfig(**spec) for tier, spec in tiers.items()})
+        except TypeError as e:
+            raise ValueError(f"Invalid model catalog entry: {e}") from e
+
+    def cheapest_fitting(self, tokens: int, at_least: Optional[str] = None) -> Optional[str]:
+        """
+        Return the cheapest tier whose context window holds ``tokens``, if any.
+
+        With ``at_least``, tiers cheaper than that tier are only considered
+        when no tier at or above its price fits.
+        """
+        start = self.tiers_by_cost.index(at_least) if at_least is not None else 0
+        for tier in self.tiers_by_cost[start:] + self.tiers_by_cost[:start]:
+            if self.tiers[tier].context_window >= tokens:
+                return tier
+        return None
+
+
+def load_catalog(path: str) -> ModelCatalog:
+    """
+    Load a model catalog from a TOML or JSON file, e.g.::
+
+        [tiers.fast]
+        name = "claude-3-5-haiku-20241022"
+        input_cost_per_1k = 0.0008
+        output_cost_per_1k = 0.004
+        max_output_tokens = 8192
+        requests_per_minute = 4000
+        output_tokens_per_s = 90
+
+    The format follows the extension; ``.toml`` needs Python 3.11+ or tomli.
+    """
+    if path.endswith(".toml"):
+        if tomllib is None:
+            raise ImportError("Reading TOML model catalogs requires Python 3.11+ or the tomli package")
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    return ModelCatalog.from_dict(data)
 
 
 @dataclass(frozen=True)
@@ -28,19 +146,46 @@ class OrchestratorConfig:
 
     Contains API keys and default model tier information. Pulls API keys
     from environment variables by default.
+
+    ``catalog`` holds every tier; when not given it is built from the
+    premium and standard models. It must contain "premium" and "standard",
+    which the static routing table refers to.
     """
 
     anthropic_api_key: str
     premium_model: ModelConfig
     standard_model: ModelConfig
+    # Built from premium_model and standard_model in __post_init__ when omitted
+    catalog: ModelCatalog = field(default=None, compare=False)  # type: ignore[assignment]
+
+    def __post_init__(self) -> None:
+        if self.catalog is None:
+            object.__setattr__(
+                self,
+                "catalog",
+                ModelCatalog.from_tiers({"premium": self.premium_model, "standard": self.standard_model}),
+            )
+
+    @classmethod
+    def from_catalog(cls, anthropic_api_key: str, catalog: ModelCatalog) -> "OrchestratorConfig":
+        missing = {"premium", "standard"} - set(catalog.tiers)
+        if missing:
+            raise ValueError(f"Model catalog is missing required tiers: {sorted(missing)}")
+        return cls(
+            anthropic_api_key=anthropic_api_key,
+            premium_model=catalog.tiers["premium"],
+            standard_model=catalog.tiers["standard"],
+            catalog=catalog,
+        )
 
     @classmethod
     def from_env(cls) -> "OrchestratorConfig":
         """
         Construct an OrchestratorConfig from environment variables.
 
-        Reads ANTHROPIC_API_KEY and constructs sane default ModelConfig
-        instances for premium and standard model tiers.
+        Reads ANTHROPIC_API_KEY. Model tiers come from the catalog file named
+        by ORCHESTRATOR_MODEL_CATALOG when set, and otherwise from sane
+        default premium and standard ModelConfig instances.
         """
         api_key = os.getenv("ANTHROPIC_API_KEY")
         if not api_key:
@@ -48,15 +193,24 @@ class OrchestratorConfig:
                 "ANTHROPIC_API_KEY is not set in the environment. Please set it before running."
             )
 
+        catalog_path = os.getenv(CATALOG_ENV_VAR)
+        if catalog_path:
+            return cls.from_catalog(api_key, load_catalog(catalog_path))
+
+        # Speeds are rough priors; observed latency replaces them once recorded
         premium = ModelConfig(
             name="claude-3-5-sonnet-20241022",
             input_cost_per_1k=0.003,
             output_cost_per_1k=0.015,
+            output_tokens_per_s=60.0,
+            first_token_ms=1000.0,
         )
         standard = ModelConfig(
             name="claude-3-5-haiku-20241022",
             input_cost_per_1k=0.00025,
             output_cost_per_1k=0.00125,
+            output_tokens_per_s=90.0,
+            first_token_ms=600.0,
         )
 
         return cls(
@@ -65,11 +219,8 @@ class OrchestratorConfig:
             standard_model=standard,
         )
 
-    def model_map(self) -> Dict[str, ModelConfig]:
+    def model_map(self) -> Mapping[str, ModelConfig]:
         """
-        Return a mapping of tier names to model configurations.
+        Return the read-only mapping of tier names to model configurations.
         """
-        return {
-            "premium": self.premium_model,
-            "standard": self.standard_model,
-        }
\ No newline at end of file
+        return self.catalog.tiers
@@ -1,7 +1,14 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import List, Dict, Optional
+import re
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Tuple
+
+from .profiling import profiled
+
+
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*\S)\s*$")
+_FENCE_RE = re.compile(r"^\s{0,3}(`{3,}|~{3,})")
 
 
 @dataclass
@@ -9,12 +16,18 @@ class ContextItem:
     """
     Represents an individual piece of context from a chain step.
 
+    Large step results are split into several items (chunks) at markdown
+    heading and paragraph boundaries; each chunk keeps the metadata of the
+    step that produced it.
+
     Attributes:
         step: The name of the step that produced this context.
         content: The actual text content.
         importance: The importance level used to order items when trimming.
         tokens: Estimated token count.
         tags: Optional tags used to filter context.
+        heading_path: Markdown headings enclosing this chunk, outermost first.
+        chunk_index: Position of this chunk within the step result.
     """
 
     step: str
@@ -22,19 +35,30 @@ class ContextItem:
     importance: str
     tokens: int
     tags: List[str]
+    heading_path: List[str] = field(default_factory=list)
+    chunk_index: int = 0
 
 
 class ContextManager:
     """
     Manages a rolling window of contextual information across chain steps.
 
-    Older or low-importance items are pruned when the token budget is exceeded.
+    Results larger than ``max_chunk_tokens`` are stored as heading-aware chunks
+    so that selection can include the relevant parts of a large result instead
+    of all or nothing. Older or low-importance items are pruned when the token
+    budget is exceeded.
     """
 
-    def __init__(self, max_context_tokens: int = 2000) -> None:
+    def __init__(
+        self,
+        max_context_tokens: int = 2000,
+        max_chunk_tokens: int = 400,
+    ) -> None:
         self.max_tokens = max_context_tokens
+        self.max_chunk_tokens = max_chunk_tokens
         self._items: List[ContextItem] = []
 
+    @profiled("context.add_step_result")
     def add_step_result(
         self,
         step_name: str,
@@ -45,32 +69,47 @@ class ContextManager:
         """
         Add a step result to the context window.
 
-        Items are pruned based on importance and recency if the token budget is exceeded.
+        Large results are chunked at heading and paragraph boundaries. Items are
+        pruned based on importance and recency if the token budget is exceeded.
         """
         if tags is None:
             tags = []
-        item = ContextItem(
-            step=step_name,
-            content=result,
-            importance=importance,
-            tokens=self._estimate_tokens(result),
-            tags=tags,
-        )
-        self._items.append(item)
+        if self._estimate_tokens(result) <= self.max_chunk_tokens:
+            chunks: List[Tuple[List[str], str]] = [([], result)]
+        else:
+            chunks = self._chunk_markdown(result)
+        for index, (heading_path, content) in enumerate(chunks):
+            self._items.append(
+                ContextItem(
+                    step=step_name,
+                    content=content,
+                    importance=importance,
+                    tokens=self._estimate_tokens(content),
+                    tags=list(tags),
+                    heading_path=heading_path,
+                    chunk_index=index,
+                )
+            )
         self._prune_if_needed()
 
+    @profiled("context.get_relevant_context")
     def get_relevant_context(
         self,
         required_steps: Optional[List[str]] = None,
         required_tags: Optional[List[str]] = None,
+        required_headings: Optional[List[str]] = None,
     ) -> str:
         """
         Return a concatenated context string constrained by the token budget.
 
-        Items can be filtered by step name and/or tags.
+        Items can be filtered by step name, tags and/or heading. A heading
+        filter matches chunks whose heading path contains any of the given
+        strings (case-insensitive). Chunks of the same step are emitted in
+        document order.
         """
         required_tags = required_tags or []
         required_steps = required_steps or []
+        required_headings = [h.lower() for h in (required_headings or [])]
 
         def importance_score(level: str) -> int:
             return {"high": 3, "medium": 2, "low": 1}.get(level, 1)
@@ -82,16 +121,26 @@ class ContextManager:
                 continue
             if required_tags and not (set(required_tags) & set(item.tags)):
                 continue
+            if required_headings and not any(
+                wanted in heading.lower()
+                for wanted in required_headings
+                for heading in item.heading_path
+            ):
+                continue
             candidates.append(item)
         # Default to all items if filters returned nothing
         if not candidates:
             candidates = list(self._items)
 
-        # Sort by importance then recency
+        # Sort by importance, then oldest producing step first, then chunk order
+        positions: Dict[int, int] = {id(x): i for i, x in enumerate(self._items)}
         sorted_items = sorted(
             candidates,
-            key=lambda x: (importance_score(x.importance), -self._items.index(x)),
-            reverse=True,
+            key=lambda x: (
+                -importance_score(x.importance),
+                positions[id(x)] - x.chunk_index,
+                x.chunk_index,
+            ),
         )
 
         context_parts: List[str] = []
@@ -99,7 +148,10 @@ class ContextManager:
         for item in sorted_items:
             if tokens_used + item.tokens > self.max_tokens:
                 continue
-            context_parts.append(f"[{item.step}]:\n{item.content}\n")
+            label = item.step
+            if item.heading_path:
+                label = f"{item.step} > " + " > ".join(item.heading_path)
+            context_parts.append(f"[{label}]:\n{item.content}\n")
             tokens_used += item.tokens
         return "\n".join(context_parts)
 
@@ -109,6 +161,60 @@ class ContextManager:
         """
         return max(1, len(text) // 4)
 
+    def _chunk_markdown(self, text: str) -> List[Tuple[List[str], str]]:
+        """
+        Split markdown into (heading_path, content) chunks.
+
+        Sections start at each heading. Sections above ``max_chunk_tokens`` are
+        further packed paragraph by paragraph; a single paragraph is never split.
+        Heading-only sections are folded into the section that follows them.
+        Fenced code blocks (``` or ~~~) are kept whole: lines inside them are
+        neither headings nor paragraph breaks.
+        """
+        sections: List[Tuple[List[str], List[str]]] = []
+        stack: List[Tuple[int, str]] = []
+        current_lines: List[str] = []
+        current_path: List[str] = []
+        has_body = False
+        fence: Optional[str] = None
+        for line in text.splitlines():
+            fence, in_code = _track_fence(fence, line)
+            match = None if in_code else _HEADING_RE.match(line)
+            if match:
+                if has_body:
+                    sections.append((current_path, current_lines))
+                    current_lines, has_body = [], False
+                level = len(match.group(1))
+                while stack and stack[-1][0] >= level:
+                    stack.pop()
+                stack.append((level, match.group(2)))
+                current_path = [title for _, title in stack]
+            elif line.strip():
+                has_body = True
+            current_lines.append(line)
+        if has_body:
+            sections.append((current_path, current_lines))
+
+        chunks: List[Tuple[List[str], str]] = []
+        for path, lines in sections:
+            body = "\n".join(lines).strip()
+            if self._estimate_tokens(body) <= self.max_chunk_tokens:
+                chunks.append((path, body))
+                continue
+            paragraphs = _split_paragraphs(lines)
+            buffer: List[str] = []
+            buffer_tokens = 0
+            for paragraph in paragraphs:
+                para_tokens = self._estimate_tokens(paragraph)
+                if buffer and buffer_tokens + para_tokens > self.max_chunk_tokens:
+                    chunks.append((path, "\n\n".join(buffer)))
+                    buffer, buffer_tokens = [], 0
+                buffer.append(paragraph)
+                buffer_tokens += para_tokens
+            if buffer:
+                chunks.append((path, "\n\n".join(buffer)))
+        return chunks or [([], text)]
+
     def _total_tokens(self) -> int:
         return sum(item.tokens for item in self._items)
 
@@ -121,5 +227,33 @@ class ContextManager:
             if sum(i.tokens for i in remaining) <= self.max_tokens:
                 self._items = remaining
                 return
-        # If still too big, keep only the most recent items
-        self._items = self._items[-5:]
\ No newline at end of file
+        # If still too big, keep only the chunks of the most recent step results
+        starts = [i for i, item in enumerate(self._items) if item.chunk_index == 0]
+        self._items = self._items[starts[-5]:] if len(starts) > 5 else self._items
+
+
+def _track_fence(fence: Optional[str], line: str) -> Tuple[Optional[str], bool]:
+    # Returns the open fence marker after ``line`` and whether the line is code
+    match = _FENCE_RE.match(line)
+    if fence is None:
+        return (match.group(1), True) if match else (None, False)
+    if match and match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence):
+        return None, True
+    return fence, True
+
+
+def _split_paragraphs(lines: List[str]) -> List[str]:
+    paragraphs: List[str] = []
+    current: List[str] = []
+    fence: Optional[str] = None
+    for line in lines:
+        fence, in_code = _track_fence(fence, line)
+        if not in_code and not line.strip():
+            if current:
+                paragraphs.append("\n".join(current).strip())
+                current = []
+            continue
+        current.append(line)
+    if current:
+        paragraphs.append("\n".join(current).strip())
+    return [p for p in paragraphs if p]
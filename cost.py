@@ -1,9 +1,13 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Literal
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Literal, Mapping, Optional
 
 from .config import OrchestratorConfig, ModelConfig
+from .resilience import CircuitBreakerRegistry, CircuitOpenError, get_default_breakers
+from .log_pipeline import get_default_pipeline
+from .routing import LatencyModel, LearnedRouter
 
 
 TaskType = Literal[
@@ -20,26 +24,197 @@ TaskType = Literal[
 class CostRouter:
     """
     Heuristically route tasks to the appropriate LLM model tier and compute cost.
+
+    With ``learned`` set, calls that name their route (chain step or agent)
+    are routed by observed outcomes instead: the cheapest tier meeting the
+    learned router's target validator pass rate, with the static choice as
+    the default until a tier qualifies. Callers report outcomes through
+    record_outcome().
+
+    Given a latency budget, the tier is then checked against the observed
+    latency of each model at the expected output length (``latency_model``).
+    The budget is the smaller of the call's own target (or the run-wide
+    ``latency_target_ms``) and an even share of the time left before
+    ``deadline`` across the remaining steps. If the chosen tier's predicted
+    ``latency_quantile`` latency exceeds it, the router downgrades to the
+    most expensive cheaper tier predicted to fit, or failing that to the
+    fastest tier. Models without enough observations are predicted from the
+    catalog's speed prior (ModelConfig.expected_latency_ms), so unobserved
+    cheaper tiers are still candidates; models with neither are not
+    second-guessed. Failed calls are recorded too: their time counts against
+    the budget just the same.
+
+    Tiers come from the config's model catalog. When the prompt plus the
+    output limit would not fit the chosen model's context window, the
+    cheapest tier at or above its price whose window fits (e.g. a
+    long-context tier) is used.
+
+    When the chosen model's circuit breaker is open, ``open_circuit_policy``
+    decides: "fallback" routes to the available tier closest in price,
+    "fail_fast" raises CircuitOpenError. Either way the caller does not wait
+    on a model that is known to be failing.
+
+    Attributes:
+        config: Model tiers and costs.
+        breakers: Per-model circuit breakers, shared with LLMClient.
+        open_circuit_policy: What to do when the chosen model's breaker is open.
+        learned: Learned router; None keeps the static task-type table.
+        latency_target_ms: Run-wide per-call latency target; None for no target.
+        deadline: ``time.monotonic()`` value the run should finish by; see set_deadline().
+        latency_quantile: Latency quantile that must fit the budget.
+        latency_model: Observed latency per model and output length.
     """
 
     config: OrchestratorConfig
+    breakers: CircuitBreakerRegistry = field(default_factory=get_default_breakers)
+    open_circuit_policy: Literal["fallback", "fail_fast"] = "fallback"
+    learned: Optional[LearnedRouter] = None
+    latency_target_ms: Optional[float] = None
+    deadline: Optional[float] = None
+    latency_quantile: float = 0.9
+    latency_model: LatencyModel = field(default_factory=LatencyModel)
+
+    def set_deadline(self, seconds: Optional[float]) -> None:
+        """
+        Require the run to finish within ``seconds`` from now; None clears the deadline.
+        """
+        self.deadline = None if seconds is None else time.monotonic() + seconds
+
+    def select_model(
+        self,
+        task: str,
+        task_type: TaskType,
+        route: Optional[str] = None,
+        latency_target_ms: Optional[float] = None,
+        max_output_tokens: Optional[int] = None,
+        remaining_steps: int = 1,
+    ) -> ModelConfig:
+        """
+        Select the model configuration based on explicit task type or
+        heuristics, or on learned outcomes for ``route``, then apply the
+        latency budget and the circuit breaker policy.
+
+        Args:
+            task: The prompt, used by the keyword heuristic.
+            task_type: Task type for the static table.
+            route: Chain step or agent id, for learned routing and output length estimates.
+            latency_target_ms: Target for this call, overriding ``latency_target_ms``.
+            max_output_tokens: Generation limit, used when the route's output length is unknown.
+            remaining_steps: Calls left in the run including this one, to share the deadline.
 
-    def select_model(self, task: str, task_type: TaskType) -> ModelConfig:
+        Raises:
+            CircuitOpenError: If the chosen model is unavailable and no fallback is.
+        """
+        catalog = self.config.catalog
+        model_map = catalog.tiers
+        tier = self._select_tier(task, task_type)
+        if self.learned is not None and route is not None:
+            tier = self.learned.choose(route, tier, catalog.tiers_by_cost).tier
+        budget_ms = self._latency_budget_ms(latency_target_ms, remaining_steps)
+        if budget_ms is not None:
+            tier = self._fit_latency(tier, model_map, budget_ms, route, max_output_tokens)
+        needed_tokens = len(task) // 4 + (max_output_tokens or 0)
+        if needed_tokens > model_map[tier].context_window:
+            tier = catalog.cheapest_fitting(needed_tokens, at_least=tier) or tier
+        chosen = model_map[tier]
+        breaker = self.breakers.get(chosen.name)
+        if breaker.is_available():
+            return chosen
+        if self.open_circuit_policy == "fallback":
+            price = chosen.input_cost_per_1k + chosen.output_cost_per_1k
+            others = sorted(
+                (m for m in model_map.values() if m.name != chosen.name and m.context_window >= needed_tokens),
+                key=lambda m: abs(m.input_cost_per_1k + m.output_cost_per_1k - price),
+            )
+            for other in others:
+                if self.breakers.get(other.name).is_available():
+                    return other
+        raise CircuitOpenError(chosen.name, breaker.retry_in())
+
+    def record_outcome(
+        self,
+        route: str,
+        model: ModelConfig,
+        latency_ms: float,
+        cost_usd: float,
+        passed: Optional[bool] = None,
+        output_tokens: int = 0,
+        error: bool = False,
+    ) -> None:
         """
-        Select the model configuration based on explicit task type or heuristics.
+        Feed a call on ``route`` to the latency model and, if enabled, the
+        learned router. ``error`` marks a call that raised; the learned
+        router counts it as a failed check. Its latency (including any
+        retries) is recorded at ``output_tokens``, the requested limit, but
+        does not affect the route's expected output length.
         """
-        model_map = self.config.model_map()
+        self.latency_model.record(model.name, latency_ms, output_tokens, None if error else route)
+        if self.learned is None:
+            return
+        tier = self.config.catalog.tier_of.get(model.name)
+        if tier is not None:
+            self.learned.record(route, tier, latency_ms, cost_usd, passed, error)
+
+    def _latency_budget_ms(self, target_ms: Optional[float], remaining_steps: int) -> Optional[float]:
+        budget = target_ms if target_ms is not None else self.latency_target_ms
+        if self.deadline is not None:
+            share = (self.deadline - time.monotonic()) * 1000.0 / max(remaining_steps, 1)
+            budget = share if budget is None else min(budget, share)
+        return budget
+
+    def _fit_latency(
+        self,
+        tier: str,
+        model_map: Mapping[str, ModelConfig],
+        budget_ms: float,
+        route: Optional[str],
+        max_output_tokens: Optional[int],
+    ) -> str:
+        expected = self.latency_model.expected_output_tokens(route) if route is not None else None
+        tokens = expected if expected is not None else (max_output_tokens or 1024)
+        predicted: Dict[str, Optional[float]] = {}
+        for t, cfg in model_map.items():
+            observed = self.latency_model.predict(cfg.name, tokens, self.latency_quantile)
+            predicted[t] = observed if observed is not None else cfg.expected_latency_ms(tokens)
+        known = {t: ms for t, ms in predicted.items() if ms is not None}
+        current = known.get(tier)
+        if current is None or current <= budget_ms:
+            return tier
+        by_cost = self.config.catalog.tiers_by_cost
+        fitting = [t for t in by_cost[: by_cost.index(tier)] if t in known and known[t] <= budget_ms]
+        if fitting:
+            new_tier, why = fitting[-1], "fits"
+        else:
+            new_tier, why = min(known, key=known.__getitem__), "fastest; none fits"
+        if new_tier != tier:
+            get_default_pipeline().emit(
+                "routing",
+                {
+                    "route": route,
+                    "tier": new_tier,
+                    "kind": "latency",
+                    "reason": (
+                        f"predicted p{self.latency_quantile * 100:.0f} {current:.0f}ms on {tier} exceeds "
+                        f"budget {budget_ms:.0f}ms at ~{tokens:.0f} output tokens; {new_tier} {why} "
+                        f"({known[new_tier]:.0f}ms)"
+                    ),
+                },
+                sample_key=route,
+            )
+        return new_tier
+
+    def _select_tier(self, task: str, task_type: TaskType) -> str:
         # Explicit mapping
         if task_type in ("analysis", "writing", "complex_reasoning"):
-            return model_map["premium"]
+            return "premium"
         if task_type in ("extraction", "classification", "simple_tasks"):
-            return model_map["standard"]
+            return "standard"
         # Heuristic fallback based on keywords
         lower = task.lower()
         high_signals = ("analyze", "synthesize", "evaluate", "compare", "design")
         if any(sig in lower for sig in high_signals):
-            return model_map["premium"]
-        return model_map["standard"]
+            return "premium"
+        return "standard"
 
     def estimate_cost(
         self,
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, Optional
+
+
+class LatencyHistogram:
+    """
+    Fixed-memory streaming histogram with bounded relative error.
+
+    Values are counted in log-linear buckets whose bounds grow by a factor of
+    ``1 + relative_error`` (HDR-histogram style), so any quantile is reported
+    within that relative error of the true value. Memory depends only on the
+    dynamic range of the data (about 700 buckets per 1e6x range at 2%), never
+    on the number of samples. Histograms with the same ``relative_error``
+    can be merged exactly, including across processes via to_dict().
+
+    Attributes:
+        relative_error: Maximum relative error of reported quantiles.
+        min_value: Values below this are counted in the lowest bucket.
+    """
+
+    def __init__(self, relative_error: float = 0.02, min_value: float = 0.001) -> None:
+        self.relative_error = relative_error
+        self.min_value = min_value
+        self._log_base = math.log1p(relative_error)
+        self._buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        """
+        Add a single observation.
+        """
+        index = self._index(value)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        Return the estimated value at quantile ``q`` (0..1), or 0.0 if empty.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen > rank:
+                return min(max(self._value(index), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """
+        Add all observations of another histogram into this one.
+        """
+        if other.relative_error != self.relative_error or other.min_value != self.min_value:
+            raise ValueError("Cannot merge histograms with different bucket layouts.")
+        for index, n in list(other._buckets.items()):
+            self._buckets[index] = self._buckets.get(index, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Return count, mean, p50/p90/p95/p99 and max, rounded for reporting.
+        """
+        return {
+            "count": self.count,
+            "mean": round(self.mean, 2),
+            "p50": round(self.quantile(0.50), 2),
+            "p90": round(self.quantile(0.90), 2),
+            "p95": round(self.quantile(0.95), 2),
+            "p99": round(self.quantile(0.99), 2),
+            "max": round(self.max, 2),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serialize to a JSON-compatible dict.
+        """
+        return {
+            "relative_error": self.relative_error,
+            "min_value": self.min_value,
+            "buckets": {str(i): n for i, n in self._buckets.items()},
+            "count": self.count,
+            "total": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        hist = cls(relative_error=data["relative_error"], min_value=data["min_value"])
+        hist._buckets = {int(i): n for i, n in data["buckets"].items()}
+        hist.count = data["count"]
+        hist.total = data["total"]
+        min_value: Optional[float] = data["min"]
+        hist.min = math.inf if min_value is None else min_value
+        hist.max = data["max"]
+        return hist
+
+    def _index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return 1 + int(math.log(value / self.min_value) / self._log_base)
+
+    def _value(self, index: int) -> float:
+        if index == 0:
+            return self.min_value
+        # Geometric midpoint of the bucket bounds
+        return self.min_value * math.exp((index - 0.5) * self._log_base)
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import time
 from dataclasses import dataclass
+from typing import Any, Dict, Optional
 
 try:
     # Import anthropic client if available. Tests may run without this dependency.
@@ -9,7 +10,26 @@ try:
 except ImportError:  # pragma: no cover
     Anthropic = None  # type: ignore[assignment]
 
+try:
+    from anthropic import AsyncAnthropic  # type: ignore[import]
+except ImportError:  # pragma: no cover
+    AsyncAnthropic = None  # type: ignore[assignment]
+
 from .config import OrchestratorConfig
+from .metrics import MetricsRegistry, get_default_registry
+from .resilience import (
+    CircuitBreaker,
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+    RetryAttempt,
+    RetryBudget,
+    RetryConfig,
+    aexecute_with_retry,
+    execute_with_retry,
+    get_default_breakers,
+    get_default_retry_budget,
+    is_retryable_error,
+)
 
 
 @dataclass
@@ -21,13 +41,19 @@ class LLMResponse:
         text: The content returned by the model.
         input_tokens: The number of input tokens billed.
         output_tokens: The number of output tokens billed.
-        latency_ms: The round-trip latency for the call.
+        latency_ms: The round-trip latency of the successful attempt.
+        attempts: Number of attempts made, including retries.
+        stop_reason: Why generation stopped, e.g. "end_turn" or "max_tokens".
+        continuations: Continuation calls stitched onto the first response.
     """
 
     text: str
     input_tokens: int
     output_tokens: int
     latency_ms: float
+    attempts: int = 1
+    stop_reason: Optional[str] = None
+    continuations: int = 0
 
 
 class LLMClient:
@@ -35,16 +61,59 @@ class LLMClient:
     Thin wrapper around the Anthropic client to standardize invocations and
     surface cost and latency information.
 
-    This wrapper does not attempt to hide provider-specific exceptions.
+    Calls are retried according to ``retry_config``: errors are classified by
+    type and HTTP status (429, 529 and 5xx are transient), server
+    ``retry-after`` headers are honored, and every attempt is counted in the
+    metrics registry. The SDK's own retries are disabled so this policy is
+    the only one in effect. Errors that are not retried, or that persist
+    after the last attempt, are raised unchanged.
+
+    Each attempt also passes through the model's circuit breaker: while it
+    is open the call raises CircuitOpenError immediately instead of waiting
+    out backoff, and transient failures and latencies feed the breaker.
+    Retries are also charged to the shared per-model ``retry_budget``, so
+    concurrent workflows cannot multiply load during a provider incident.
     """
 
-    def __init__(self, config: OrchestratorConfig) -> None:
+    def __init__(
+        self,
+        config: OrchestratorConfig,
+        retry_config: Optional[RetryConfig] = None,
+        registry: Optional[MetricsRegistry] = None,
+        breakers: Optional[CircuitBreakerRegistry] = None,
+        retry_budget: Optional[RetryBudget] = None,
+    ) -> None:
         self.config = config
+        self.retry_config = retry_config or RetryConfig()
+        self.breakers = breakers if breakers is not None else get_default_breakers()
+        self.retry_budget = retry_budget if retry_budget is not None else get_default_retry_budget()
         if Anthropic is None:
             raise ImportError(
                 "anthropic package is required to instantiate LLMClient"
             )
-        self.client = Anthropic(api_key=config.anthropic_api_key)
+        self.client = Anthropic(api_key=config.anthropic_api_key, max_retries=0)
+        self._async_client: Any = None
+        registry = registry if registry is not None else get_default_registry()
+        self._attempts = registry.counter(
+            "orchestrator_llm_attempts_total",
+            "LLM request attempts by model and outcome (ok, retry, budget_denied, error).",
+            ("model", "outcome", "status"),
+        )
+        self._retry_delay = registry.histogram(
+            "orchestrator_llm_retry_delay_seconds",
+            "Backoff slept before retrying an LLM request.",
+            ("model",),
+        )
+
+    @property
+    def async_client(self) -> Any:
+        if self._async_client is None:
+            if AsyncAnthropic is None:
+                raise ImportError("anthropic package is required for async calls")
+            self._async_client = AsyncAnthropic(
+                api_key=self.config.anthropic_api_key, max_retries=0
+            )
+        return self._async_client
 
     def call(
         self,
@@ -53,32 +122,213 @@ class LLMClient:
         max_tokens: int = 2048,
         temperature: float = 0.7,
         timeout_s: float | None = None,
+        max_total_tokens: int | None = None,
     ) -> LLMResponse:
         """
-        Invoke the underlying LLM and return a normalized response.
+        Invoke the underlying LLM, retrying transient failures, and return a normalized response.
+
+        When ``max_total_tokens`` is set and the model stops at ``max_tokens``,
+        continuation calls prefill the partial output as the assistant turn
+        so the model picks up where it stopped, until it finishes or
+        ``max_total_tokens`` output tokens have been generated. The returned
+        response holds the stitched text and the combined usage.
 
         Args:
             model: The model name to call.
             prompt: The user prompt.
-            max_tokens: Maximum number of tokens to generate.
+            max_tokens: Maximum number of tokens to generate per call, capped at
+                the catalog's max_output_tokens for the model.
             temperature: Sampling temperature.
-            timeout_s: Timeout in seconds for the request. Currently unused.
+            timeout_s: Per-attempt request timeout in seconds; SDK default when None.
+            max_total_tokens: Output token cap across continuations; None disables them.
 
         Returns:
-            LLMResponse containing the text, token counts and latency.
+            LLMResponse containing the text, token counts, latency and attempts.
         """
-        start = time.time()
-        message = self.client.messages.create(
-            model=model,
-            max_tokens=max_tokens,
-            temperature=temperature,
-            messages=[{"role": "user", "content": prompt}],
+        resp = self._call_once(model, self._request(model, prompt, max_tokens, temperature, timeout_s))
+        while self._should_continue(resp, max_total_tokens):
+            budget = min(max_tokens, max_total_tokens - resp.output_tokens)  # type: ignore[operator]
+            prefix = resp.text.rstrip()
+            request = self._request(model, prompt, budget, temperature, timeout_s, prefix)
+            cont = self._call_once(model, request)
+            resp = _stitch(resp, prefix, cont)
+            if not cont.text:
+                break
+        return resp
+
+    async def acall(
+        self,
+        model: str,
+        prompt: str,
+        max_tokens: int = 2048,
+        temperature: float = 0.7,
+        timeout_s: float | None = None,
+        max_total_tokens: int | None = None,
+    ) -> LLMResponse:
+        """
+        Async variant of call(); backs off with ``asyncio.sleep`` between attempts.
+        """
+        resp = await self._acall_once(
+            model, self._request(model, prompt, max_tokens, temperature, timeout_s)
+        )
+        while self._should_continue(resp, max_total_tokens):
+            budget = min(max_tokens, max_total_tokens - resp.output_tokens)  # type: ignore[operator]
+            prefix = resp.text.rstrip()
+            request = self._request(model, prompt, budget, temperature, timeout_s, prefix)
+            cont = await self._acall_once(model, request)
+            resp = _stitch(resp, prefix, cont)
+            if not cont.text:
+                break
+        return resp
+
+    def _call_once(self, model: str, request: Dict[str, Any]) -> LLMResponse:
+        breaker = self.breakers.get(model)
+        attempts = [0]
+
+        def attempt() -> LLMResponse:
+            attempts[0] += 1
+            self._acquire(breaker)
+            recorded = False
+            try:
+                start = time.time()
+                try:
+                    message = self.client.messages.create(**request)
+                except Exception as e:  # noqa: BLE001
+                    recorded = True
+                    self._record_failure(breaker, e)
+                    raise
+                resp = self._to_response(message, start, attempts[0])
+                breaker.record_success(resp.latency_ms)
+                recorded = True
+                return resp
+            finally:
+                if not recorded:
+                    breaker.release()
+
+        return execute_with_retry(
+            attempt,
+            self.retry_config,
+            on_attempt=lambda a: self._record_attempt(model, a),
+            retry_budget=self.retry_budget,
+            budget_key=model,
         )
+
+    async def _acall_once(self, model: str, request: Dict[str, Any]) -> LLMResponse:
+        breaker = self.breakers.get(model)
+        attempts = [0]
+
+        async def attempt() -> LLMResponse:
+            attempts[0] += 1
+            self._acquire(breaker)
+            recorded = False
+            try:
+                start = time.time()
+                try:
+                    message = await self.async_client.messages.create(**request)
+                except Exception as e:  # noqa: BLE001
+                    recorded = True
+                    self._record_failure(breaker, e)
+                    raise
+                resp = self._to_response(message, start, attempts[0])
+                breaker.record_success(resp.latency_ms)
+                recorded = True
+                return resp
+            finally:
+                if not recorded:
+                    breaker.release()
+
+        return await aexecute_with_retry(
+            attempt,
+            self.retry_config,
+            on_attempt=lambda a: self._record_attempt(model, a),
+            retry_budget=self.retry_budget,
+            budget_key=model,
+        )
+
+    @staticmethod
+    def _should_continue(resp: LLMResponse, max_total_tokens: int | None) -> bool:
+        return (
+            max_total_tokens is not None
+            and resp.stop_reason == "max_tokens"
+            and resp.output_tokens < max_total_tokens
+            and bool(resp.text.strip())
+        )
+
+    def _acquire(self, breaker: CircuitBreaker) -> None:
+        if not breaker.acquire():
+            raise CircuitOpenError(breaker.name, breaker.retry_in())
+
+    def _record_failure(self, breaker: CircuitBreaker, error: Exception) -> None:
+        # Only transient errors say something about the model's health; a bad
+        # request neither counts against the model nor passes a probe.
+        if is_retryable_error(error, self.retry_config):
+            breaker.record_failure()
+        else:
+            breaker.release()
+
+    def _request(
+        self,
+        model: str,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        timeout_s: float | None,
+        prefix: str | None = None,
+    ) -> Dict[str, Any]:
+        model_cfg = self.config.catalog.by_name.get(model)
+        if model_cfg is not None:
+            max_tokens = min(max_tokens, model_cfg.max_output_tokens)
+        messages = [{"role": "user", "content": prompt}]
+        if prefix:
+            # Assistant prefill: the model continues this text
+            messages.append({"role": "assistant", "content": prefix})
+        request: Dict[str, Any] = {
+            "model": model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": messages,
+        }
+        if timeout_s is not None:
+            request["timeout"] = timeout_s
+        return request
+
+    def _to_response(self, message: Any, start: float, attempts: int) -> LLMResponse:
         latency_ms = (time.time() - start) * 1000.0
-        text = message.content[0].text  # type: ignore[index]
+        # A continuation can end its turn right at the prefill with no content blocks
+        text = "".join(
+            block.text for block in message.content if getattr(block, "type", "text") == "text"
+        )
         return LLMResponse(
             text=text,
             input_tokens=message.usage.input_tokens,  # type: ignore[attr-defined]
             output_tokens=message.usage.output_tokens,  # type: ignore[attr-defined]
             latency_ms=latency_ms,
-        )
\ No newline at end of file
+            attempts=attempts,
+            stop_reason=getattr(message, "stop_reason", None),
+        )
+
+    def _record_attempt(self, model: str, attempt: RetryAttempt) -> None:
+        if attempt.error is None:
+            outcome = "ok"
+        elif attempt.will_retry:
+            outcome = "retry"
+            self._retry_delay.labels(model).observe(attempt.delay)
+        elif attempt.budget_denied:
+            outcome = "budget_denied"
+        else:
+            outcome = "error"
+        status = str(attempt.status_code) if attempt.status_code is not None else ""
+        self._attempts.labels(model, outcome, status).inc()
+
+
+def _stitch(first: LLMResponse, prefix: str, cont: LLMResponse) -> LLMResponse:
+    # The continuation starts where the prefilled (right-stripped) text ended.
+    return LLMResponse(
+        text=prefix + cont.text,
+        input_tokens=first.input_tokens + cont.input_tokens,
+        output_tokens=first.output_tokens + cont.output_tokens,
+        latency_ms=first.latency_ms + cont.latency_ms,
+        attempts=first.attempts + cont.attempts,
+        stop_reason=cont.stop_reason,
+        continuations=first.continuations + 1,
+    )
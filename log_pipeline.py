@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import atexit
+import gzip
+import json
+import os
+import queue
+import shutil
+import sys
+import time
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Any, Dict, List, Optional, Protocol, TextIO
+
+
+class LogSink(Protocol):
+    """
+    Destination for batches of serialized log lines.
+    """
+
+    def write_batch(self, lines: List[str]) -> None:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class StreamSink:
+    """
+    Write log lines to a text stream (stderr by default).
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None) -> None:
+        self.stream = stream
+
+    def write_batch(self, lines: List[str]) -> None:
+        # Resolve stderr at write time so redirection after startup is honoured
+        stream = self.stream if self.stream is not None else sys.stderr
+        stream.write("\n".join(lines) + "\n")
+        stream.flush()
+
+    def close(self) -> None:
+        pass
+
+
+class RotatingJSONLSink:
+    """
+    Append log lines to a JSONL file, rotating it by size.
+
+    Rotated files are named ``path.1`` .. ``path.<backup_count>`` (newest
+    first), gzip-compressed to ``path.N.gz`` when ``compress`` is set.
+    Rotation and compression run on the pipeline's writer thread.
+
+    Attributes:
+        path: Path of the active log file.
+        max_bytes: Size at which the active file is rotated.
+        backup_count: Number of rotated files to keep.
+        compress: Whether rotated files are gzip-compressed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 50 * 1024 * 1024,
+        backup_count: int = 5,
+        compress: bool = False,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def write_batch(self, lines: List[str]) -> None:
+        data = "\n".join(lines) + "\n"
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data.encode("utf-8"))
+        if self._size >= self.max_bytes:
+            self._rotate()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def _backup_name(self, index: int) -> str:
+        return f"{self.path}.{index}.gz" if self.compress else f"{self.path}.{index}"
+
+    def _rotate(self) -> None:
+        self._file.close()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                src = self._backup_name(index)
+                if os.path.exists(src):
+                    os.replace(src, self._backup_name(index + 1))
+            if self.compress:
+                with open(self.path, "rb") as src_f, gzip.open(self._backup_name(1), "wb") as dst_f:
+                    shutil.copyfileobj(src_f, dst_f)
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self._backup_name(1))
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = 0
+
+
+class GzipSink:
+    """
+    Append log lines to a gzip-compressed archive.
+
+    Each batch is written as its own gzip member, so the archive stays
+    readable (``gzip.open`` / ``zcat``) even if the process dies mid-run.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "ab")
+
+    def write_batch(self, lines: List[str]) -> None:
+        self._file.write(gzip.compress(("\n".join(lines) + "\n").encode("utf-8")))
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+
+_STOP = object()
+
+
+class LogPipeline:
+    """
+    Queue-based, non-blocking structured log writer.
+
+    Callers hand over plain dicts; timestamp formatting, JSON encoding and
+    sink I/O all happen on a single background thread, in batches. Because
+    there is exactly one writer consuming a FIFO queue, lines are written in
+    emission order.
+
+    When the queue is full, ``overflow="drop"`` discards the record and
+    counts it, so logging can never stall the workflow; ``overflow="block"``
+    waits up to ``block_timeout_s`` before dropping. ``sample_rates`` maps a
+    sample key (the agent id for agent calls) to the fraction of its records
+    to keep; records emitted with ``always=True`` (failures) bypass sampling.
+
+    Attributes:
+        sinks: Destinations every batch is written to.
+        max_queue: Maximum number of records waiting to be written.
+        batch_size: Maximum number of records written per batch.
+        flush_interval_s: Maximum time the writer waits to fill a batch.
+        overflow: "drop" or "block".
+        block_timeout_s: Maximum wait in "block" mode before dropping.
+        sample_rates: Fraction of records to keep per sample key.
+    """
+
+    def __init__(
+        self,
+        sinks: Optional[List[LogSink]] = None,
+        max_queue: int = 10_000,
+        batch_size: int = 256,
+        flush_interval_s: float = 0.2,
+        overflow: str = "drop",
+        block_timeout_s: float = 1.0,
+        sample_rates: Optional[Dict[str, float]] = None,
+    ) -> None:
+        if overflow not in ("drop", "block"):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.sinks: List[LogSink] = sinks if sinks is not None else [StreamSink()]
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.overflow = overflow
+        self.block_timeout_s = block_timeout_s
+        self.sample_rates: Dict[str, float] = dict(sample_rates or {})
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._sample_counts: Dict[str, int] = {}
+        self._stats = {"emitted": 0, "written": 0, "dropped": 0, "sampled_out": 0, "sink_errors": 0}
+        self._lock = Lock()
+        self._closed = False
+        self._writer = Thread(target=self._write_loop, name="log-pipeline", daemon=True)
+        self._writer.start()
+
+    def emit(
+        self,
+        workflow: str,
+        record: Dict[str, Any],
+        level: str = "INFO",
+        sample_key: Optional[str] = None,
+        always: bool = False,
+    ) -> bool:
+        """
+        Queue a record for writing and return whether it was accepted.
+
+        The record and its nested dicts and lists are copied one level deep,
+        so the caller may keep changing them; deeper values must not be
+        mutated after the record is emitted.
+        """
+        if self._closed:
+            return False
+        if sample_key is not None and not always and not self._sampled_in(sample_key):
+            return False
+        snapshot = {
+            k: dict(v) if isinstance(v, dict) else list(v) if isinstance(v, list) else v
+            for k, v in record.items()
+        }
+        item = (time.time(), level, workflow, snapshot)
+        try:
+            if self.overflow == "block":
+                self._queue.put(item, timeout=self.block_timeout_s)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return False
+        with self._lock:
+            self._stats["emitted"] += 1
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every record emitted so far has been written.
+        """
+        if self._closed:
+            return True
+        marker = Event()
+        self._queue.put(marker)
+        return marker.wait(timeout)
+
+    def close(self) -> None:
+        """
+        Write all pending records, stop the writer thread and close the sinks.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join()
+        for sink in self.sinks:
+            sink.close()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return counts of emitted, written, dropped and sampled-out records.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def _sampled_in(self, key: str) -> bool:
+        rate = self.sample_rates.get(key)
+        if rate is None or rate >= 1.0:
+            return True
+        with self._lock:
+            # Deterministic 1-in-N spreading instead of random coin flips
+            n = self._sample_counts.get(key, 0)
+            self._sample_counts[key] = n + 1
+            keep = int((n + 1) * rate) > int(n * rate)
+            if not keep:
+                self._stats["sampled_out"] += 1
+        return keep
+
+    def _write_loop(self) -> None:
+        stopping = False
+        while not stopping:
+            try:
+                first = self._queue.get(timeout=self.flush_interval_s)
+            except queue.Empty:
+                continue
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines: List[str] = []
+            markers: List[Event] = []
+            for item in batch:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, Event):
+                    markers.append(item)
+                else:
+                    lines.append(self._format(*item))
+            if lines:
+                self._write(lines)
+            for marker in markers:
+                marker.set()
+
+    def _format(self, ts: float, level: str, workflow: str, record: Dict[str, Any]) -> str:
+        return json.dumps(
+            {
+                "timestamp": datetime.fromtimestamp(ts).isoformat(timespec="milliseconds"),
+                "level": level,
+                "workflow": workflow,
+                "message": record,
+            },
+            default=str,
+        )
+
+    def _write(self, lines: List[str]) -> None:
+        for sink in self.sinks:
+            try:
+                sink.write_batch(lines)
+            except Exception:
+                # A broken sink must not kill the writer or the other sinks
+                with self._lock:
+                    self._stats["sink_errors"] += 1
+        with self._lock:
+            self._stats["written"] += len(lines)
+
+
+_default_pipeline: Optional[LogPipeline] = None
+_default_lock = Lock()
+
+
+def get_default_pipeline() -> LogPipeline:
+    """
+    Return the process-wide pipeline writing to stderr, creating it on first use.
+    """
+    global _default_pipeline
+    with _default_lock:
+        if _default_pipeline is None:
+            _default_pipeline = LogPipeline()
+            atexit.register(_default_pipeline.close)
+        return _default_pipeline
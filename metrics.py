@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import math
+import os
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+DEFAULT_LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Shards:
+    """
+    Per-thread cells of running totals, summed on read.
+
+    Each thread only ever writes its own cell, so recording needs no lock
+    and no increment can be lost; the lock is taken only when a thread
+    records for the first time and when the cells are read.
+    """
+
+    __slots__ = ("width", "local", "_cells", "_lock")
+
+    def __init__(self, width: int) -> None:
+        self.width = width
+        self.local = threading.local()
+        self._cells: List[List[float]] = []
+        self._lock = Lock()
+
+    def new_cell(self) -> List[float]:
+        cell = [0] * self.width
+        with self._lock:
+            self._cells.append(cell)
+        self.local.cell = cell
+        return cell
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            cells = list(self._cells)
+        totals = [0] * self.width
+        for cell in cells:
+            for i, v in enumerate(list(cell)):
+                totals[i] += v
+        return totals
+
+
+class _CounterChild:
+    __slots__ = ("_shards", "_local")
+
+    def __init__(self) -> None:
+        self._shards = _Shards(1)
+        self._local = self._shards.local
+
+    def inc(self, amount: float = 1.0) -> None:
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._shards.new_cell()
+        cell[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._shards.totals()[0]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = Lock()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "_shards", "_local")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]) -> None:
+        self.upper_bounds = upper_bounds
+        # Per-bucket (non-cumulative) counts with +Inf last, then the sum
+        self._shards = _Shards(len(upper_bounds) + 2)
+        self._local = self._shards.local
+
+    def observe(self, value: float) -> None:
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._shards.new_cell()
+        cell[bisect_left(self.upper_bounds, value)] += 1
+        cell[-1] += value
+
+    @property
+    def counts(self) -> List[int]:
+        return self._shards.totals()[:-1]  # type: ignore[return-value]
+
+    @property
+    def sum(self) -> float:
+        return self._shards.totals()[-1]
+
+
+class _Metric:
+    """
+    A named metric family; label combinations are cached child objects.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = Lock()
+
+    def labels(self, *values: str):  # type: ignore[no-untyped-def]
+        """
+        Return the child for the given label values, creating it on first use.
+
+        Callers on hot paths should keep the returned child and reuse it.
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(
+                    f"{self.name} expects labels {self.labelnames}, got {values!r}"
+                )
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self) -> object:
+        raise NotImplementedError
+
+    def _samples(self) -> Iterable[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        raise NotImplementedError
+
+    def children(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return list(self._children.items())
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing value, e.g. calls, tokens or cost.
+    """
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def _samples(self) -> Iterable[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        for values, child in self.children():
+            yield self.name, tuple(zip(self.labelnames, values)), child.value  # type: ignore[attr-defined]
+
+
+class Gauge(_Metric):
+    """
+    Value that can go up and down, e.g. in-flight calls or a timestamp.
+    """
+
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def _samples(self) -> Iterable[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        for values, child in self.children():
+            yield self.name, tuple(zip(self.labelnames, values)), child.value  # type: ignore[attr-defined]
+
+
+class Histogram(_Metric):
+    """
+    Distribution over fixed cumulative buckets, Prometheus style.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(b for b in buckets if not math.isinf(b)))
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _samples(self) -> Iterable[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        for values, child in self.children():
+            labels = tuple(zip(self.labelnames, values))
+            # One read so buckets, sum and count are mutually consistent
+            totals = child._shards.totals()  # type: ignore[attr-defined]
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), totals[:-1]):
+                cumulative += n
+                yield f"{self.name}_bucket", labels + (("le", _format_value(bound)),), cumulative
+            yield f"{self.name}_sum", labels, totals[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class MetricsRegistry:
+    """
+    Collection of metric families rendered in the Prometheus text format.
+
+    Families are get-or-create by name, so several AgentObservability
+    instances (one per workflow) can feed the same registry.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(  # type: ignore[return-value]
+            Histogram, name, documentation, labelnames, buckets=buckets
+        )
+
+    def render(self) -> str:
+        """
+        Return all metrics in the Prometheus text exposition format (0.0.4).
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, labels, value in metric._samples():
+                if labels:
+                    rendered = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels)
+                    lines.append(f"{sample_name}{{{rendered}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{sample_name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """
+        Atomically write the metrics to ``path`` for node_exporter's textfile collector.
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_http_server(self, port: int, addr: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Serve ``/metrics`` on a daemon thread and return the server.
+
+        Pass port 0 to bind an ephemeral port (see ``server.server_port``).
+        Call ``shutdown()`` on the server to stop it.
+        """
+        registry = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+        server = ThreadingHTTPServer((addr, port), _Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):  # type: ignore[no-untyped-def]
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered with a different type or labels.")
+            return metric
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+_default_registry = MetricsRegistry()
+
+
+def get_default_registry() -> MetricsRegistry:
+    """
+    Return the process-wide metrics registry.
+    """
+    return _default_registry
@@ -1,50 +1,239 @@
 from __future__ import annotations
 
-import json
-import logging
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+import threading
+import time
+from types import MappingProxyType
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from .histogram import LatencyHistogram
+from .log_pipeline import LogPipeline, get_default_pipeline
+from .metrics import MetricsRegistry, get_default_registry
+from .profiling import profiled
+from .resilience import CircuitBreakerRegistry, get_default_breakers
+from .tracing import Tracer, get_default_tracer
 
 
 @dataclass
 class ObservabilityMetrics:
     """
     Aggregate metrics tracked during a workflow run.
+
+    Latencies are kept in fixed-memory histograms overall and per agent,
+    step and model, so memory does not grow with the number of calls.
     """
     total_calls: int = 0
     total_tokens: int = 0
     total_cost: float = 0.0
     agent_calls: Dict[str, int] = field(default_factory=dict)
     failures: List[Dict[str, Any]] = field(default_factory=list)
-    latencies: List[float] = field(default_factory=list)
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    agent_latency: Dict[str, LatencyHistogram] = field(default_factory=dict)
+    step_latency: Dict[str, LatencyHistogram] = field(default_factory=dict)
+    model_latency: Dict[str, LatencyHistogram] = field(default_factory=dict)
+    step_tokens: Dict[str, int] = field(default_factory=dict)
+    step_cost: Dict[str, float] = field(default_factory=dict)
+    validator_checks: Dict[str, int] = field(default_factory=dict)
+    validator_passes: Dict[str, int] = field(default_factory=dict)
+    prompt_tokens: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    def merge(self, other: "ObservabilityMetrics") -> None:
+        """
+        Fold another run's (or process's, or thread's) metrics into this one.
+
+        ``other`` may be written to concurrently by its owning thread; its
+        containers are copied before iteration.
+        """
+        self.total_calls += other.total_calls
+        self.total_tokens += other.total_tokens
+        self.total_cost += other.total_cost
+        for mine_counts, theirs_counts in (
+            (self.agent_calls, other.agent_calls),
+            (self.step_tokens, other.step_tokens),
+            (self.step_cost, other.step_cost),
+            (self.validator_checks, other.validator_checks),
+            (self.validator_passes, other.validator_passes),
+        ):
+            for key, n in list(theirs_counts.items()):
+                mine_counts[key] = mine_counts.get(key, 0) + n
+        self.failures.extend(list(other.failures))
+        for step, sources in list(other.prompt_tokens.items()):
+            mine_sources = self.prompt_tokens.setdefault(step, {})
+            for source, tokens in list(sources.items()):
+                mine_sources[source] = mine_sources.get(source, 0.0) + tokens
+        self.latency.merge(other.latency)
+        for mine, theirs in (
+            (self.agent_latency, other.agent_latency),
+            (self.step_latency, other.step_latency),
+            (self.model_latency, other.model_latency),
+        ):
+            for key, hist in list(theirs.items()):
+                mine.setdefault(key, LatencyHistogram()).merge(hist)
+
+
+class _ReadOnlyMetrics(ObservabilityMetrics):
+    """
+    Merged metrics returned by AgentObservability.metrics; writes raise.
+    """
+
+    @classmethod
+    def freeze(cls, metrics: ObservabilityMetrics) -> "_ReadOnlyMetrics":
+        view = object.__new__(cls)
+        for f in fields(ObservabilityMetrics):
+            object.__setattr__(view, f.name, _freeze(getattr(metrics, f.name)))
+        return view
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(
+            "AgentObservability.metrics is a read-only merged view; "
+            "use snapshot_metrics() for a copy that can be modified."
+        )
+
+    def merge(self, other: ObservabilityMetrics) -> None:
+        raise AttributeError("AgentObservability.metrics is a read-only merged view.")
+
+
+class _ReadOnlyHistogram(LatencyHistogram):
+    """
+    Latency histogram of a read-only merged view; recording or merging raises.
+    """
+
+    @classmethod
+    def freeze(cls, hist: LatencyHistogram) -> "_ReadOnlyHistogram":
+        view = object.__new__(cls)
+        for name, value in vars(hist).items():
+            object.__setattr__(view, name, _freeze(value))
+        return view
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Histograms of AgentObservability.metrics are read-only.")
+
+    def record(self, value: float) -> None:
+        raise AttributeError("Histograms of AgentObservability.metrics are read-only.")
+
+    def merge(self, other: LatencyHistogram) -> None:
+        raise AttributeError("Histograms of AgentObservability.metrics are read-only.")
+
+
+def _freeze(value: Any) -> Any:
+    # Wraps containers at any depth; the merged metrics are detached, so nothing is copied
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, LatencyHistogram):
+        return _ReadOnlyHistogram.freeze(value)
+    return value
 
 
 class AgentObservability:
     """
     Provides structured logging and collects runtime metrics for agent and chain calls.
+
+    Log records are handed to a LogPipeline and serialized and written on its
+    background thread; by default the process-wide pipeline writing to stderr.
+    Agents and chains open their trace spans on ``tracer``, by default the
+    process-wide tracer, which records nothing until enabled. Calls are also
+    counted in ``registry`` for Prometheus scraping. The summary includes the
+    state of the per-model circuit breakers in ``breakers``.
+
+    Agents call log_agent_call from executor threads concurrently. Each
+    thread records into its own ObservabilityMetrics shard without locking;
+    snapshot_metrics(), ``metrics`` and get_summary() merge the shards on
+    read, so no update is lost. Merged metrics are a copy: changing them
+    does not affect what is recorded.
     """
 
-    def __init__(self, workflow_name: str) -> None:
+    def __init__(
+        self,
+        workflow_name: str,
+        pipeline: Optional[LogPipeline] = None,
+        tracer: Optional[Tracer] = None,
+        registry: Optional[MetricsRegistry] = None,
+        breakers: Optional[CircuitBreakerRegistry] = None,
+    ) -> None:
         self.workflow_name = workflow_name
-        self.logger = self._setup_logger()
-        self.metrics = ObservabilityMetrics()
-
-    def _setup_logger(self) -> logging.Logger:
-        logger = logging.getLogger(f"agent.{self.workflow_name}")
-        logger.setLevel(logging.INFO)
-        # Attach handler once
-        if not logger.handlers:
-            handler = logging.StreamHandler()
-            handler.setFormatter(
-                logging.Formatter(
-                    '{"timestamp":"%(asctime)s","level":"%(levelname)s",'
-                    '"workflow":"%(name)s","message":%(message)s}'
-                )
-            )
-            logger.addHandler(handler)
-        return logger
+        self.breakers = breakers if breakers is not None else get_default_breakers()
+        self.pipeline = pipeline if pipeline is not None else get_default_pipeline()
+        self.tracer = tracer if tracer is not None else get_default_tracer()
+        self.registry = registry if registry is not None else get_default_registry()
+        self._local = threading.local()
+        self._shards: List[ObservabilityMetrics] = []
+        self._shards_lock = threading.Lock()
+        labels = ("workflow", "agent", "step", "model")
+        self._calls = self.registry.counter(
+            "orchestrator_llm_calls_total", "LLM calls made by agents and chain steps.",
+            labels + ("status",),
+        )
+        self._tokens = self.registry.counter(
+            "orchestrator_tokens_total", "Tokens billed, by direction.", labels + ("direction",)
+        )
+        self._cost = self.registry.counter(
+            "orchestrator_cost_usd_total", "Estimated LLM spend in US dollars.", labels
+        )
+        self._latency = self.registry.histogram(
+            "orchestrator_llm_call_duration_seconds", "LLM call latency.", labels
+        )
+        self._last_call = self.registry.gauge(
+            "orchestrator_last_call_timestamp_seconds",
+            "Unix time of the most recent LLM call.",
+            ("workflow",),
+        ).labels(workflow_name)
+        # Resolved metric children per (agent, step, model, success)
+        self._children: Dict[Tuple[str, str, str, bool], Tuple[Any, ...]] = {}
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """
+        Subscribe to live events: "agent_call", "workflow_step", "step_start"
+        and "step_end". Listeners run synchronously on the recording thread
+        and must be cheap; their exceptions are ignored.
+        """
+        self._listeners = self._listeners + [listener]
+
+    def remove_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        self._listeners = [existing for existing in self._listeners if existing is not listener]
 
+    def _notify(self, event: Dict[str, Any]) -> None:
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception:  # noqa: BLE001
+                pass
+
+    def snapshot_metrics(self) -> ObservabilityMetrics:
+        """
+        Return the merged metrics of all threads as a new, detached object.
+        """
+        with self._shards_lock:
+            shards = list(self._shards)
+        merged = ObservabilityMetrics()
+        for shard in shards:
+            merged.merge(shard)
+        return merged
+
+    @property
+    def metrics(self) -> ObservabilityMetrics:
+        """
+        Read-only merged view of all threads' metrics, rebuilt on every access.
+
+        Assigning to it or to its containers raises instead of being
+        silently lost; use snapshot_metrics() for a mutable copy.
+        """
+        return _ReadOnlyMetrics.freeze(self.snapshot_metrics())
+
+    def _shard(self) -> ObservabilityMetrics:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = ObservabilityMetrics()
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    @profiled("observability.log_agent_call")
     def log_agent_call(
         self,
         agent_id: str,
@@ -55,9 +244,14 @@ class AgentObservability:
         success: bool,
         cost_usd: float,
         error: Optional[str] = None,
+        model: Optional[str] = None,
+        step: Optional[str] = None,
     ) -> None:
         """
         Record an invocation of an agent, update metrics, and emit a structured log.
+
+        ``model`` and ``step`` are optional and, when given, also break the
+        latency histograms down by model and by chain step.
         """
         total_tokens = input_tokens + output_tokens
         log_data = {
@@ -70,17 +264,83 @@ class AgentObservability:
             "success": success,
             "cost_usd": round(cost_usd, 6),
             "error": error,
+            "model": model,
+            "step": step,
         }
-        # Update metrics
-        self.metrics.total_calls += 1
-        self.metrics.total_tokens += total_tokens
-        self.metrics.total_cost += cost_usd
-        self.metrics.latencies.append(latency_ms)
-        self.metrics.agent_calls[agent_id] = self.metrics.agent_calls.get(agent_id, 0) + 1
+        # Update this thread's metrics shard
+        metrics = self._shard()
+        metrics.total_calls += 1
+        metrics.total_tokens += total_tokens
+        metrics.total_cost += cost_usd
+        metrics.latency.record(latency_ms)
+        metrics.agent_latency.setdefault(agent_id, LatencyHistogram()).record(latency_ms)
+        if step is not None:
+            metrics.step_latency.setdefault(step, LatencyHistogram()).record(latency_ms)
+            metrics.step_tokens[step] = metrics.step_tokens.get(step, 0) + total_tokens
+            metrics.step_cost[step] = metrics.step_cost.get(step, 0.0) + cost_usd
+        if model is not None:
+            metrics.model_latency.setdefault(model, LatencyHistogram()).record(latency_ms)
+        metrics.agent_calls[agent_id] = metrics.agent_calls.get(agent_id, 0) + 1
+        self._record_prometheus(
+            agent_id, step or "", model or "", success,
+            input_tokens, output_tokens, cost_usd, latency_ms,
+        )
         if not success:
-            self.metrics.failures.append(log_data)
-        # Emit JSON log
-        self.logger.info(json.dumps(log_data))
+            metrics.failures.append(log_data)
+        if self._listeners:
+            self._notify({"event": "agent_call", **log_data})
+        # Emit JSON log; agent calls may be sampled, failures never are
+        self.pipeline.emit(
+            f"agent.{self.workflow_name}", log_data, sample_key=agent_id, always=not success
+        )
+
+    def _record_prometheus(
+        self,
+        agent_id: str,
+        step: str,
+        model: str,
+        success: bool,
+        input_tokens: int,
+        output_tokens: int,
+        cost_usd: float,
+        latency_ms: float,
+    ) -> None:
+        key = (agent_id, step, model, success)
+        children = self._children.get(key)
+        if children is None:
+            base = (self.workflow_name, agent_id, step, model)
+            children = (
+                self._calls.labels(*base, "ok" if success else "error"),
+                self._tokens.labels(*base, "input"),
+                self._tokens.labels(*base, "output"),
+                self._cost.labels(*base),
+                self._latency.labels(*base),
+            )
+            self._children[key] = children
+        calls, tokens_in, tokens_out, cost, latency = children
+        calls.inc()
+        tokens_in.inc(input_tokens)
+        tokens_out.inc(output_tokens)
+        cost.inc(cost_usd)
+        latency.observe(latency_ms / 1000.0)
+        self._last_call.set(time.time())
+
+    def log_validator_result(self, step: str, passed: bool) -> None:
+        """
+        Count a quality validator outcome for a chain step.
+        """
+        metrics = self._shard()
+        metrics.validator_checks[step] = metrics.validator_checks.get(step, 0) + 1
+        if passed:
+            metrics.validator_passes[step] = metrics.validator_passes.get(step, 0) + 1
+
+    def log_prompt_composition(self, step: str, tokens_by_source: Dict[str, float]) -> None:
+        """
+        Add a call's input tokens attributed to template text and each input variable.
+        """
+        sources = self._shard().prompt_tokens.setdefault(step, {})
+        for source, tokens in tokens_by_source.items():
+            sources[source] = sources.get(source, 0.0) + tokens
 
     def log_workflow_step(
         self,
@@ -97,28 +357,67 @@ class AgentObservability:
             "metadata": metadata,
             "timestamp": datetime.now().isoformat(),
         }
-        self.logger.info(json.dumps(log_data))
+        if self._listeners:
+            self._notify({"event": "workflow_step", **log_data})
+        self.pipeline.emit(f"agent.{self.workflow_name}", log_data)
+
+    def step_started(self, step_name: str, index: int, total: int) -> None:
+        """
+        Notify listeners that step ``index`` (0-based) of ``total`` started.
+        """
+        if self._listeners:
+            self._notify({"event": "step_start", "step": step_name, "index": index, "total": total})
+
+    def step_finished(self, step_name: str, index: int, total: int, duration_ms: float) -> None:
+        """
+        Notify listeners that step ``index`` (0-based) of ``total`` finished.
+        """
+        if self._listeners:
+            self._notify(
+                {
+                    "event": "step_end",
+                    "step": step_name,
+                    "index": index,
+                    "total": total,
+                    "duration_ms": duration_ms,
+                }
+            )
 
     def get_summary(self) -> Dict[str, Any]:
         """
         Return a snapshot of current metrics.
         """
-        avg_latency = (
-            sum(self.metrics.latencies) / len(self.metrics.latencies)
-            if self.metrics.latencies
-            else 0.0
-        )
+        metrics = self.snapshot_metrics()
         return {
             "workflow": self.workflow_name,
-            "total_calls": self.metrics.total_calls,
-            "total_tokens": self.metrics.total_tokens,
-            "total_cost_usd": round(self.metrics.total_cost, 4),
-            "avg_latency_ms": round(avg_latency, 2),
-            "failure_count": len(self.metrics.failures),
-            "agent_breakdown": self.metrics.agent_calls,
+            "total_calls": metrics.total_calls,
+            "total_tokens": metrics.total_tokens,
+            "total_cost_usd": round(metrics.total_cost, 4),
+            "avg_latency_ms": round(metrics.latency.mean, 2),
+            "latency_ms": metrics.latency.summary(),
+            "failure_count": len(metrics.failures),
+            "agent_breakdown": metrics.agent_calls,
             "cost_per_call": (
-                round(self.metrics.total_cost / self.metrics.total_calls, 6)
-                if self.metrics.total_calls
+                round(metrics.total_cost / metrics.total_calls, 6)
+                if metrics.total_calls
                 else 0.0
             ),
+            "latency_by_agent": {
+                k: h.summary() for k, h in metrics.agent_latency.items()
+            },
+            "latency_by_step": {
+                k: h.summary() for k, h in metrics.step_latency.items()
+            },
+            "latency_by_model": {
+                k: h.summary() for k, h in metrics.model_latency.items()
+            },
+            "prompt_tokens_by_step": {
+                step: {source: round(tokens, 1) for source, tokens in sources.items()}
+                for step, sources in metrics.prompt_tokens.items()
+            },
+            "validator_pass_rate_by_step": {
+                k: round(metrics.validator_passes.get(k, 0) / n, 4)
+                for k, n in metrics.validator_checks.items()
+            },
+            "circuit_breakers": self.breakers.snapshot(),
         }
\ No newline at end of file
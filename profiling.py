@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+ENV_VAR = "ORCHESTRATOR_PROFILE"
+
+
+@dataclass
+class SectionStats:
+    """
+    Accumulated cost of one profiled section.
+
+    Attributes:
+        calls: Number of times the section ran.
+        wall_ms: Total wall time, including time waiting on the model.
+        llm_wait_ms: Part of ``wall_ms`` spent waiting on LLM calls.
+        cpu_ms: CPU time of the running thread.
+        alloc_bytes: Net bytes allocated and still alive when the section ended
+            (process-wide, so approximate under concurrency).
+        samples: Stack samples taken while the section was innermost.
+    """
+
+    calls: int = 0
+    wall_ms: float = 0.0
+    llm_wait_ms: float = 0.0
+    cpu_ms: float = 0.0
+    alloc_bytes: int = 0
+    samples: int = 0
+
+    @property
+    def overhead_ms(self) -> float:
+        return self.wall_ms - self.llm_wait_ms
+
+
+class Profiler:
+    """
+    Opt-in profiler separating orchestration overhead from model wait time.
+
+    Code marks regions with section() (or the profiled() decorator) and
+    wraps model round trips in llm_wait(). Per section it accumulates wall,
+    LLM-wait and CPU time and net allocations (tracemalloc). A background
+    sampler records the stacks of all threads every ``sample_interval_s``
+    into collapsed-stack form for flamegraph tools, and cProfile runs on the
+    thread that started the profiler.
+
+    Attributes:
+        output_dir: Directory the reports are written to on stop().
+        sample_interval_s: Interval of the stack sampler.
+        trace_malloc: Whether to track allocations with tracemalloc.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        sample_interval_s: float = 0.005,
+        trace_malloc: bool = True,
+    ) -> None:
+        self.output_dir = output_dir
+        self.sample_interval_s = sample_interval_s
+        self.trace_malloc = trace_malloc
+        self.sections: Dict[str, SectionStats] = {}
+        self.stacks: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Innermost section name per thread, read by the sampler
+        self._innermost: Dict[int, str] = {}
+        self._cprofile = cProfile.Profile()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started_at = 0.0
+
+    def start(self) -> None:
+        if self.trace_malloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._started_at = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+        self._cprofile.enable()
+
+    def stop(self) -> None:
+        """
+        Stop profiling and write the reports to ``output_dir``.
+        """
+        self._cprofile.disable()
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.write_reports()
+        if self.trace_malloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def section(self, name: str) -> Iterator[None]:
+        stack: List[str] = self._stack()
+        tid = threading.get_ident()
+        stack.append(name)
+        self._innermost[tid] = name
+        llm_wait_before = self._llm_wait_total()
+        alloc_before = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        cpu_start = time.thread_time()
+        wall_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            alloc = (tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0) - alloc_before
+            llm_wait = self._llm_wait_total() - llm_wait_before
+            stack.pop()
+            if stack:
+                self._innermost[tid] = stack[-1]
+            else:
+                self._innermost.pop(tid, None)
+            with self._lock:
+                stats = self.sections.setdefault(name, SectionStats())
+                stats.calls += 1
+                stats.wall_ms += wall * 1000.0
+                stats.cpu_ms += cpu * 1000.0
+                stats.llm_wait_ms += llm_wait * 1000.0
+                stats.alloc_bytes += alloc
+
+    @contextmanager
+    def llm_wait(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.llm_wait = self._llm_wait_total() + time.perf_counter() - start
+
+    def report(self, top: int = 30) -> str:
+        """
+        Return the per-section table, top cProfile entries and top allocation sites.
+        """
+        total_s = time.perf_counter() - self._started_at
+        lines = [
+            f"Profiled {total_s:.2f}s wall. Times are inclusive of nested sections.",
+            "",
+            f"{'section':<40} {'calls':>6} {'wall ms':>10} {'llm ms':>10} "
+            f"{'overhead ms':>12} {'cpu ms':>10} {'alloc KiB':>10} {'samples':>8}",
+        ]
+        with self._lock:
+            items = sorted(self.sections.items(), key=lambda kv: -kv[1].overhead_ms)
+        for name, s in items:
+            lines.append(
+                f"{name[:40]:<40} {s.calls:>6} {s.wall_ms:>10.1f} {s.llm_wait_ms:>10.1f} "
+                f"{s.overhead_ms:>12.1f} {s.cpu_ms:>10.1f} {s.alloc_bytes / 1024:>10.1f} {s.samples:>8}"
+            )
+        buf = io.StringIO()
+        try:
+            pstats.Stats(self._cprofile, stream=buf).sort_stats("cumulative").print_stats(top)
+        except TypeError:
+            buf.write("(no cProfile data)\n")
+        lines += ["", "cProfile (profiler thread, by cumulative time):", buf.getvalue()]
+        if tracemalloc.is_tracing():
+            lines.append("Top allocation sites still alive:")
+            for stat in tracemalloc.take_snapshot().statistics("lineno")[:top]:
+                lines.append(f"  {stat}")
+        return "\n".join(lines)
+
+    def write_reports(self) -> None:
+        """
+        Write report.txt, sections.json, stacks.collapsed and cprofile.pstats.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, "report.txt"), "w", encoding="utf-8") as f:
+            f.write(self.report())
+        with self._lock:
+            sections = {
+                name: {**asdict(s), "overhead_ms": s.overhead_ms}
+                for name, s in self.sections.items()
+            }
+            stacks = dict(self.stacks)
+        with open(os.path.join(self.output_dir, "sections.json"), "w", encoding="utf-8") as f:
+            json.dump(sections, f, indent=2)
+        with open(os.path.join(self.output_dir, "stacks.collapsed"), "w", encoding="utf-8") as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+        try:
+            self._cprofile.dump_stats(os.path.join(self.output_dir, "cprofile.pstats"))
+        except TypeError:
+            pass
+
+    def _stack(self) -> List[str]:
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _llm_wait_total(self) -> float:
+        return getattr(self._local, "llm_wait", 0.0)
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.sample_interval_s):
+            frames = sys._current_frames()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            collapsed: List[str] = []
+            innermost: List[str] = []
+            for tid, frame in frames.items():
+                if tid == own:
+                    continue
+                parts: List[str] = []
+                f: Any = frame
+                while f is not None:
+                    code = f.f_code
+                    location = f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}"
+                    parts.append(f"{code.co_name} ({location})")
+                    f = f.f_back
+                parts.append(names.get(tid, str(tid)))
+                collapsed.append(";".join(reversed(parts)))
+                section = self._innermost.get(tid)
+                if section is not None:
+                    innermost.append(section)
+            with self._lock:
+                for stack in collapsed:
+                    self.stacks[stack] = self.stacks.get(stack, 0) + 1
+                for section in innermost:
+                    self.sections.setdefault(section, SectionStats()).samples += 1
+
+
+_active: Optional[Profiler] = None
+_NULL = nullcontext()
+
+
+def start_profiling(output_dir: str, **kwargs: Any) -> Profiler:
+    """
+    Start the process-wide profiler; sections are recorded until stop_profiling().
+    """
+    global _active
+    if _active is not None:
+        raise RuntimeError("Profiling is already active.")
+    profiler = Profiler(output_dir, **kwargs)
+    profiler.start()
+    _active = profiler
+    return profiler
+
+
+def stop_profiling() -> Optional[Profiler]:
+    """
+    Stop the process-wide profiler, write its reports and return it.
+    """
+    global _active
+    profiler, _active = _active, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+def section(name: str) -> Any:
+    """
+    Profile a block as ``name``; a shared no-op context when profiling is off.
+    """
+    profiler = _active
+    return _NULL if profiler is None else profiler.section(name)
+
+
+def llm_wait() -> Any:
+    """
+    Mark a block as waiting on the model; a no-op when profiling is off.
+    """
+    profiler = _active
+    return _NULL if profiler is None else profiler.llm_wait()
+
+
+def profiled(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """
+    Decorator profiling every call of a function as section ``name``.
+    """
+
+    def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            profiler = _active
+            if profiler is None:
+                return func(*args, **kwargs)
+            with profiler.section(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import json
+import sys
+import time
+from threading import Lock
+from typing import Any, Dict, Optional, Set, TextIO
+
+from .observability import AgentObservability
+
+
+class ProgressDisplay:
+    """
+    Live progress view fed by AgentObservability listener events.
+
+    Shows the current step or agent, completed/total steps, the latency of
+    the last call, cumulative tokens (and tokens/s) and cost, and an ETA.
+    The ETA uses historical mean step durations when given (see
+    RunHistoryStore.step_durations) and otherwise the mean duration of the
+    steps completed so far.
+
+    On a TTY the status line is redrawn in place at most every
+    ``interval_s``; otherwise a JSON progress line is written at most every
+    ``json_interval_s`` and at every step boundary.
+
+    Attributes:
+        stream: Output stream, stderr by default so results on stdout stay clean.
+        tty: Whether to redraw in place; defaults to whether stdout is a TTY.
+        step_durations_ms: Historical mean duration per step name, for the ETA.
+        interval_s: Minimum time between TTY redraws.
+        json_interval_s: Minimum time between periodic JSON lines.
+    """
+
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        tty: Optional[bool] = None,
+        step_durations_ms: Optional[Dict[str, float]] = None,
+        interval_s: float = 0.1,
+        json_interval_s: float = 5.0,
+    ) -> None:
+        self.stream = stream if stream is not None else sys.stderr
+        self.tty = tty if tty is not None else sys.stdout.isatty()
+        self.step_durations_ms = dict(step_durations_ms or {})
+        self.interval_s = interval_s
+        self.json_interval_s = json_interval_s
+        self._lock = Lock()
+        self._started = time.monotonic()
+        self._last_output = 0.0
+        self._current: Optional[str] = None
+        self._completed = 0
+        self._total: Optional[int] = None
+        self._seen_steps: Set[str] = set()
+        self._completed_ms = 0.0
+        self._step_started = 0.0
+        self._calls = 0
+        self._tokens = 0
+        self._cost = 0.0
+        self._last_latency_ms: Optional[float] = None
+        self._line_width = 0
+
+    def attach(self, observability: AgentObservability) -> "ProgressDisplay":
+        observability.add_listener(self.on_event)
+        return self
+
+    def on_event(self, event: Dict[str, Any]) -> None:
+        kind = event.get("event")
+        with self._lock:
+            now = time.monotonic()
+            boundary = False
+            if kind == "step_start":
+                self._current = event["step"]
+                self._seen_steps.add(event["step"])
+                self._total = event["total"]
+                self._step_started = now
+                boundary = True
+            elif kind == "step_end":
+                self._completed = event["index"] + 1
+                self._total = event["total"]
+                self._completed_ms += event["duration_ms"]
+                boundary = True
+            elif kind == "agent_call":
+                self._calls += 1
+                self._tokens += event.get("total_tokens", 0)
+                self._cost += event.get("cost_usd", 0.0)
+                self._last_latency_ms = event.get("latency_ms")
+                if self._total is None:
+                    self._current = event.get("step") or event.get("agent_id")
+            elif kind == "workflow_step":
+                if self._total is None:
+                    self._current = event.get("step_name")
+            else:
+                return
+            interval = self.interval_s if self.tty else self.json_interval_s
+            if boundary or now - self._last_output >= interval:
+                self._last_output = now
+                self._write(self._snapshot(now))
+
+    def finish(self) -> None:
+        """
+        Write a final status and, on a TTY, move to a fresh line.
+        """
+        with self._lock:
+            self._current = None
+            self._write(self._snapshot(time.monotonic()))
+            if self.tty:
+                self.stream.write("\n")
+                self.stream.flush()
+
+    def _snapshot(self, now: float) -> Dict[str, Any]:
+        elapsed = now - self._started
+        return {
+            "step": self._current,
+            "completed": self._completed,
+            "total": self._total,
+            "calls": self._calls,
+            "last_latency_ms": self._last_latency_ms,
+            "tokens": self._tokens,
+            "tokens_per_s": round(self._tokens / elapsed, 1) if elapsed > 0 else 0.0,
+            "cost_usd": round(self._cost, 6),
+            "elapsed_s": round(elapsed, 1),
+            "eta_s": self._eta_s(now),
+        }
+
+    def _eta_s(self, now: float) -> Optional[float]:
+        if self._total is None or self._current is None:
+            return None
+        after_current = self._total - self._completed - 1
+        if after_current < 0:
+            return 0.0
+        history = self.step_durations_ms
+        if history:
+            per_step_ms = sum(history.values()) / len(history)
+        elif self._completed:
+            per_step_ms = self._completed_ms / self._completed
+        else:
+            return None
+        in_step_ms = (now - self._step_started) * 1000.0
+        eta_ms = max(history.get(self._current, per_step_ms) - in_step_ms, 0.0)
+        # Steps known from history but not started yet, then the rest at the mean
+        upcoming = [ms for name, ms in history.items() if name not in self._seen_steps]
+        eta_ms += sum(upcoming[:after_current])
+        eta_ms += per_step_ms * max(after_current - len(upcoming), 0)
+        return round(eta_ms / 1000.0, 1)
+
+    def _write(self, snap: Dict[str, Any]) -> None:
+        if not self.tty:
+            self.stream.write(json.dumps({"progress": snap}) + "\n")
+            self.stream.flush()
+            return
+        steps = f"[{snap['completed']}/{snap['total']}]" if snap["total"] else ""
+        latency = (
+            f"last {snap['last_latency_ms'] / 1000.0:.1f}s" if snap["last_latency_ms"] is not None else ""
+        )
+        eta = f"ETA {_format_seconds(snap['eta_s'])}" if snap["eta_s"] is not None else ""
+        parts = [
+            steps,
+            snap["step"] or "done",
+            latency,
+            f"{snap['tokens']:,} tok ({snap['tokens_per_s']:,.0f}/s)",
+            f"${snap['cost_usd']:.4f}",
+            _format_seconds(snap["elapsed_s"]),
+            eta,
+        ]
+        line = " | ".join(p for p in parts if p)
+        padding = max(self._line_width - len(line), 0)
+        self._line_width = len(line)
+        self.stream.write("\r" + line + " " * padding)
+        self.stream.flush()
+
+
+def _format_seconds(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes}m{secs:02d}s" if minutes else f"{secs}s"
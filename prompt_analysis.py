@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import string
+from collections import defaultdict
+from typing import Any, Dict, List, Mapping, Tuple
+
+
+# Source name for the static text of a prompt template
+TEMPLATE_SOURCE = "(template)"
+
+_FORMATTER = string.Formatter()
+
+
+def render_with_composition(
+    template: str, values: Mapping[str, Any]
+) -> Tuple[str, Dict[str, int]]:
+    """
+    Render ``template`` like ``template.format(**values)`` and report how many
+    characters of the result came from the static template text and from
+    each substituted variable.
+
+    Field expressions such as ``{doc.title}`` or ``{items[0]}`` are counted
+    under their root variable (``doc``, ``items``).
+
+    Returns:
+        The rendered prompt and a mapping of source to character count.
+    """
+    pieces: List[str] = []
+    chars: Dict[str, int] = defaultdict(int)
+    for literal, field_name, spec, conversion in _FORMATTER.parse(template):
+        if literal:
+            pieces.append(literal)
+            chars[TEMPLATE_SOURCE] += len(literal)
+        if field_name is None:
+            continue
+        if not field_name or field_name[0].isdigit():
+            raise ValueError(f"Prompt templates only support named fields, got {{{field_name}}}")
+        obj, root = _FORMATTER.get_field(field_name, (), values)
+        obj = _FORMATTER.convert_field(obj, conversion)
+        if spec and "{" in spec:
+            spec = _FORMATTER.vformat(spec, (), values)
+        rendered = _FORMATTER.format_field(obj, spec or "")
+        pieces.append(rendered)
+        chars[str(root)] += len(rendered)
+    return "".join(pieces), dict(chars)
+
+
+def attribute_tokens(chars: Mapping[str, int], input_tokens: int) -> Dict[str, float]:
+    """
+    Split a call's billed input tokens across sources in proportion to their characters.
+    """
+    total = sum(chars.values())
+    if not total:
+        return {}
+    return {source: input_tokens * n / total for source, n in chars.items()}
+
+
+def format_composition_report(by_step: Mapping[str, Mapping[str, float]], runs: int = 1) -> str:
+    """
+    Render per-step input token shares by source, largest steps and sources first.
+
+    Args:
+        by_step: Attributed input tokens per step and source.
+        runs: Number of runs aggregated, used to show per-run averages.
+    """
+    lines: List[str] = []
+    steps = sorted(by_step.items(), key=lambda kv: -sum(kv[1].values()))
+    grand_total = sum(sum(sources.values()) for _, sources in steps) or 1.0
+    for step, sources in steps:
+        step_total = sum(sources.values())
+        lines.append(
+            f"{step}: {step_total / max(runs, 1):,.0f} input tokens/run "
+            f"({step_total / grand_total:.0%} of all input tokens)"
+        )
+        for source, tokens in sorted(sources.items(), key=lambda kv: -kv[1]):
+            share = tokens / step_total if step_total else 0.0
+            bar = "#" * round(share * 30)
+            lines.append(f"  {source:<28} {share:>6.1%} {tokens / max(runs, 1):>10,.0f}  {bar}")
+        lines.append("")
+    return "\n".join(lines)
@@ -1,13 +1,35 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Callable, TypeVar, Optional
+import asyncio
 import random
+import threading
 import time
+from collections import deque
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Literal, Optional, Tuple, TypeVar
+
+try:
+    # Provider exception types, used for classification when available.
+    from anthropic import APIConnectionError  # type: ignore[import]
+except ImportError:  # pragma: no cover
+    APIConnectionError = None  # type: ignore[assignment,misc]
+
+from .log_pipeline import LogPipeline, get_default_pipeline
+from .metrics import MetricsRegistry, get_default_registry
+from .tracing import span
 
 
 T = TypeVar("T")
 
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits, server errors
+# and Anthropic's 529 "overloaded".
+RETRYABLE_STATUS_CODES: Tuple[int, ...] = (408, 409, 429, 500, 502, 503, 504, 529)
+
+_CONNECTION_ERRORS: Tuple[type, ...] = (ConnectionError, TimeoutError, asyncio.TimeoutError)
+if APIConnectionError is not None:
+    _CONNECTION_ERRORS += (APIConnectionError,)
+
 
 @dataclass
 class RetryConfig:
@@ -20,18 +42,235 @@ class RetryConfig:
         max_delay: Maximum delay in seconds between attempts.
         exponential_base: Growth factor for exponential backoff.
         jitter: Whether to apply random jitter to backoff.
+        retryable_status_codes: HTTP statuses that are retried.
+        respect_retry_after: Whether a server ``retry-after`` hint overrides backoff.
+        max_retry_after: Upper bound in seconds on an honored ``retry-after``;
+            longer hints are treated as not retryable.
     """
     max_attempts: int = 3
     base_delay: float = 1.0
     max_delay: float = 60.0
     exponential_base: float = 2.0
     jitter: bool = True
+    retryable_status_codes: Tuple[int, ...] = RETRYABLE_STATUS_CODES
+    respect_retry_after: bool = True
+    max_retry_after: float = 120.0
+
+
+@dataclass
+class RetryAttempt:
+    """
+    Outcome of one attempt, passed to ``on_attempt`` callbacks.
+
+    Attributes:
+        attempt: 1-based attempt number.
+        error: The exception raised, or None on success.
+        status_code: HTTP status of the error, when known.
+        retry_after: Server-requested delay in seconds, when given.
+        delay: Seconds slept before the next attempt; 0 when not retrying.
+        will_retry: Whether another attempt follows.
+        budget_denied: Whether a retry was refused by the retry budget.
+    """
+    attempt: int
+    error: Optional[BaseException] = None
+    status_code: Optional[int] = None
+    retry_after: Optional[float] = None
+    delay: float = 0.0
+    will_retry: bool = False
+    budget_denied: bool = False
+
+
+def error_status_code(exc: BaseException) -> Optional[int]:
+    """
+    Return the HTTP status carried by a provider or HTTP client exception, if any.
+    """
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """
+    Parse ``retry-after-ms`` or ``retry-after`` (seconds or HTTP date) from an error's response headers.
+    """
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return max(float(value) / 1000.0, 0.0)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def is_retryable_error(exc: BaseException, cfg: Optional[RetryConfig] = None) -> bool:
+    """
+    Classify an error by type and HTTP status; unknown errors are not retried.
+    """
+    cfg = cfg or RetryConfig()
+    status = error_status_code(exc)
+    if status is not None:
+        if status not in cfg.retryable_status_codes:
+            return False
+        retry_after = retry_after_seconds(exc)
+        return retry_after is None or retry_after <= cfg.max_retry_after
+    return isinstance(exc, _CONNECTION_ERRORS)
+
+
+def backoff_delay(cfg: RetryConfig, attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Return the delay before attempt ``attempt + 1`` (``attempt`` is 0-based).
+
+    A server ``retry-after`` hint wins over exponential backoff when enabled.
+    """
+    if retry_after is not None and cfg.respect_retry_after:
+        return min(retry_after, cfg.max_retry_after)
+    delay = min(cfg.base_delay * (cfg.exponential_base ** attempt), cfg.max_delay)
+    if cfg.jitter:
+        delay *= 0.5 + random.random()
+    return delay
+
+
+class RetryBudget:
+    """
+    Caps retries at a share of recent successful requests, per key (model).
+
+    Over the last ``window_s`` seconds a key may retry at most
+    ``ratio * successes + min_retries_per_s * window_s`` times; the floor
+    keeps low-traffic keys able to retry at all. During a provider incident
+    successes dry up, so retries stop multiplying load while first attempts
+    still go through. Counts are kept in one-second buckets.
+
+    Attributes:
+        ratio: Retries allowed per successful request in the window.
+        window_s: Length of the sliding window in seconds.
+        min_retries_per_s: Retry allowance independent of traffic.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.1,
+        window_s: int = 10,
+        min_retries_per_s: float = 1.0,
+        registry: Optional[MetricsRegistry] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ratio = ratio
+        self.window_s = window_s
+        self.min_retries_per_s = min_retries_per_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Per key: deque of [second, successes, retries]
+        self._buckets: Dict[str, Deque[List[int]]] = {}
+        registry = registry if registry is not None else get_default_registry()
+        self._denied = registry.counter(
+            "orchestrator_retries_denied_total",
+            "Retries refused by the retry budget, per model.",
+            ("model",),
+        )
+        self._allowed = registry.counter(
+            "orchestrator_retries_allowed_total",
+            "Retries permitted by the retry budget, per model.",
+            ("model",),
+        )
+
+    def record_success(self, key: str) -> None:
+        with self._lock:
+            self._bucket(key)[1] += 1
+
+    def try_acquire(self, key: str) -> bool:
+        """
+        Spend one retry from ``key``'s budget; False means do not retry.
+        """
+        with self._lock:
+            bucket = self._bucket(key)
+            buckets = self._buckets[key]
+            successes = sum(b[1] for b in buckets)
+            retries = sum(b[2] for b in buckets)
+            allowed = retries < self.ratio * successes + self.min_retries_per_s * self.window_s
+            if allowed:
+                bucket[2] += 1
+        (self._allowed if allowed else self._denied).labels(key).inc()
+        return allowed
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                key: {
+                    "successes": sum(b[1] for b in buckets),
+                    "retries": sum(b[2] for b in buckets),
+                }
+                for key, buckets in self._buckets.items()
+            }
+
+    def _bucket(self, key: str) -> List[int]:
+        now = int(self._clock())
+        buckets = self._buckets.setdefault(key, deque())
+        while buckets and buckets[0][0] <= now - self.window_s:
+            buckets.popleft()
+        if not buckets or buckets[-1][0] != now:
+            buckets.append([now, 0, 0])
+        return buckets[-1]
+
+
+_default_retry_budget: Optional[RetryBudget] = None
+_default_retry_budget_lock = threading.Lock()
+
+
+def get_default_retry_budget() -> RetryBudget:
+    """
+    Return the process-wide retry budget, created on first use.
+    """
+    global _default_retry_budget
+    if _default_retry_budget is None:
+        with _default_retry_budget_lock:
+            if _default_retry_budget is None:
+                _default_retry_budget = RetryBudget()
+    return _default_retry_budget
+
+
+def _plan_retry(
+    cfg: RetryConfig,
+    attempt: int,
+    exc: Exception,
+    predicate: Optional[Callable[[Exception], bool]],
+    budget: Optional[RetryBudget],
+    budget_key: str,
+) -> RetryAttempt:
+    retryable = predicate(exc) if predicate is not None else is_retryable_error(exc, cfg)
+    retry_after = retry_after_seconds(exc)
+    will_retry = retryable and attempt < cfg.max_attempts - 1
+    budget_denied = False
+    if will_retry and budget is not None and not budget.try_acquire(budget_key):
+        will_retry = False
+        budget_denied = True
+    return RetryAttempt(
+        attempt=attempt + 1,
+        error=exc,
+        status_code=error_status_code(exc),
+        retry_after=retry_after,
+        delay=backoff_delay(cfg, attempt, retry_after) if will_retry else 0.0,
+        will_retry=will_retry,
+        budget_denied=budget_denied,
+    )
 
 
 def execute_with_retry(
     func: Callable[[], T],
     retry_config: Optional[RetryConfig] = None,
     is_retryable: Optional[Callable[[Exception], bool]] = None,
+    on_attempt: Optional[Callable[[RetryAttempt], None]] = None,
+    retry_budget: Optional[RetryBudget] = None,
+    budget_key: str = "default",
 ) -> T:
     """
     Execute a callable with retry semantics using exponential backoff.
@@ -39,7 +278,12 @@ def execute_with_retry(
     Args:
         func: Callable returning a value.
         retry_config: Override default retry behavior.
-        is_retryable: Callable to determine whether an exception is retryable.
+        is_retryable: Callable to determine whether an exception is retryable;
+            defaults to is_retryable_error.
+        on_attempt: Called after every attempt, successful or not.
+        retry_budget: Shared budget every retry must be granted by; successes
+            replenish it.
+        budget_key: Budget bucket to charge, typically the model name.
 
     Returns:
         The callable's return value.
@@ -48,30 +292,335 @@ def execute_with_retry(
         The last encountered exception if all retries fail.
     """
     cfg = retry_config or RetryConfig()
+    for attempt in range(cfg.max_attempts):
+        try:
+            with span("retry.attempt", attempt=attempt + 1):
+                result = func()
+        except Exception as e:  # noqa: BLE001
+            outcome = _plan_retry(cfg, attempt, e, is_retryable, retry_budget, budget_key)
+            if on_attempt is not None:
+                on_attempt(outcome)
+            if not outcome.will_retry:
+                raise
+            time.sleep(outcome.delay)
+        else:
+            if retry_budget is not None:
+                retry_budget.record_success(budget_key)
+            if on_attempt is not None:
+                on_attempt(RetryAttempt(attempt=attempt + 1))
+            return result
+    raise RuntimeError("execute_with_retry failed unexpectedly without raising an error.")
 
-    def default_is_retryable(e: Exception) -> bool:
-        s = str(e).lower()
-        # Marker substrings for common retryable errors
-        retryable_markers = ("rate_limit", "timeout", "overloaded", "api_error")
-        return any(m in s for m in retryable_markers)
-
-    predicate = is_retryable or default_is_retryable
 
-    last_exc: Optional[Exception] = None
+async def aexecute_with_retry(
+    func: Callable[[], Awaitable[T]],
+    retry_config: Optional[RetryConfig] = None,
+    is_retryable: Optional[Callable[[Exception], bool]] = None,
+    on_attempt: Optional[Callable[[RetryAttempt], None]] = None,
+    retry_budget: Optional[RetryBudget] = None,
+    budget_key: str = "default",
+) -> T:
+    """
+    Async variant of execute_with_retry; backs off with ``asyncio.sleep``.
+    """
+    cfg = retry_config or RetryConfig()
     for attempt in range(cfg.max_attempts):
         try:
-            return func()
+            with span("retry.attempt", attempt=attempt + 1):
+                result = await func()
         except Exception as e:  # noqa: BLE001
-            last_exc = e
-            # Give up if not retryable or last attempt
-            if not predicate(e) or attempt == cfg.max_attempts - 1:
-                break
-            # Compute backoff delay
-            delay = min(cfg.base_delay * (cfg.exponential_base ** attempt), cfg.max_delay)
-            if cfg.jitter:
-                delay *= 0.5 + random.random()
-            time.sleep(delay)
-    # Exhausted attempts: raise last error
-    if last_exc is not None:
-        raise last_exc
-    raise RuntimeError("execute_with_retry failed unexpectedly without raising an error.")
\ No newline at end of file
+            outcome = _plan_retry(cfg, attempt, e, is_retryable, retry_budget, budget_key)
+            if on_attempt is not None:
+                on_attempt(outcome)
+            if not outcome.will_retry:
+                raise
+            await asyncio.sleep(outcome.delay)
+        else:
+            if retry_budget is not None:
+                retry_budget.record_success(budget_key)
+            if on_attempt is not None:
+                on_attempt(RetryAttempt(attempt=attempt + 1))
+            return result
+    raise RuntimeError("aexecute_with_retry failed unexpectedly without raising an error.")
+
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+_STATE_VALUES: Dict[str, int] = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling a model whose circuit breaker is open.
+
+    Attributes:
+        model: The model whose breaker rejected the call.
+        retry_in: Seconds until the breaker lets a probe call through.
+    """
+
+    def __init__(self, model: str, retry_in: float) -> None:
+        super().__init__(f"Circuit breaker for {model} is open; retry in {retry_in:.1f}s.")
+        self.model = model
+        self.retry_in = retry_in
+
+
+@dataclass
+class CircuitBreakerConfig:
+    """
+    Thresholds for opening a per-model circuit breaker.
+
+    The breaker opens when, over the last ``window_s`` seconds and at least
+    ``min_calls`` calls, the failure rate reaches ``failure_rate_threshold``
+    or the share of calls slower than ``slow_call_ms`` reaches
+    ``slow_call_rate_threshold``. After ``open_duration_s`` it lets up to
+    ``half_open_max_calls`` probe calls through; one failed probe reopens
+    it and that many successful probes close it.
+
+    Attributes:
+        window_s: Length of the sliding outcome window.
+        min_calls: Minimum calls in the window before the breaker can open.
+        failure_rate_threshold: Failure share (0-1) that opens the breaker.
+        slow_call_ms: Latency above which a successful call counts as slow.
+        slow_call_rate_threshold: Slow-call share (0-1) that opens the breaker.
+        open_duration_s: Time spent open before probing.
+        half_open_max_calls: Concurrent probe calls allowed while half-open.
+    """
+    window_s: float = 60.0
+    min_calls: int = 10
+    failure_rate_threshold: float = 0.5
+    slow_call_ms: float = 60_000.0
+    slow_call_rate_threshold: float = 1.0
+    open_duration_s: float = 30.0
+    half_open_max_calls: int = 1
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker for one model, driven by error rate and latency.
+
+    Callers ask acquire() before a call and report the outcome with
+    record_success() or record_failure(). Only transient failures (see
+    is_retryable_error) should be reported as failures; a malformed request
+    says nothing about the model's health.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config: Optional[CircuitBreakerConfig] = None,
+        clock: Callable[[], float] = time.monotonic,
+        on_transition: Optional[Callable[[str, str, str], None]] = None,
+    ) -> None:
+        self.name = name
+        self.config = config or CircuitBreakerConfig()
+        self._clock = clock
+        self._on_transition = on_transition
+        self._lock = threading.Lock()
+        self._state: CircuitState = "closed"
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        # (timestamp, failed, slow) per completed call
+        self._outcomes: Deque[Tuple[float, bool, bool]] = deque()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            self._maybe_half_open(self._clock())
+            return self._state
+
+    def is_available(self) -> bool:
+        """
+        Whether a call would currently be let through, without claiming a probe slot.
+        """
+        with self._lock:
+            self._maybe_half_open(self._clock())
+            if self._state == "half_open":
+                return self._probes_in_flight < self.config.half_open_max_calls
+            return self._state == "closed"
+
+    def acquire(self) -> bool:
+        """
+        Claim permission for one call; False means fail fast.
+        """
+        with self._lock:
+            self._maybe_half_open(self._clock())
+            if self._state == "closed":
+                return True
+            if self._state == "half_open" and self._probes_in_flight < self.config.half_open_max_calls:
+                self._probes_in_flight += 1
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        """
+        Seconds until an open breaker starts probing; 0 when not open.
+        """
+        with self._lock:
+            if self._state != "open":
+                return 0.0
+            return max(self._opened_at + self.config.open_duration_s - self._clock(), 0.0)
+
+    def record_success(self, latency_ms: float = 0.0) -> None:
+        self._record(failed=False, slow=latency_ms >= self.config.slow_call_ms)
+
+    def record_failure(self) -> None:
+        self._record(failed=True, slow=False)
+
+    def release(self) -> None:
+        """
+        Give back a slot claimed by acquire() without recording an outcome.
+
+        For calls that ended in a way that says nothing about the model's
+        health, e.g. a rejected request, a malformed response or cancellation.
+        """
+        with self._lock:
+            if self._state == "half_open":
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self._clock()
+            self._maybe_half_open(now)
+            self._trim(now)
+            calls = len(self._outcomes)
+            failures = sum(1 for _, failed, _ in self._outcomes if failed)
+            slow = sum(1 for _, _, is_slow in self._outcomes if is_slow)
+            return {
+                "state": self._state,
+                "calls": calls,
+                "failure_rate": round(failures / calls, 4) if calls else 0.0,
+                "slow_call_rate": round(slow / calls, 4) if calls else 0.0,
+            }
+
+    def _record(self, failed: bool, slow: bool) -> None:
+        transition = None
+        with self._lock:
+            now = self._clock()
+            self._maybe_half_open(now)
+            if self._state == "half_open":
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if failed or slow:
+                    transition = self._set_state("open", now)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.config.half_open_max_calls:
+                        transition = self._set_state("closed", now)
+            elif self._state == "closed":
+                self._outcomes.append((now, failed, slow))
+                self._trim(now)
+                if self._should_open():
+                    transition = self._set_state("open", now)
+        if transition is not None and self._on_transition is not None:
+            self._on_transition(self.name, *transition)
+
+    def _should_open(self) -> bool:
+        calls = len(self._outcomes)
+        if calls < self.config.min_calls:
+            return False
+        failures = sum(1 for _, failed, _ in self._outcomes if failed)
+        slow = sum(1 for _, _, is_slow in self._outcomes if is_slow)
+        return (
+            failures / calls >= self.config.failure_rate_threshold
+            or slow / calls >= self.config.slow_call_rate_threshold
+        )
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - self.config.window_s
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+    def _maybe_half_open(self, now: float) -> None:
+        if self._state == "open" and now - self._opened_at >= self.config.open_duration_s:
+            transition = self._set_state("half_open", now)
+            if self._on_transition is not None:
+                # Reported from inside the lock; the callback must not re-enter this breaker.
+                self._on_transition(self.name, *transition)
+
+    def _set_state(self, state: CircuitState, now: float) -> Tuple[str, str]:
+        old, self._state = self._state, state
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        if state == "open":
+            self._opened_at = now
+        if state == "closed":
+            self._outcomes.clear()
+        return old, state
+
+
+class CircuitBreakerRegistry:
+    """
+    Per-model circuit breakers shared by CostRouter and LLMClient.
+
+    State changes are exported as ``orchestrator_circuit_state{model}``
+    (0 closed, 1 half-open, 2 open) and
+    ``orchestrator_circuit_transitions_total{model,state}``, and logged as
+    warnings to the log pipeline.
+    """
+
+    def __init__(
+        self,
+        config: Optional[CircuitBreakerConfig] = None,
+        registry: Optional[MetricsRegistry] = None,
+        pipeline: Optional[LogPipeline] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.config = config or CircuitBreakerConfig()
+        self._clock = clock
+        self._pipeline = pipeline
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        registry = registry if registry is not None else get_default_registry()
+        self._state_gauge = registry.gauge(
+            "orchestrator_circuit_state",
+            "Circuit breaker state per model: 0 closed, 1 half-open, 2 open.",
+            ("model",),
+        )
+        self._transitions = registry.counter(
+            "orchestrator_circuit_transitions_total",
+            "Circuit breaker state changes per model and new state.",
+            ("model", "state"),
+        )
+
+    def get(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(model)
+                if breaker is None:
+                    breaker = CircuitBreaker(model, self.config, self._clock, self._transitioned)
+                    self._breakers[model] = breaker
+                    self._state_gauge.labels(model).set(0)
+        return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {b.name: b.snapshot() for b in breakers}
+
+    def _transitioned(self, model: str, old: str, new: str) -> None:
+        self._state_gauge.labels(model).set(_STATE_VALUES[new])
+        self._transitions.labels(model, new).inc()
+        pipeline = self._pipeline if self._pipeline is not None else get_default_pipeline()
+        pipeline.emit(
+            "circuit_breaker",
+            {"model": model, "from": old, "to": new},
+            level="WARNING" if new == "open" else "INFO",
+            always=True,
+        )
+
+
+_default_breakers: Optional[CircuitBreakerRegistry] = None
+_default_breakers_lock = threading.Lock()
+
+
+def get_default_breakers() -> CircuitBreakerRegistry:
+    """
+    Return the process-wide circuit breaker registry, created on first use.
+    """
+    global _default_breakers
+    if _default_breakers is None:
+        with _default_breakers_lock:
+            if _default_breakers is None:
+                _default_breakers = CircuitBreakerRegistry()
+    return _default_breakers
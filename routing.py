@@ -0,0 +1,349 @@
+from __future__ import annotations
+
+import json
+import os
+import random
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from .histogram import LatencyHistogram
+from .log_pipeline import LogPipeline, get_default_pipeline
+from .metrics import MetricsRegistry, get_default_registry
+
+
+@dataclass
+class TierStats:
+    """
+    Observed outcomes of one tier for one route (chain step or agent).
+
+    Attributes:
+        calls: Completed and failed calls.
+        checks: Calls whose output went through a quality validator, plus
+            failed calls, which count as failed checks.
+        passes: Validator checks that passed.
+        errors: Calls that raised (timeouts, API errors) instead of returning.
+        cost_usd: Total estimated spend.
+        latency: Call latency distribution in milliseconds.
+    """
+
+    calls: int = 0
+    checks: int = 0
+    passes: int = 0
+    errors: int = 0
+    cost_usd: float = 0.0
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    @property
+    def pass_rate(self) -> Optional[float]:
+        return self.passes / self.checks if self.checks else None
+
+    @property
+    def cost_per_call(self) -> float:
+        return self.cost_usd / self.calls if self.calls else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "checks": self.checks,
+            "passes": self.passes,
+            "errors": self.errors,
+            "cost_usd": self.cost_usd,
+            "latency": self.latency.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TierStats":
+        return cls(
+            calls=data["calls"],
+            checks=data["checks"],
+            passes=data["passes"],
+            errors=data.get("errors", 0),
+            cost_usd=data["cost_usd"],
+            latency=LatencyHistogram.from_dict(data["latency"]),
+        )
+
+
+@dataclass
+class RoutingDecision:
+    """
+    A tier choice and why it was made.
+
+    Attributes:
+        route: Chain step or agent the call belongs to.
+        tier: Chosen tier name.
+        reason: Human-readable justification, also logged.
+        kind: "target_met", "default" or "explore".
+    """
+
+    route: str
+    tier: str
+    reason: str
+    kind: str
+
+
+class LearnedRouter:
+    """
+    Learns per route which tier is cheapest while still passing validation.
+
+    For each route (a ChainStep name or agent id) and tier it records the
+    validator pass rate, error count, latency and cost. Calls that raise count
+    as failed checks, so a tier that keeps failing or timing out stops
+    qualifying however good its validated output. choose() walks the tiers from
+    cheapest to most expensive and picks the first whose pass rate over at
+    least ``min_checks`` validated calls reaches ``target_pass_rate``. Until
+    some tier qualifies the static default is used. With probability
+    ``exploration_rate`` another tier is tried instead, so cheaper tiers get
+    the samples needed to qualify and stale statistics get refreshed.
+
+    Every decision is written to the log pipeline (sampled per route) with
+    its reason and counted in ``orchestrator_routing_decisions_total``.
+    Statistics persist across runs when ``state_path`` is given; call
+    save() to write them.
+
+    Attributes:
+        target_pass_rate: Minimum validator pass rate a tier must reach.
+        min_checks: Validated calls needed before a tier's pass rate is trusted.
+        exploration_rate: Share of decisions that try a different tier.
+        state_path: JSON file the statistics are loaded from and saved to.
+    """
+
+    def __init__(
+        self,
+        target_pass_rate: float = 0.9,
+        min_checks: int = 10,
+        exploration_rate: float = 0.05,
+        state_path: Optional[str] = None,
+        rng: Optional[random.Random] = None,
+        pipeline: Optional[LogPipeline] = None,
+        registry: Optional[MetricsRegistry] = None,
+    ) -> None:
+        self.target_pass_rate = target_pass_rate
+        self.min_checks = min_checks
+        self.exploration_rate = exploration_rate
+        self.state_path = state_path
+        self._rng = rng or random.Random()
+        self._pipeline = pipeline
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, TierStats]] = {}
+        registry = registry if registry is not None else get_default_registry()
+        self._decisions = registry.counter(
+            "orchestrator_routing_decisions_total",
+            "Learned routing decisions per route, tier and kind (target_met, default, explore).",
+            ("route", "tier", "kind"),
+        )
+        if state_path and os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.stats = {
+                    route: {tier: TierStats.from_dict(s) for tier, s in tiers.items()}
+                    for route, tiers in json.load(f).items()
+                }
+
+    def choose(self, route: str, default_tier: str, tiers_by_cost: Sequence[str]) -> RoutingDecision:
+        """
+        Pick a tier for ``route`` from ``tiers_by_cost`` (cheapest first).
+        """
+        with self._lock:
+            tiers = self.stats.get(route, {})
+            decision = None
+            for tier in tiers_by_cost:
+                s = tiers.get(tier)
+                if s is None or s.checks < self.min_checks or s.passes < self.target_pass_rate * s.checks:
+                    continue
+                decision = RoutingDecision(
+                    route,
+                    tier,
+                    f"cheapest tier meeting target {self.target_pass_rate:.0%}: pass rate "
+                    f"{s.passes / s.checks:.0%} over {s.checks} checks, ${s.cost_per_call:.4f}/call, "
+                    f"p50 {s.latency.quantile(0.5):.0f}ms",
+                    "target_met",
+                )
+                break
+            if decision is None:
+                decision = RoutingDecision(
+                    route,
+                    default_tier,
+                    f"no tier has {self.min_checks}+ checks at {self.target_pass_rate:.0%} pass rate; "
+                    "static default",
+                    "default",
+                )
+            others = [t for t in tiers_by_cost if t != decision.tier]
+            if others and self._rng.random() < self.exploration_rate:
+                tier = self._rng.choice(others)
+                s = tiers.get(tier)
+                seen = f"{s.checks} checks so far" if s is not None else "no data yet"
+                decision = RoutingDecision(
+                    route, tier, f"exploring instead of {decision.tier} ({seen})", "explore"
+                )
+        self._decisions.labels(route, decision.tier, decision.kind).inc()
+        pipeline = self._pipeline if self._pipeline is not None else get_default_pipeline()
+        pipeline.emit(
+            "routing",
+            {"route": route, "tier": decision.tier, "kind": decision.kind, "reason": decision.reason},
+            sample_key=route,
+        )
+        return decision
+
+    def record(
+        self,
+        route: str,
+        tier: str,
+        latency_ms: float,
+        cost_usd: float,
+        passed: Optional[bool] = None,
+        error: bool = False,
+    ) -> None:
+        """
+        Record a call; ``passed`` is the validator result, if any, and
+        ``error`` marks a call that raised, recorded as a failed check.
+        """
+        with self._lock:
+            s = self.stats.setdefault(route, {}).setdefault(tier, TierStats())
+            s.calls += 1
+            s.cost_usd += cost_usd
+            s.latency.record(latency_ms)
+            if error:
+                s.errors += 1
+                s.checks += 1
+            elif passed is not None:
+                s.checks += 1
+                s.passes += int(passed)
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Return per route and tier: calls, pass rate, cost per call and latency summary.
+        """
+        with self._lock:
+            return {
+                route: {
+                    tier: {
+                        "calls": s.calls,
+                        "checks": s.checks,
+                        "errors": s.errors,
+                        "pass_rate": s.pass_rate,
+                        "cost_per_call": round(s.cost_per_call, 6),
+                        "latency_ms": s.latency.summary(),
+                    }
+                    for tier, s in tiers.items()
+                }
+                for route, tiers in self.stats.items()
+            }
+
+    def save(self, path: Optional[str] = None) -> None:
+        """
+        Atomically write the statistics as JSON to ``path`` or ``state_path``.
+        """
+        path = path or self.state_path
+        if not path:
+            raise ValueError("No path given and no state_path configured.")
+        with self._lock:
+            data = {
+                route: {tier: s.to_dict() for tier, s in tiers.items()}
+                for route, tiers in self.stats.items()
+            }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+
+class LatencyModel:
+    """
+    Observed latency per model, bucketed by output length.
+
+    Output token counts are bucketed by powers of two, since generation
+    time grows with output length. predict() returns the chosen quantile of
+    the matching bucket; when that bucket has fewer than ``min_samples``
+    observations it scales the nearest populated bucket by the ratio of
+    token counts. It also tracks the mean output length per route, to
+    estimate how long a route's next call will generate for.
+
+    Observations persist across runs when ``state_path`` is given; call
+    save() to write them.
+
+    Attributes:
+        min_samples: Observations a bucket needs before it is used directly.
+        state_path: JSON file the observations are loaded from and saved to.
+    """
+
+    def __init__(self, min_samples: int = 5, state_path: Optional[str] = None) -> None:
+        self.min_samples = min_samples
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._latency: Dict[str, Dict[int, LatencyHistogram]] = {}
+        # Per route: [calls, total output tokens]
+        self._route_tokens: Dict[str, List[int]] = {}
+        if state_path and os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._latency = {
+                model: {int(b): LatencyHistogram.from_dict(h) for b, h in buckets.items()}
+                for model, buckets in data["latency"].items()
+            }
+            self._route_tokens = data["route_tokens"]
+
+    def record(self, model: str, latency_ms: float, output_tokens: int, route: Optional[str] = None) -> None:
+        with self._lock:
+            buckets = self._latency.setdefault(model, {})
+            buckets.setdefault(_token_bucket(output_tokens), LatencyHistogram()).record(latency_ms)
+            if route is not None:
+                totals = self._route_tokens.setdefault(route, [0, 0])
+                totals[0] += 1
+                totals[1] += output_tokens
+
+    def expected_output_tokens(self, route: str) -> Optional[float]:
+        with self._lock:
+            totals = self._route_tokens.get(route)
+        return totals[1] / totals[0] if totals and totals[0] else None
+
+    def predict(self, model: str, output_tokens: float, quantile: float = 0.9) -> Optional[float]:
+        """
+        Return the predicted ``quantile`` latency in ms, or None without data for ``model``.
+        """
+        target = _token_bucket(output_tokens)
+        with self._lock:
+            populated = [
+                (bucket, hist)
+                for bucket, hist in self._latency.get(model, {}).items()
+                if hist.count >= self.min_samples
+            ]
+            if not populated:
+                return None
+            bucket, hist = min(populated, key=lambda item: abs(item[0] - target))
+            latency = hist.quantile(quantile)
+        # Buckets span [2^(b-1), 2^b); scale by the ratio of bucket midpoints
+        return latency * (2.0 ** (target - bucket))
+
+    def snapshot(self, quantile: float = 0.9) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                model: {
+                    f"<={2 ** bucket}": round(hist.quantile(quantile), 1)
+                    for bucket, hist in sorted(buckets.items())
+                }
+                for model, buckets in self._latency.items()
+            }
+
+    def save(self, path: Optional[str] = None) -> None:
+        """
+        Atomically write the observations as JSON to ``path`` or ``state_path``.
+        """
+        path = path or self.state_path
+        if not path:
+            raise ValueError("No path given and no state_path configured.")
+        with self._lock:
+            data = {
+                "latency": {
+                    model: {str(b): h.to_dict() for b, h in buckets.items()}
+                    for model, buckets in self._latency.items()
+                },
+                "route_tokens": self._route_tokens,
+            }
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        os.replace(tmp_path, path)
+
+
+def _token_bucket(output_tokens: float) -> int:
+    return max(int(output_tokens), 1).bit_length()
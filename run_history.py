@@ -0,0 +1,406 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .observability import AgentObservability
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    workflow TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    total_calls INTEGER NOT NULL,
+    total_tokens INTEGER NOT NULL,
+    total_cost REAL NOT NULL,
+    summary TEXT NOT NULL,
+    meta TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_workflow ON runs (workflow, started_at);
+CREATE TABLE IF NOT EXISTS run_steps (
+    run_id TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    step TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    latency_mean_ms REAL NOT NULL,
+    latency_p50_ms REAL NOT NULL,
+    latency_p95_ms REAL NOT NULL,
+    latency_p99_ms REAL NOT NULL,
+    tokens INTEGER NOT NULL,
+    cost_usd REAL NOT NULL,
+    validator_checks INTEGER NOT NULL,
+    validator_passes INTEGER NOT NULL,
+    PRIMARY KEY (run_id, step)
+);
+CREATE TABLE IF NOT EXISTS prompt_composition (
+    run_id TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    step TEXT NOT NULL,
+    source TEXT NOT NULL,
+    tokens REAL NOT NULL,
+    PRIMARY KEY (run_id, step, source)
+);
+"""
+
+# Pseudo-step holding whole-run totals in comparisons
+RUN_TOTAL = "(run)"
+
+# metric name -> True if a larger value is a regression
+_METRICS: Dict[str, bool] = {
+    "wall_time_s": True,
+    "latency_p50_ms": True,
+    "latency_p95_ms": True,
+    "tokens": True,
+    "cost_usd": True,
+    "validator_pass_rate": False,
+}
+
+
+@dataclass
+class MetricComparison:
+    """
+    Comparison of one metric of one step between two sets of runs.
+
+    Attributes:
+        step: Chain step name, or RUN_TOTAL for whole-run metrics.
+        metric: Metric name, e.g. "latency_p95_ms" or "cost_usd".
+        baseline_mean: Mean over the baseline runs.
+        candidate_mean: Mean over the candidate runs.
+        baseline_n: Number of baseline runs with this metric.
+        candidate_n: Number of candidate runs with this metric.
+        change_pct: Relative change of the candidate mean, in percent.
+        p_value: Two-sided Welch's t-test p-value, or None with fewer than two runs a side.
+        regression: Whether the change is significant and in the bad direction.
+    """
+
+    step: str
+    metric: str
+    baseline_mean: float
+    candidate_mean: float
+    baseline_n: int
+    candidate_n: int
+    change_pct: Optional[float]
+    p_value: Optional[float]
+    regression: bool
+
+
+class RunHistoryStore:
+    """
+    SQLite store of per-run and per-step workflow metrics.
+
+    Each recorded run keeps its totals, the full get_summary() output and,
+    per chain step, latency percentiles, tokens, cost and validator
+    outcomes, so runs and time windows can be compared after the process
+    that produced them has exited.
+
+    Attributes:
+        path: Path of the SQLite database file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def record_run(
+        self,
+        observability: AgentObservability,
+        started_at: float,
+        finished_at: Optional[float] = None,
+        status: str = "ok",
+        run_id: Optional[str] = None,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        Persist the metrics collected by ``observability`` as one run and return its id.
+        """
+        run_id = run_id or uuid.uuid4().hex
+        finished_at = finished_at if finished_at is not None else time.time()
+        metrics = observability.snapshot_metrics()
+        summary = observability.get_summary()
+        steps = sorted(set(metrics.step_latency) | set(metrics.validator_checks))
+        rows: List[Tuple[Any, ...]] = []
+        for step in steps:
+            hist = metrics.step_latency.get(step)
+            rows.append(
+                (
+                    run_id,
+                    step,
+                    hist.count if hist else 0,
+                    hist.mean if hist else 0.0,
+                    hist.quantile(0.50) if hist else 0.0,
+                    hist.quantile(0.95) if hist else 0.0,
+                    hist.quantile(0.99) if hist else 0.0,
+                    metrics.step_tokens.get(step, 0),
+                    metrics.step_cost.get(step, 0.0),
+                    metrics.validator_checks.get(step, 0),
+                    metrics.validator_passes.get(step, 0),
+                )
+            )
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    observability.workflow_name,
+                    started_at,
+                    finished_at,
+                    status,
+                    metrics.total_calls,
+                    metrics.total_tokens,
+                    metrics.total_cost,
+                    json.dumps(summary, default=str),
+                    json.dumps(meta or {}, default=str),
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO run_steps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            conn.executemany(
+                "INSERT INTO prompt_composition VALUES (?, ?, ?, ?)",
+                [
+                    (run_id, step, source, tokens)
+                    for step, sources in metrics.prompt_tokens.items()
+                    for source, tokens in sources.items()
+                ],
+            )
+        return run_id
+
+    def list_runs(
+        self,
+        workflow: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return runs, newest first, optionally filtered by workflow and start time.
+        """
+        clauses: List[str] = []
+        params: List[Any] = []
+        if workflow is not None:
+            clauses.append("workflow = ?")
+            params.append(workflow)
+        if since is not None:
+            clauses.append("started_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("started_at < ?")
+            params.append(until)
+        sql = (
+            "SELECT run_id, workflow, started_at, finished_at, status, total_calls, "
+            "total_tokens, total_cost FROM runs"
+        )
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY started_at DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def step_durations(self, workflow: str, last_runs: int = 20) -> Dict[str, float]:
+        """
+        Return the mean total duration in ms of each step over the latest successful runs.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT step, AVG(latency_mean_ms * calls) AS duration_ms FROM run_steps
+                WHERE calls > 0 AND run_id IN (
+                    SELECT run_id FROM runs WHERE workflow = ? AND status = 'ok'
+                    ORDER BY started_at DESC LIMIT ?
+                )
+                GROUP BY step
+                """,
+                (workflow, last_runs),
+            ).fetchall()
+        return {row["step"]: row["duration_ms"] for row in rows}
+
+    def prompt_composition(
+        self, workflow: str, last_runs: int = 20
+    ) -> Tuple[int, Dict[str, Dict[str, float]]]:
+        """
+        Return the number of runs aggregated and, per step and source, the
+        input tokens summed over the latest ``last_runs`` runs.
+        """
+        with self._connect() as conn:
+            run_ids = [
+                row["run_id"]
+                for row in conn.execute(
+                    "SELECT run_id FROM runs WHERE workflow = ? ORDER BY started_at DESC LIMIT ?",
+                    (workflow, last_runs),
+                )
+            ]
+            by_step: Dict[str, Dict[str, float]] = {}
+            if run_ids:
+                marks = ",".join("?" * len(run_ids))
+                for row in conn.execute(
+                    f"SELECT step, source, SUM(tokens) AS tokens FROM prompt_composition "
+                    f"WHERE run_id IN ({marks}) GROUP BY step, source",
+                    run_ids,
+                ):
+                    by_step.setdefault(row["step"], {})[row["source"]] = row["tokens"]
+        return len(run_ids), by_step
+
+    def compare(
+        self,
+        baseline_run_ids: Sequence[str],
+        candidate_run_ids: Sequence[str],
+        alpha: float = 0.05,
+        min_change_pct: float = 5.0,
+    ) -> List[MetricComparison]:
+        """
+        Compare per-step and whole-run metrics between two sets of runs.
+
+        Each run contributes one observation per metric. A metric is flagged
+        as a regression when Welch's t-test gives ``p < alpha`` and the mean
+        moved in the bad direction by at least ``min_change_pct`` percent.
+        With a single run on either side only the change is reported.
+        """
+        baseline = self._observations(baseline_run_ids)
+        candidate = self._observations(candidate_run_ids)
+        comparisons: List[MetricComparison] = []
+        for key in sorted(set(baseline) & set(candidate)):
+            step, metric = key
+            a, b = baseline[key], candidate[key]
+            mean_a, mean_b = sum(a) / len(a), sum(b) / len(b)
+            change_pct = (mean_b - mean_a) / abs(mean_a) * 100.0 if mean_a else None
+            p_value = welch_t_test(a, b) if len(a) >= 2 and len(b) >= 2 else None
+            worse = mean_b > mean_a if _METRICS[metric] else mean_b < mean_a
+            regression = (
+                p_value is not None
+                and p_value < alpha
+                and worse
+                and (change_pct is None or abs(change_pct) >= min_change_pct)
+            )
+            comparisons.append(
+                MetricComparison(
+                    step=step,
+                    metric=metric,
+                    baseline_mean=mean_a,
+                    candidate_mean=mean_b,
+                    baseline_n=len(a),
+                    candidate_n=len(b),
+                    change_pct=change_pct,
+                    p_value=p_value,
+                    regression=regression,
+                )
+            )
+        return comparisons
+
+    def _observations(self, run_ids: Sequence[str]) -> Dict[Tuple[str, str], List[float]]:
+        obs: Dict[Tuple[str, str], List[float]] = {}
+        if not run_ids:
+            return obs
+        marks = ",".join("?" * len(run_ids))
+        with self._connect() as conn:
+            for row in conn.execute(
+                f"SELECT * FROM runs WHERE run_id IN ({marks})", list(run_ids)
+            ):
+                for metric, value in (
+                    ("wall_time_s", row["finished_at"] - row["started_at"]),
+                    ("tokens", row["total_tokens"]),
+                    ("cost_usd", row["total_cost"]),
+                ):
+                    obs.setdefault((RUN_TOTAL, metric), []).append(float(value))
+            for row in conn.execute(
+                f"SELECT * FROM run_steps WHERE run_id IN ({marks})", list(run_ids)
+            ):
+                step = row["step"]
+                if row["calls"]:
+                    for metric in ("latency_p50_ms", "latency_p95_ms", "tokens", "cost_usd"):
+                        obs.setdefault((step, metric), []).append(float(row[metric]))
+                if row["validator_checks"]:
+                    obs.setdefault((step, "validator_pass_rate"), []).append(
+                        row["validator_passes"] / row["validator_checks"]
+                    )
+        return obs
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def format_report(comparisons: List[MetricComparison]) -> str:
+    """
+    Render comparisons as a fixed-width text table, regressions marked with "!".
+    """
+    lines = [
+        f"{'':1} {'step':<28} {'metric':<20} {'baseline':>12} {'candidate':>12} "
+        f"{'change':>8} {'p':>7}"
+    ]
+    for c in comparisons:
+        change = f"{c.change_pct:+.1f}%" if c.change_pct is not None else "n/a"
+        p_value = f"{c.p_value:.3f}" if c.p_value is not None else "n/a"
+        lines.append(
+            f"{'!' if c.regression else ' '} {c.step[:28]:<28} {c.metric:<20} "
+            f"{c.baseline_mean:>12.4g} {c.candidate_mean:>12.4g} {change:>8} {p_value:>7}"
+        )
+    flagged = sum(c.regression for c in comparisons)
+    lines.append(f"\n{flagged} significant regression(s) across {len(comparisons)} metrics.")
+    return "\n".join(lines)
+
+
+def welch_t_test(a: Sequence[float], b: Sequence[float]) -> float:
+    """
+    Return the two-sided p-value of Welch's unequal-variance t-test.
+    """
+    n1, n2 = len(a), len(b)
+    m1, m2 = sum(a) / n1, sum(b) / n2
+    v1 = sum((x - m1) ** 2 for x in a) / (n1 - 1)
+    v2 = sum((x - m2) ** 2 for x in b) / (n2 - 1)
+    se2 = v1 / n1 + v2 / n2
+    if se2 == 0.0:
+        return 1.0 if m1 == m2 else 0.0
+    t = (m2 - m1) / math.sqrt(se2)
+    df = se2 ** 2 / ((v1 / n1) ** 2 / (n1 - 1) + (v2 / n2) ** 2 / (n2 - 1))
+    return _regularized_beta(df / (df + t * t), df / 2.0, 0.5)
+
+
+def _regularized_beta(x: float, a: float, b: float) -> float:
+    # I_x(a, b) via its continued fraction (modified Lentz)
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    if x > (a + 1.0) / (a + b + 2.0):
+        return 1.0 - _regularized_beta(1.0 - x, b, a)
+    log_front = (
+        math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+        + a * math.log(x) + b * math.log1p(-x)
+    )
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    f = d
+    for m in range(1, 300):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1)),
+        ):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            f *= c * d
+        if abs(c * d - 1.0) < 1e-12:
+            break
+    return math.exp(log_front) * f / a
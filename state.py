@@ -1,9 +1,33 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+import json
+from bisect import bisect_right
+from collections import deque
+from dataclasses import dataclass, field, replace
 from datetime import datetime
-from threading import Lock
-from typing import Dict, Any, List, Optional
+from itertools import islice
+from threading import Event, Lock
+from types import MappingProxyType
+from weakref import WeakValueDictionary
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    FrozenSet,
+    IO,
+    List,
+    Mapping,
+    Optional,
+    Protocol,
+    Set,
+    Tuple,
+)
+
+from .blobs import BlobRef, BlobStore, BlobStoreFullError
+from .profiling import profiled
+from .wal import WriteAheadLog
 
 
 @dataclass(frozen=True)
@@ -26,32 +50,346 @@ class StateUpdate:
     version: int
 
 
+@dataclass(frozen=True)
+class StateSnapshot:
+    """
+    Immutable, consistent view of the state at a single version.
+
+    Snapshots share their values with the versions they were derived from;
+    values stored in the state must be treated as immutable.
+
+    Attributes:
+        version: Version number of the state captured by this snapshot.
+        data: Read-only mapping of state keys to stored values. Large values
+            offloaded to a BlobStore appear here as BlobRef.
+        revision: Counter bumped by every update and restore. Unlike
+            versions, which are reused after restore_checkpoint(), revisions
+            are never reused, so compare-and-set uses them.
+        blobs: Blob store used by get() to resolve offloaded values.
+    """
+
+    version: int
+    data: Mapping[str, Any]
+    revision: int = 0
+    blobs: Optional[BlobStore] = field(default=None, compare=False, repr=False)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.data.get(key, default)
+        if self.blobs is None:
+            return value
+        return _resolve_value(value, self.blobs)
+
+
+@dataclass(frozen=True)
+class HistoryPolicy:
+    """
+    Retention policy for state history and checkpoints.
+
+    Attributes:
+        max_entries: Maximum number of StateUpdate records kept in memory.
+            None keeps every record.
+        spill_path: Optional JSONL file that receives records evicted from
+            memory, so long sessions keep an audit trail on disk.
+        keyframe_interval: Every Nth checkpoint stores the full state; the
+            others store only the keys changed since the previous checkpoint.
+    """
+
+    max_entries: Optional[int] = 10_000
+    spill_path: Optional[str] = None
+    keyframe_interval: int = 8
+
+
+@dataclass(frozen=True)
+class _Checkpoint:
+    name: str
+    version: int
+    timestamp: datetime
+    parent: Optional[int]
+    delta: Mapping[str, Any]
+    removed: Tuple[str, ...]
+    # Per-agent update counts at this version; None for checkpoints recovered
+    # from snapshots written before they were recorded
+    agent_counts: Optional[Mapping[str, int]] = None
+
+
+class StateConflictError(RuntimeError):
+    """
+    Raised when an optimistic update finds that state changed since it was read.
+
+    Attributes:
+        expected_version: The version or revision the caller based its update on.
+        actual_version: The current version or revision of the state.
+        conflicting_keys: Keys modified after the caller's read, if known.
+        unit: "version" or "revision", whichever the failed check compared.
+    """
+
+    def __init__(
+        self,
+        expected_version: int,
+        actual_version: int,
+        conflicting_keys: Optional[List[str]] = None,
+        unit: str = "version",
+    ) -> None:
+        self.expected_version = expected_version
+        self.actual_version = actual_version
+        self.conflicting_keys = conflicting_keys or []
+        self.unit = unit
+        detail = f" (keys: {', '.join(self.conflicting_keys)})" if self.conflicting_keys else ""
+        super().__init__(
+            f"State changed since {unit} {expected_version}; "
+            f"current {unit} is {actual_version}{detail}."
+        )
+
+
+@dataclass(eq=False)
+class _Watcher:
+    keys: Optional[FrozenSet[str]]
+    since_version: int
+    wake: Callable[[], None]
+
+    def matches(self, update: StateUpdate) -> bool:
+        if update.version <= self.since_version:
+            return False
+        return self.keys is None or not self.keys.isdisjoint(update.data)
+
+
+class StateBackend(Protocol):
+    """
+    Protocol implemented by shared state stores.
+
+    CentralizedStateManager keeps state in process memory; SQLiteStateManager
+    shares it across processes.
+    """
+
+    def snapshot(self) -> StateSnapshot:
+        ...
+
+    def read_state(self, keys: Optional[List[str]] = None) -> Dict[str, Any]:
+        ...
+
+    def update_state(
+        self,
+        agent_id: str,
+        updates: Dict[str, Any],
+        update_type: str = "standard",
+        expected_version: Optional[int] = None,
+        expected_key_revisions: Optional[Dict[str, int]] = None,
+        expected_revision: Optional[int] = None,
+    ) -> int:
+        ...
+
+    def create_checkpoint(self, checkpoint_name: str) -> int:
+        ...
+
+    def restore_checkpoint(self, version: int) -> bool:
+        ...
+
+    def get_history(
+        self,
+        agent_id: Optional[str] = None,
+        since_version: Optional[int] = None,
+    ) -> List[StateUpdate]:
+        ...
+
+    def get_agent_contributions(self) -> Dict[str, int]:
+        ...
+
+    def watch(
+        self,
+        keys: Optional[List[str]] = None,
+        since_version: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[StateUpdate]:
+        ...
+
+    async def awatch(
+        self,
+        keys: Optional[List[str]] = None,
+        since_version: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[StateUpdate]:
+        ...
+
+
+def run_optimistic_update(
+    backend: StateBackend,
+    agent_id: str,
+    compute_updates: Callable[[StateSnapshot], Dict[str, Any]],
+    update_type: str = "standard",
+    read_keys: Optional[List[str]] = None,
+    max_attempts: int = 5,
+) -> int:
+    """
+    Apply ``compute_updates`` to a fresh snapshot until the write validates.
+
+    The update is checked against the snapshot revision, either for the
+    whole state or, when ``read_keys`` is given, only for those keys.
+
+    Raises:
+        StateConflictError: If every attempt conflicted.
+    """
+    last_conflict: Optional[StateConflictError] = None
+    for _ in range(max_attempts):
+        snap = backend.snapshot()
+        updates = compute_updates(snap)
+        try:
+            if read_keys is None:
+                return backend.update_state(
+                    agent_id, updates, update_type, expected_revision=snap.revision
+                )
+            return backend.update_state(
+                agent_id,
+                updates,
+                update_type,
+                expected_key_revisions={k: snap.revision for k in read_keys},
+            )
+        except StateConflictError as e:
+            last_conflict = e
+    assert last_conflict is not None
+    raise last_conflict
+
+
+_EMPTY_SNAPSHOT = StateSnapshot(version=0, data=MappingProxyType({}))
+
+
+def _offload_value(value: Any, blobs: BlobStore, threshold: int) -> Any:
+    if isinstance(value, str):
+        return blobs.put(value) if len(value) >= threshold else value
+    if isinstance(value, dict):
+        return {k: _offload_value(v, blobs, threshold) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_offload_value(v, blobs, threshold) for v in value]
+    return value
+
+
+def _resolve_value(value: Any, blobs: BlobStore) -> Any:
+    if isinstance(value, BlobRef):
+        return blobs.get(value)
+    if isinstance(value, dict):
+        return {k: _resolve_value(v, blobs) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve_value(v, blobs) for v in value]
+    return value
+
+
+def _collect_digests(value: Any, digests: Set[str]) -> None:
+    if isinstance(value, BlobRef):
+        digests.add(value.digest)
+    elif isinstance(value, dict):
+        for v in value.values():
+            _collect_digests(v, digests)
+    elif isinstance(value, list):
+        for v in value:
+            _collect_digests(v, digests)
+
+
+def _decode_blob_refs(value: Any) -> Any:
+    if isinstance(value, dict):
+        if len(value) == 2 and "__blob__" in value and "size" in value:
+            return BlobRef(digest=value["__blob__"], size=value["size"])
+        return {k: _decode_blob_refs(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode_blob_refs(v) for v in value]
+    return value
+
+
 class CentralizedStateManager:
     """
     Thread-safe versioned state manager for multi-agent workflows.
+
+    The current state is published as an immutable StateSnapshot. Readers grab
+    the current snapshot without taking the lock; writers serialize on the lock
+    and publish a new snapshot that copies only the top-level mapping, so large
+    values are shared between versions rather than duplicated.
+
+    History is bounded by a HistoryPolicy. Evicted updates are folded into a
+    base state (and optionally spilled to disk), so any version from the base
+    onwards, as well as any checkpoint, can be rebuilt with state_at().
+
+    With a WriteAheadLog, every mutation is logged before it is applied and the
+    state, version, history and checkpoints are rebuilt from the log at
+    startup. Values must then be JSON-serializable.
+
+    Agents waiting on other agents' output can block on watch() or await
+    awatch() instead of polling; only watchers whose keys were touched are
+    woken.
+
+    With a BlobStore, string values of at least ``offload_threshold``
+    characters (including those nested in dicts and lists) are stored by
+    digest. State, history and checkpoints then hold only BlobRef digests, and
+    values are resolved transparently on read. Blobs no longer referenced by
+    the state, retained history, checkpoints or any snapshot a reader still
+    holds are swept on WAL compaction, on restore and when a memory-only
+    store is full, or on collect_blobs(); the store must not be shared with
+    other managers. When a memory-only store is full of live blobs, the
+    update's values are kept inline rather than failing the write.
     """
 
-    def __init__(self) -> None:
-        self._state: Dict[str, Any] = {}
-        self._version: int = 0
-        self._history: List[StateUpdate] = []
-        self._checkpoints: Dict[int, Dict[str, Any]] = {}
+    def __init__(
+        self,
+        history_policy: Optional[HistoryPolicy] = None,
+        wal: Optional[WriteAheadLog] = None,
+        blob_store: Optional[BlobStore] = None,
+        offload_threshold: int = 4096,
+    ) -> None:
+        self.history_policy = history_policy or HistoryPolicy()
+        self.wal = wal
+        self.blob_store = blob_store
+        self.offload_threshold = offload_threshold
+        self._current: StateSnapshot = _EMPTY_SNAPSHOT
+        self._history: Deque[StateUpdate] = deque()
+        self._agent_index: Dict[str, Deque[StateUpdate]] = {}
+        self._agent_counts: Dict[str, int] = {}
+        # State at version _base_version, i.e. just before the oldest retained update
+        self._base: Dict[str, Any] = {}
+        self._base_version: int = 0
+        self._checkpoints: Dict[int, _Checkpoint] = {}
+        self._checkpoint_versions: List[int] = []
+        self._spill_file: Optional[IO[str]] = None
+        self._wal_seq = 0
+        self._recovering = False
+        self._watchers: List[_Watcher] = []
+        # Revision of the last update or restore that modified each key
+        self._key_revisions: Dict[str, int] = {}
+        # Snapshots still held by readers, by revision; their blobs are never swept
+        self._published: "WeakValueDictionary[int, StateSnapshot]" = WeakValueDictionary()
         self._lock = Lock()
+        if wal is not None:
+            self._recover()
+
+    @property
+    def _state(self) -> Mapping[str, Any]:
+        return self._current.data
+
+    @property
+    def _version(self) -> int:
+        return self._current.version
+
+    def snapshot(self) -> StateSnapshot:
+        """
+        Return the current immutable snapshot in O(1) without locking.
+        """
+        return self._current
 
+    @profiled("state.read_state")
     def read_state(self, keys: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         Return a copy of the current state, optionally limited to specified keys.
         """
-        with self._lock:
-            if keys is not None:
-                return {k: self._state.get(k) for k in keys}
-            return dict(self._state)
+        data = self._current.data
+        if keys is not None:
+            return {k: self._resolve(data.get(k)) for k in keys}
+        return {k: self._resolve(v) for k, v in data.items()}
 
+    @profiled("state.update_state")
     def update_state(
         self,
         agent_id: str,
         updates: Dict[str, Any],
         update_type: str = "standard",
+        expected_version: Optional[int] = None,
+        expected_key_revisions: Optional[Dict[str, int]] = None,
+        expected_revision: Optional[int] = None,
     ) -> int:
         """
         Apply updates atomically to the state and record a new version.
@@ -60,74 +398,616 @@ class CentralizedStateManager:
             agent_id: The agent performing the update.
             updates: The key/value pairs to merge into the state.
             update_type: A label describing the kind of update.
+            expected_version: If set, the update only applies when the state is
+                at exactly this version. Versions are reused after
+                restore_checkpoint(), so prefer ``expected_revision``.
+            expected_key_revisions: If set, the update only applies when none of
+                the given keys was modified after the paired snapshot revision.
+                Use this to validate just the keys an agent read.
+            expected_revision: If set, the update only applies when the state is
+                still at exactly this snapshot revision (compare-and-set).
 
         Returns:
-            The new version number after the update.
+            The new version number after the update. Take revisions for later
+            compare-and-set from snapshot(), not from this value.
+
+        Raises:
+            StateConflictError: If an expected version or revision check fails.
         """
         with self._lock:
-            self._version += 1
+            current_version = self._current.version
+            current_revision = self._current.revision
+            if expected_version is not None and expected_version != current_version:
+                raise StateConflictError(expected_version, current_version)
+            if expected_revision is not None and expected_revision != current_revision:
+                raise StateConflictError(expected_revision, current_revision, unit="revision")
+            if expected_key_revisions:
+                stale = [
+                    k
+                    for k, seen in expected_key_revisions.items()
+                    if self._key_revisions.get(k, 0) > seen
+                ]
+                if stale:
+                    raise StateConflictError(
+                        min(expected_key_revisions[k] for k in stale),
+                        current_revision,
+                        stale,
+                        unit="revision",
+                    )
             update_record = StateUpdate(
                 agent_id=agent_id,
                 timestamp=datetime.now(),
                 update_type=update_type,
-                data=dict(updates),
-                version=self._version,
+                data=self._offload_or_collect(updates),
+                version=current_version + 1,
             )
-            self._state.update(updates)
-            self._history.append(update_record)
-            return self._version
+            self._log({"op": "update", **self._to_record(update_record)})
+            self._apply_update(update_record)
+            self._maybe_compact()
+            return update_record.version
+
+    def update_with_retry(
+        self,
+        agent_id: str,
+        compute_updates: Callable[[StateSnapshot], Dict[str, Any]],
+        update_type: str = "standard",
+        read_keys: Optional[List[str]] = None,
+        max_attempts: int = 5,
+    ) -> int:
+        """
+        Run an optimistic read-modify-write, retrying on conflicts.
+
+        ``compute_updates`` receives a snapshot and returns the updates to
+        apply. The update is validated against the snapshot version, either
+        for the whole state or, when ``read_keys`` is given, only for those
+        keys. Readers never take the lock while computing.
+
+        Raises:
+            StateConflictError: If every attempt conflicted.
+        """
+        return run_optimistic_update(
+            self, agent_id, compute_updates, update_type, read_keys, max_attempts
+        )
 
     def create_checkpoint(self, checkpoint_name: str) -> int:
         """
         Save a named snapshot of the state.
 
+        Checkpoints are stored as deltas against the previous checkpoint, with
+        a full keyframe every ``keyframe_interval`` checkpoints.
         Returns the version number at which the checkpoint was created.
         """
         with self._lock:
-            version = self._version
-            self._checkpoints[version] = {
-                "name": checkpoint_name,
-                "state": dict(self._state),
-                "timestamp": datetime.now(),
-            }
+            timestamp = datetime.now()
+            version = self._current.version
+            self._log(
+                {
+                    "op": "checkpoint",
+                    "name": checkpoint_name,
+                    "version": version,
+                    "timestamp": timestamp.isoformat(),
+                }
+            )
+            self._apply_checkpoint(checkpoint_name, timestamp)
+            self._maybe_compact()
             return version
 
     def restore_checkpoint(self, version: int) -> bool:
         """
         Restore the state to a previously saved checkpoint.
 
+        Updates and checkpoints recorded after the checkpoint are discarded,
+        and their version numbers are reused by later updates. The restore
+        itself gets a new revision and marks every key it touched as modified,
+        so compare-and-set against an earlier snapshot fails.
         Returns True if successful, False if the checkpoint is unknown.
         """
         with self._lock:
-            checkpoint = self._checkpoints.get(version)
-            if not checkpoint:
+            if version not in self._checkpoints:
                 return False
-            self._state = dict(checkpoint["state"])
-            self._version = version
+            self._log({"op": "restore", "version": version})
+            self._apply_restore(version)
+            if not self._maybe_compact():
+                self._collect_blobs_locked()
             return True
 
+    def state_at(self, version: int) -> Optional[Dict[str, Any]]:
+        """
+        Rebuild the state as it was at the given version.
+
+        Starts from the nearest checkpoint (or the history base) at or below
+        the version and replays the retained updates after it. Returns None if
+        the version is neither checkpointed nor covered by retained history.
+        """
+        with self._lock:
+            current = self._current
+            if version == current.version:
+                state = dict(current.data)
+            elif version > current.version:
+                return None
+            else:
+                idx = bisect_right(self._checkpoint_versions, version)
+                nearest = self._checkpoint_versions[idx - 1] if idx else None
+                if nearest == version:
+                    state = self._materialize_checkpoint(version)
+                elif version < self._base_version:
+                    return None
+                else:
+                    if nearest is not None and nearest >= self._base_version:
+                        state, start = self._materialize_checkpoint(nearest), nearest
+                    else:
+                        state, start = dict(self._base), self._base_version
+                    offset = start - self._base_version
+                    for update in islice(self._history, offset, version - self._base_version):
+                        state.update(update.data)
+            return {k: self._resolve(v) for k, v in state.items()}
+
     def get_history(
         self,
         agent_id: Optional[str] = None,
         since_version: Optional[int] = None,
     ) -> List[StateUpdate]:
         """
-        Return a list of state updates, optionally filtered by agent or version.
+        Return a list of retained state updates, optionally filtered by agent or version.
         """
         with self._lock:
-            history = list(self._history)
             if agent_id is not None:
-                history = [u for u in history if u.agent_id == agent_id]
-            if since_version is not None:
-                history = [u for u in history if u.version > since_version]
-            return history
+                history = list(self._agent_index.get(agent_id, ()))
+                if since_version is not None:
+                    start = bisect_right(history, since_version, key=lambda u: u.version)
+                    history = history[start:]
+            elif since_version is not None:
+                history = self._updates_since(since_version, None)
+            else:
+                history = list(self._history)
+            return [self._resolve_update(u) for u in history]
 
     def get_agent_contributions(self) -> Dict[str, int]:
         """
         Return a count of updates performed by each agent.
+
+        Counts include updates that were evicted from the in-memory history.
+        Restoring a checkpoint resets them to the counts at that checkpoint.
+        """
+        with self._lock:
+            return {agent: count for agent, count in self._agent_counts.items() if count}
+
+    def watch(
+        self,
+        keys: Optional[List[str]] = None,
+        since_version: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[StateUpdate]:
+        """
+        Block until the state changes after ``since_version``.
+
+        Args:
+            keys: Only wake for updates touching one of these keys. None means any key.
+            since_version: Version the caller has already seen. Defaults to the
+                current version, i.e. wait for the next matching update.
+            timeout: Maximum number of seconds to wait. None waits forever.
+
+        Returns:
+            The retained updates after ``since_version`` touching ``keys``, or an
+            empty list on timeout.
         """
+        event = Event()
         with self._lock:
-            counts: Dict[str, int] = {}
-            for update in self._history:
-                counts[update.agent_id] = counts.get(update.agent_id, 0) + 1
-            return counts
\ No newline at end of file
+            since = self._current.version if since_version is None else since_version
+            missed = self._updates_since(since, keys)
+            if missed:
+                return [self._resolve_update(u) for u in missed]
+            watcher = _Watcher(frozenset(keys) if keys else None, since, event.set)
+            self._watchers.append(watcher)
+        event.wait(timeout)
+        with self._lock:
+            if watcher in self._watchers:
+                self._watchers.remove(watcher)
+            return [self._resolve_update(u) for u in self._updates_since(since, keys)]
+
+    async def awatch(
+        self,
+        keys: Optional[List[str]] = None,
+        since_version: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[StateUpdate]:
+        """
+        Asynchronous variant of watch() that does not block the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[None] = loop.create_future()
+
+        def resolve() -> None:
+            if not future.done():
+                future.set_result(None)
+
+        with self._lock:
+            since = self._current.version if since_version is None else since_version
+            missed = self._updates_since(since, keys)
+            if missed:
+                return [self._resolve_update(u) for u in missed]
+            watcher = _Watcher(
+                frozenset(keys) if keys else None,
+                since,
+                lambda: loop.call_soon_threadsafe(resolve),
+            )
+            self._watchers.append(watcher)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                if watcher in self._watchers:
+                    self._watchers.remove(watcher)
+        with self._lock:
+            return [self._resolve_update(u) for u in self._updates_since(since, keys)]
+
+    def compact(self) -> None:
+        """
+        Write a snapshot of the retained state to the WAL and truncate its log.
+        """
+        with self._lock:
+            if self.wal is not None:
+                self._compact_locked()
+
+    def collect_blobs(self) -> int:
+        """
+        Sweep blobs no longer referenced by the state, history or checkpoints.
+
+        Returns the number of blobs removed.
+        """
+        with self._lock:
+            return self._collect_blobs_locked()
+
+    def close(self) -> None:
+        """
+        Flush and close the write-ahead log and the history spill file.
+        """
+        with self._lock:
+            if self.wal is not None:
+                self.wal.close()
+            if self._spill_file is not None:
+                self._spill_file.close()
+                self._spill_file = None
+
+    def _apply_update(self, update: StateUpdate) -> None:
+        new_data = dict(self._current.data)
+        new_data.update(update.data)
+        revision = self._current.revision + 1
+        for key in update.data:
+            self._key_revisions[key] = revision
+        self._append_history(update)
+        self._publish(
+            StateSnapshot(
+                version=update.version,
+                data=MappingProxyType(new_data),
+                revision=revision,
+                blobs=self.blob_store,
+            )
+        )
+        if self._watchers:
+            woken = [w for w in self._watchers if w.matches(update)]
+            for watcher in woken:
+                self._watchers.remove(watcher)
+                watcher.wake()
+
+    def _publish(self, snapshot: StateSnapshot) -> None:
+        self._current = snapshot
+        if self.blob_store is not None:
+            self._published[snapshot.revision] = snapshot
+
+    def _updates_since(
+        self, since_version: int, keys: Optional[List[str]]
+    ) -> List[StateUpdate]:
+        offset = max(0, since_version - self._base_version)
+        updates = islice(self._history, offset, None)
+        if keys is None:
+            return list(updates)
+        wanted = frozenset(keys)
+        return [u for u in updates if not wanted.isdisjoint(u.data)]
+
+    def _apply_checkpoint(self, checkpoint_name: str, timestamp: datetime) -> None:
+        current = self._current
+        parent = self._checkpoint_versions[-1] if self._checkpoint_versions else None
+        if parent == current.version:
+            # Re-checkpointing the same version replaces the latest checkpoint
+            parent = self._checkpoints[parent].parent
+        agent_counts = MappingProxyType(
+            {agent: count for agent, count in self._agent_counts.items() if count}
+        )
+        chain_length = 0
+        if parent is not None:
+            chain_length = self._chain_length(parent) + 1
+        if parent is None or chain_length >= self.history_policy.keyframe_interval:
+            checkpoint = _Checkpoint(
+                name=checkpoint_name,
+                version=current.version,
+                timestamp=timestamp,
+                parent=None,
+                delta=current.data,
+                removed=(),
+                agent_counts=agent_counts,
+            )
+        else:
+            previous = self._materialize_checkpoint(parent)
+            delta = {
+                k: v
+                for k, v in current.data.items()
+                if k not in previous or (previous[k] is not v and previous[k] != v)
+            }
+            removed = tuple(k for k in previous if k not in current.data)
+            checkpoint = _Checkpoint(
+                name=checkpoint_name,
+                version=current.version,
+                timestamp=timestamp,
+                parent=parent,
+                delta=MappingProxyType(delta),
+                removed=removed,
+                agent_counts=agent_counts,
+            )
+        if current.version not in self._checkpoints:
+            self._checkpoint_versions.append(current.version)
+        self._checkpoints[current.version] = checkpoint
+
+    def _apply_restore(self, version: int) -> None:
+        state = self._materialize_checkpoint(version)
+        # Treat every key touched by the rollback as modified, so stale readers conflict
+        revision = self._current.revision + 1
+        for key in set(self._current.data) | set(state):
+            self._key_revisions[key] = revision
+        self._publish(
+            StateSnapshot(
+                version=version, data=MappingProxyType(state), revision=revision, blobs=self.blob_store
+            )
+        )
+        # Drop the abandoned branch of history and checkpoints
+        while self._history and self._history[-1].version > version:
+            dropped = self._history.pop()
+            self._agent_index[dropped.agent_id].pop()
+            self._agent_counts[dropped.agent_id] -= 1
+        if version < self._base_version:
+            self._history.clear()
+            self._agent_index.clear()
+            self._base = dict(state)
+            self._base_version = version
+        # Evicted updates of the abandoned branch are only known through the checkpoint
+        checkpoint_counts = self._checkpoints[version].agent_counts
+        if checkpoint_counts is not None:
+            self._agent_counts = dict(checkpoint_counts)
+        while self._checkpoint_versions and self._checkpoint_versions[-1] > version:
+            del self._checkpoints[self._checkpoint_versions.pop()]
+
+    def _log(self, record: Dict[str, Any]) -> None:
+        if self.wal is None or self._recovering:
+            return
+        self._wal_seq += 1
+        self.wal.append({"seq": self._wal_seq, **record})
+
+    def _maybe_compact(self) -> bool:
+        if self.wal is not None and self.wal.needs_compaction():
+            self._compact_locked()
+            return True
+        return False
+
+    def _compact_locked(self) -> None:
+        assert self.wal is not None
+        checkpoints = []
+        for version in self._checkpoint_versions:
+            checkpoint = self._checkpoints[version]
+            checkpoints.append(
+                {
+                    "name": checkpoint.name,
+                    "version": checkpoint.version,
+                    "timestamp": checkpoint.timestamp.isoformat(),
+                    "parent": checkpoint.parent,
+                    "delta": self._encode(dict(checkpoint.delta)),
+                    "removed": list(checkpoint.removed),
+                    "agent_counts": (
+                        None if checkpoint.agent_counts is None else dict(checkpoint.agent_counts)
+                    ),
+                }
+            )
+        self.wal.compact(
+            {
+                "seq": self._wal_seq,
+                "version": self._current.version,
+                "revision": self._current.revision,
+                "key_revisions": self._key_revisions,
+                "state": self._encode(dict(self._current.data)),
+                "base_version": self._base_version,
+                "base": self._encode(self._base),
+                "history": [self._to_record(u) for u in self._history],
+                "agent_counts": self._agent_counts,
+                "checkpoints": checkpoints,
+            }
+        )
+        # The log now references only live blobs, so the rest can go
+        self._collect_blobs_locked()
+
+    def _collect_blobs_locked(self) -> int:
+        if self.blob_store is None:
+            return 0
+        digests: Set[str] = set()
+        for snapshot in list(self._published.values()):
+            _collect_digests(dict(snapshot.data), digests)
+        _collect_digests(self._base, digests)
+        for update in self._history:
+            _collect_digests(update.data, digests)
+        for checkpoint in self._checkpoints.values():
+            _collect_digests(dict(checkpoint.delta), digests)
+        return self.blob_store.sweep(digests)
+
+    def _recover(self) -> None:
+        assert self.wal is not None
+        snapshot, records = self.wal.recover()
+        self._recovering = True
+        try:
+            if snapshot is not None:
+                self._wal_seq = snapshot["seq"]
+                self._publish(
+                    StateSnapshot(
+                        version=snapshot["version"],
+                        data=MappingProxyType(self._decode(snapshot["state"])),
+                        revision=snapshot.get("revision", snapshot["version"]),
+                        blobs=self.blob_store,
+                    )
+                )
+                self._base = self._decode(snapshot["base"])
+                self._base_version = snapshot["base_version"]
+                for record in snapshot["history"]:
+                    update = self._from_record(record)
+                    self._history.append(update)
+                    self._agent_index.setdefault(update.agent_id, deque()).append(update)
+                self._agent_counts = dict(snapshot["agent_counts"])
+                if "key_revisions" in snapshot:
+                    self._key_revisions = dict(snapshot["key_revisions"])
+                else:
+                    # Snapshots written before revisions existed fall back to versions
+                    self._key_revisions = {k: self._base_version for k in self._base}
+                    for update in self._history:
+                        for key in update.data:
+                            self._key_revisions[key] = update.version
+                for cp in snapshot["checkpoints"]:
+                    self._checkpoint_versions.append(cp["version"])
+                    self._checkpoints[cp["version"]] = _Checkpoint(
+                        name=cp["name"],
+                        version=cp["version"],
+                        timestamp=datetime.fromisoformat(cp["timestamp"]),
+                        parent=cp["parent"],
+                        delta=MappingProxyType(self._decode(cp["delta"])),
+                        removed=tuple(cp["removed"]),
+                        agent_counts=(
+                            None
+                            if cp.get("agent_counts") is None
+                            else MappingProxyType(dict(cp["agent_counts"]))
+                        ),
+                    )
+            for record in records:
+                # Records already folded into the snapshot survive a crash mid-compaction
+                if record["seq"] <= self._wal_seq:
+                    continue
+                self._wal_seq = record["seq"]
+                op = record["op"]
+                if op == "update":
+                    self._apply_update(self._from_record(record))
+                elif op == "checkpoint":
+                    self._apply_checkpoint(
+                        record["name"], datetime.fromisoformat(record["timestamp"])
+                    )
+                elif op == "restore":
+                    self._apply_restore(record["version"])
+        finally:
+            self._recovering = False
+
+    def _offload(self, updates: Dict[str, Any]) -> Dict[str, Any]:
+        if self.blob_store is None:
+            return dict(updates)
+        return {
+            k: _offload_value(v, self.blob_store, self.offload_threshold)
+            for k, v in updates.items()
+        }
+
+    def _offload_or_collect(self, updates: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return self._offload(updates)
+        except BlobStoreFullError:
+            # Values put before the error are put again, so sweeping them is safe
+            self._collect_blobs_locked()
+        try:
+            return self._offload(updates)
+        except BlobStoreFullError:
+            # Still full of live blobs: keep this update's values inline instead
+            return dict(updates)
+
+    def _resolve(self, value: Any) -> Any:
+        if self.blob_store is None:
+            return value
+        return _resolve_value(value, self.blob_store)
+
+    def _resolve_update(self, update: StateUpdate) -> StateUpdate:
+        if self.blob_store is None:
+            return update
+        return replace(update, data={k: self._resolve(v) for k, v in update.data.items()})
+
+    def _encode(self, value: Any) -> Any:
+        # Persistent blobs are logged by digest; memory-only blobs are inlined
+        if isinstance(value, BlobRef):
+            assert self.blob_store is not None
+            if self.blob_store.persistent:
+                return {"__blob__": value.digest, "size": value.size}
+            return self.blob_store.get(value)
+        if isinstance(value, dict):
+            return {k: self._encode(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._encode(v) for v in value]
+        return value
+
+    def _decode(self, value: Any) -> Any:
+        value = _decode_blob_refs(value)
+        if self.blob_store is not None:
+            value = _offload_value(value, self.blob_store, self.offload_threshold)
+        return value
+
+    def _to_record(self, update: StateUpdate) -> Dict[str, Any]:
+        return {
+            "agent_id": update.agent_id,
+            "timestamp": update.timestamp.isoformat(),
+            "update_type": update.update_type,
+            "data": self._encode(update.data),
+            "version": update.version,
+        }
+
+    def _from_record(self, record: Dict[str, Any]) -> StateUpdate:
+        return StateUpdate(
+            agent_id=record["agent_id"],
+            timestamp=datetime.fromisoformat(record["timestamp"]),
+            update_type=record["update_type"],
+            data=self._decode(record["data"]),
+            version=record["version"],
+        )
+
+    def _append_history(self, update: StateUpdate) -> None:
+        self._history.append(update)
+        self._agent_index.setdefault(update.agent_id, deque()).append(update)
+        self._agent_counts[update.agent_id] = self._agent_counts.get(update.agent_id, 0) + 1
+        max_entries = self.history_policy.max_entries
+        while max_entries is not None and len(self._history) > max_entries:
+            evicted = self._history.popleft()
+            self._agent_index[evicted.agent_id].popleft()
+            self._base.update(evicted.data)
+            self._base_version = evicted.version
+            self._spill(evicted)
+
+    def _spill(self, update: StateUpdate) -> None:
+        if self.history_policy.spill_path is None or self._recovering:
+            return
+        if self._spill_file is None:
+            self._spill_file = open(self.history_policy.spill_path, "a", encoding="utf-8")
+        # Spilled updates hold values, not digests, so their blobs can be swept
+        record = self._to_record(self._resolve_update(update))
+        self._spill_file.write(json.dumps(record, default=str) + "\n")
+        self._spill_file.flush()
+
+    def _chain_length(self, version: int) -> int:
+        length = 0
+        checkpoint = self._checkpoints[version]
+        while checkpoint.parent is not None:
+            length += 1
+            checkpoint = self._checkpoints[checkpoint.parent]
+        return length
+
+    def _materialize_checkpoint(self, version: int) -> Dict[str, Any]:
+        chain: List[_Checkpoint] = []
+        checkpoint: Optional[_Checkpoint] = self._checkpoints[version]
+        while checkpoint is not None:
+            chain.append(checkpoint)
+            checkpoint = (
+                self._checkpoints[checkpoint.parent] if checkpoint.parent is not None else None
+            )
+        state: Dict[str, Any] = {}
+        for checkpoint in reversed(chain):
+            for key in checkpoint.removed:
+                state.pop(key, None)
+            state.update(checkpoint.delta)
+        return state
@@ -0,0 +1,412 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .state import (
+    HistoryPolicy,
+    StateConflictError,
+    StateSnapshot,
+    StateUpdate,
+    run_optimistic_update,
+)
+from .profiling import profiled
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    version INTEGER NOT NULL,
+    revision INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (id, version, revision) VALUES (0, 0, 0);
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    revision INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS removed (
+    key TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    version INTEGER PRIMARY KEY,
+    agent_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    update_type TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_agent ON history (agent_id, version);
+CREATE TABLE IF NOT EXISTS agent_counts (
+    agent_id TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    state TEXT NOT NULL
+);
+"""
+
+
+class SQLiteStateManager:
+    """
+    Versioned shared state stored in a SQLite database in WAL mode.
+
+    Offers the same API as CentralizedStateManager but works across
+    processes: every process (and thread) opens its own connection, writers
+    serialize on SQLite's write lock and readers see consistent snapshots
+    without blocking writers. Instances are picklable, so they can be handed
+    to ProcessPoolExecutor workers.
+
+    Values must be JSON-serializable. Decoded values are cached per process
+    and shared between readers (treat them as immutable), so repeated reads
+    only decode keys that changed.
+
+    Attributes:
+        path: Path of the SQLite database file.
+        history_policy: Retention policy; only ``max_entries`` applies here.
+        poll_interval_s: Polling interval used by watch() and awatch().
+    """
+
+    def __init__(
+        self,
+        path: str,
+        history_policy: Optional[HistoryPolicy] = None,
+        poll_interval_s: float = 0.05,
+    ) -> None:
+        self.path = path
+        self.history_policy = history_policy or HistoryPolicy()
+        self.poll_interval_s = poll_interval_s
+        self._local = threading.local()
+        self._cache: Dict[str, Tuple[int, Any]] = {}
+        self._cache_lock = threading.Lock()
+        self._connection().executescript(_SCHEMA)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "history_policy": self.history_policy,
+            "poll_interval_s": self.poll_interval_s,
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(**state)  # type: ignore[misc]
+
+    def snapshot(self) -> StateSnapshot:
+        """
+        Return a consistent snapshot of the current state.
+        """
+        with self._transaction() as conn:
+            version, revision = conn.execute(
+                "SELECT version, revision FROM meta WHERE id = 0"
+            ).fetchone()
+            data = self._read_values(conn, None)
+        return StateSnapshot(version=version, data=MappingProxyType(data), revision=revision)
+
+    @profiled("state.read_state")
+    def read_state(self, keys: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Return a copy of the current state, optionally limited to specified keys.
+        """
+        with self._transaction() as conn:
+            data = self._read_values(conn, keys)
+        if keys is not None:
+            return {k: data.get(k) for k in keys}
+        return data
+
+    @profiled("state.update_state")
+    def update_state(
+        self,
+        agent_id: str,
+        updates: Dict[str, Any],
+        update_type: str = "standard",
+        expected_version: Optional[int] = None,
+        expected_key_revisions: Optional[Dict[str, int]] = None,
+        expected_revision: Optional[int] = None,
+    ) -> int:
+        """
+        Apply updates atomically and record a new version.
+
+        Semantics match CentralizedStateManager.update_state().
+        """
+        encoded = {k: json.dumps(v) for k, v in updates.items()}
+        data_json = json.dumps(updates)
+        with self._transaction(write=True) as conn:
+            current_version = self._read_version(conn)
+            current_revision = conn.execute("SELECT revision FROM meta WHERE id = 0").fetchone()[0]
+            if expected_version is not None and expected_version != current_version:
+                raise StateConflictError(expected_version, current_version)
+            if expected_revision is not None and expected_revision != current_revision:
+                raise StateConflictError(expected_revision, current_revision, unit="revision")
+            if expected_key_revisions:
+                stale = []
+                for key, seen in expected_key_revisions.items():
+                    (revision,) = conn.execute(
+                        "SELECT MAX(revision) FROM (SELECT revision FROM kv WHERE key = ? "
+                        "UNION ALL SELECT revision FROM removed WHERE key = ?)",
+                        (key, key),
+                    ).fetchone()
+                    if revision is not None and revision > seen:
+                        stale.append(key)
+                if stale:
+                    raise StateConflictError(
+                        min(expected_key_revisions[k] for k in stale),
+                        current_revision,
+                        stale,
+                        unit="revision",
+                    )
+            version = current_version + 1
+            revision = self._next_revision(conn)
+            conn.executemany(
+                "INSERT INTO kv (key, value, version, revision) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                "version = excluded.version, revision = excluded.revision",
+                [(k, v, version, revision) for k, v in encoded.items()],
+            )
+            conn.execute(
+                "INSERT INTO history (version, agent_id, timestamp, update_type, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (version, agent_id, datetime.now().isoformat(), update_type, data_json),
+            )
+            conn.execute(
+                "INSERT INTO agent_counts (agent_id, count) VALUES (?, 1) "
+                "ON CONFLICT(agent_id) DO UPDATE SET count = count + 1",
+                (agent_id,),
+            )
+            conn.execute("UPDATE meta SET version = ? WHERE id = 0", (version,))
+            max_entries = self.history_policy.max_entries
+            if max_entries is not None:
+                conn.execute("DELETE FROM history WHERE version <= ?", (version - max_entries,))
+        return version
+
+    def update_with_retry(
+        self,
+        agent_id: str,
+        compute_updates: Callable[[StateSnapshot], Dict[str, Any]],
+        update_type: str = "standard",
+        read_keys: Optional[List[str]] = None,
+        max_attempts: int = 5,
+    ) -> int:
+        """
+        Run an optimistic read-modify-write, retrying on conflicts.
+        """
+        return run_optimistic_update(
+            self, agent_id, compute_updates, update_type, read_keys, max_attempts
+        )
+
+    def create_checkpoint(self, checkpoint_name: str) -> int:
+        """
+        Save a named snapshot of the state.
+
+        Returns the version number at which the checkpoint was created.
+        """
+        with self._transaction(write=True) as conn:
+            version = self._read_version(conn)
+            rows = conn.execute("SELECT key, value FROM kv").fetchall()
+            state_json = "{" + ",".join(f"{json.dumps(k)}:{v}" for k, v in rows) + "}"
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (version, name, timestamp, state) "
+                "VALUES (?, ?, ?, ?)",
+                (version, checkpoint_name, datetime.now().isoformat(), state_json),
+            )
+        return version
+
+    def restore_checkpoint(self, version: int) -> bool:
+        """
+        Restore the state to a previously saved checkpoint.
+
+        Updates and checkpoints recorded after the checkpoint are discarded.
+        As in CentralizedStateManager, the restore gets a new revision so
+        compare-and-set against an earlier snapshot fails.
+        Returns True if successful, False if the checkpoint is unknown.
+        """
+        with self._transaction(write=True) as conn:
+            row = conn.execute(
+                "SELECT state FROM checkpoints WHERE version = ?", (version,)
+            ).fetchone()
+            if row is None:
+                return False
+            state: Dict[str, Any] = json.loads(row[0])
+            revision = self._next_revision(conn)
+            # Keys the restore drops keep a tombstone so per-key checks still see the change
+            conn.execute(
+                "INSERT OR REPLACE INTO removed (key, revision) SELECT key, ? FROM kv",
+                (revision,),
+            )
+            conn.execute("DELETE FROM kv")
+            conn.executemany(
+                "INSERT INTO kv (key, value, version, revision) VALUES (?, ?, ?, ?)",
+                [(k, json.dumps(v), version, revision) for k, v in state.items()],
+            )
+            dropped = conn.execute(
+                "SELECT agent_id, COUNT(*) FROM history WHERE version > ? GROUP BY agent_id",
+                (version,),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE agent_counts SET count = count - ? WHERE agent_id = ?",
+                [(n, agent) for agent, n in dropped],
+            )
+            conn.execute("DELETE FROM history WHERE version > ?", (version,))
+            conn.execute("DELETE FROM checkpoints WHERE version > ?", (version,))
+            conn.execute("UPDATE meta SET version = ? WHERE id = 0", (version,))
+        return True
+
+    def get_history(
+        self,
+        agent_id: Optional[str] = None,
+        since_version: Optional[int] = None,
+    ) -> List[StateUpdate]:
+        """
+        Return a list of retained state updates, optionally filtered by agent or version.
+        """
+        query = "SELECT version, agent_id, timestamp, update_type, data FROM history WHERE version > ?"
+        params: List[Any] = [since_version or 0]
+        if agent_id is not None:
+            query += " AND agent_id = ?"
+            params.append(agent_id)
+        query += " ORDER BY version"
+        with self._transaction() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [
+            StateUpdate(
+                agent_id=agent,
+                timestamp=datetime.fromisoformat(ts),
+                update_type=update_type,
+                data=json.loads(data),
+                version=version,
+            )
+            for version, agent, ts, update_type, data in rows
+        ]
+
+    def get_agent_contributions(self) -> Dict[str, int]:
+        """
+        Return a count of updates performed by each agent.
+        """
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT agent_id, count FROM agent_counts WHERE count > 0").fetchall()
+        return dict(rows)
+
+    def watch(
+        self,
+        keys: Optional[List[str]] = None,
+        since_version: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[StateUpdate]:
+        """
+        Poll until an update after ``since_version`` touches one of ``keys``.
+
+        Cross-process writers cannot signal this process, so this polls every
+        ``poll_interval_s`` seconds. Returns an empty list on timeout.
+        """
+        since = self.snapshot().version if since_version is None else since_version
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            updates = self._matching_updates(since, keys)
+            if updates or (deadline is not None and time.monotonic() >= deadline):
+                return updates
+            time.sleep(self.poll_interval_s)
+
+    async def awatch(
+        self,
+        keys: Optional[List[str]] = None,
+        since_version: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[StateUpdate]:
+        """
+        Asynchronous variant of watch() that does not block the event loop.
+        """
+        since = self.snapshot().version if since_version is None else since_version
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            updates = self._matching_updates(since, keys)
+            if updates or (deadline is not None and time.monotonic() >= deadline):
+                return updates
+            await asyncio.sleep(self.poll_interval_s)
+
+    def close(self) -> None:
+        """
+        Close this thread's connection.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _matching_updates(self, since: int, keys: Optional[List[str]]) -> List[StateUpdate]:
+        updates = self.get_history(since_version=since)
+        if keys is None:
+            return updates
+        wanted = frozenset(keys)
+        return [u for u in updates if not wanted.isdisjoint(u.data)]
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self, write: bool = False) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _read_version(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT version FROM meta WHERE id = 0").fetchone()[0]
+
+    def _next_revision(self, conn: sqlite3.Connection) -> int:
+        # Revisions never go backwards, unlike versions after a restore, so
+        # they safely identify cached values
+        conn.execute("UPDATE meta SET revision = revision + 1 WHERE id = 0")
+        return conn.execute("SELECT revision FROM meta WHERE id = 0").fetchone()[0]
+
+    def _read_values(
+        self, conn: sqlite3.Connection, keys: Optional[List[str]]
+    ) -> Dict[str, Any]:
+        if keys is None:
+            revisions = conn.execute("SELECT key, revision FROM kv").fetchall()
+        else:
+            placeholders = ",".join("?" for _ in keys)
+            revisions = conn.execute(
+                f"SELECT key, revision FROM kv WHERE key IN ({placeholders})", keys
+            ).fetchall()
+        result: Dict[str, Any] = {}
+        stale: List[str] = []
+        with self._cache_lock:
+            for key, revision in revisions:
+                cached = self._cache.get(key)
+                if cached is not None and cached[0] == revision:
+                    result[key] = cached[1]
+                else:
+                    stale.append(key)
+        if stale:
+            placeholders = ",".join("?" for _ in stale)
+            rows = conn.execute(
+                f"SELECT key, value, revision FROM kv WHERE key IN ({placeholders})", stale
+            ).fetchall()
+            with self._cache_lock:
+                for key, value, revision in rows:
+                    decoded = json.loads(value)
+                    self._cache[key] = (revision, decoded)
+                    result[key] = decoded
+        return result
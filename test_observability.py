@@ -0,0 +1,259 @@
+import asyncio
+import gzip
+import json
+import os
+import random
+import threading
+import urllib.request
+from typing import List
+
+import pytest
+
+from orchestrator.histogram import LatencyHistogram
+from orchestrator.log_pipeline import LogPipeline, RotatingJSONLSink
+from orchestrator.metrics import MetricsRegistry
+from orchestrator.observability import AgentObservability
+from orchestrator.resilience import RetryConfig, execute_with_retry
+from orchestrator.run_history import RUN_TOTAL, RunHistoryStore, welch_t_test
+from orchestrator.tracing import Tracer, wrap
+
+
+class _ListSink:
+    def __init__(self) -> None:
+        self.lines: List[str] = []
+
+    def write_batch(self, lines: List[str]) -> None:
+        self.lines.extend(lines)
+
+    def close(self) -> None:
+        pass
+
+
+def test_histogram_quantiles_within_relative_error_and_mergeable() -> None:
+    rng = random.Random(7)
+    values = [rng.lognormvariate(6, 1) for _ in range(20_000)]
+    left, right = LatencyHistogram(), LatencyHistogram()
+    for i, v in enumerate(values):
+        (left if i % 2 else right).record(v)
+    left.merge(LatencyHistogram.from_dict(right.to_dict()))
+
+    values.sort()
+    assert left.count == len(values)
+    assert len(left._buckets) < 1000
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(left.quantile(q) - exact) / exact <= 0.02
+
+
+def test_summary_reports_percentiles_by_agent_step_and_model() -> None:
+    obs = AgentObservability("test_latency", pipeline=LogPipeline(sinks=[_ListSink()]))
+    for ms in (100, 200, 300, 400):
+        obs.log_agent_call("writer", "write", 10, 20, ms, True, 0.001, model="m1", step="draft")
+    obs.log_agent_call("editor", "edit", 10, 20, 1000, True, 0.001, model="m2")
+
+    summary = obs.get_summary()
+    assert summary["avg_latency_ms"] == 400
+    assert summary["latency_ms"]["count"] == 5
+    assert summary["latency_ms"]["max"] == 1000
+    assert abs(summary["latency_by_agent"]["writer"]["p50"] - 200) <= 4
+    assert set(summary["latency_by_step"]) == {"draft"}
+    assert set(summary["latency_by_model"]) == {"m1", "m2"}
+    # The merged view refuses writes that would be lost; snapshots are detached copies
+    with pytest.raises(AttributeError):
+        obs.metrics.total_calls = 0
+    with pytest.raises(TypeError):
+        obs.metrics.agent_calls["writer"] = 0  # type: ignore[index]
+    with pytest.raises(AttributeError):
+        obs.metrics.agent_latency["writer"].record(1.0)
+    assert obs.metrics.agent_latency["writer"].summary() == summary["latency_by_agent"]["writer"]
+    snapshot = obs.snapshot_metrics()
+    snapshot.agent_calls["writer"] = 0
+    assert obs.metrics.agent_calls["writer"] == 4
+
+
+def test_log_pipeline_preserves_order_and_samples_without_dropping_failures() -> None:
+    sink = _ListSink()
+    pipeline = LogPipeline(sinks=[sink], sample_rates={"chatty": 0.25})
+    obs = AgentObservability("test_logs", pipeline=pipeline)
+    for i in range(100):
+        obs.log_agent_call("chatty", f"t{i}", 1, 1, 1.0, True, 0.0)
+    obs.log_agent_call("chatty", "boom", 1, 1, 1.0, False, 0.0, error="x")
+    obs.log_workflow_step("done", "phase", {"n": 1})
+    pipeline.close()
+
+    messages = [json.loads(line)["message"] for line in sink.lines]
+    tasks = [m["task"] for m in messages if "task" in m]
+    assert len(tasks) == 26 and tasks[-1] == "boom"
+    assert tasks[:-1] == sorted(tasks[:-1], key=lambda t: int(t[1:]))
+    assert messages[-1]["step_name"] == "done"
+    assert obs.get_summary()["total_calls"] == 101
+    assert pipeline.stats()["sampled_out"] == 75
+
+
+def test_log_pipeline_drops_instead_of_blocking_when_full() -> None:
+    release = threading.Event()
+
+    class _SlowSink(_ListSink):
+        def write_batch(self, lines: List[str]) -> None:
+            release.wait(5)
+            super().write_batch(lines)
+
+    sink = _SlowSink()
+    pipeline = LogPipeline(sinks=[sink], max_queue=10, batch_size=1)
+    # Records are copied on emit, so changes made while they wait do not reach the sink
+    record = {"i": -1, "metadata": {"n": 1}}
+    pipeline.emit("wf", record)
+    record["metadata"]["n"] = 2
+    accepted = sum(pipeline.emit("wf", {"i": i}) for i in range(100))
+    release.set()
+    pipeline.close()
+    assert accepted < 100
+    assert pipeline.stats()["dropped"] == 100 - accepted
+    assert len(sink.lines) == accepted + 1
+    assert json.loads(sink.lines[0])["message"]["metadata"] == {"n": 1}
+
+
+def test_rotating_sink_compresses_rotated_files(tmp_path) -> None:
+    path = os.path.join(tmp_path, "logs", "run.jsonl")
+    pipeline = LogPipeline(sinks=[RotatingJSONLSink(path, max_bytes=2000, backup_count=2, compress=True)], batch_size=10)
+    for i in range(200):
+        pipeline.emit("wf", {"i": i})
+    pipeline.close()
+    assert os.path.exists(path + ".1.gz") and os.path.exists(path + ".2.gz")
+    assert not os.path.exists(path + ".3.gz")
+    with gzip.open(path + ".1.gz", "rt") as f:
+        assert all(json.loads(line)["workflow"] == "wf" for line in f)
+
+
+def test_spans_nest_across_asyncio_tasks_and_executor_threads(tmp_path) -> None:
+    tracer = Tracer()
+    attempts = []
+
+    def flaky_call() -> str:
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("connection reset")
+        return "ok"
+
+    def llm_call(i: int) -> None:
+        with tracer.span("llm.call", index=i):
+            execute_with_retry(flaky_call, RetryConfig(base_delay=0.0, jitter=False))
+
+    async def workflow() -> None:
+        loop = asyncio.get_running_loop()
+
+        async def one(i: int) -> None:
+            with tracer.span("research.sub_query", index=i):
+                await loop.run_in_executor(None, wrap(lambda: llm_call(i)))
+
+        with tracer.span("workflow"):
+            await asyncio.gather(one(0), one(1))
+
+    asyncio.run(workflow())
+
+    by_id = {s.span_id: s for s in tracer.spans()}
+    root = next(s for s in by_id.values() if s.name == "workflow")
+    assert {s.trace_id for s in by_id.values()} == {root.trace_id}
+    for s in by_id.values():
+        if s.name == "research.sub_query":
+            assert s.parent_id == root.span_id
+        elif s.name == "llm.call":
+            assert by_id[s.parent_id].name == "research.sub_query"
+        elif s.name == "retry.attempt":
+            assert by_id[s.parent_id].name == "llm.call"
+    assert [s.status for s in by_id.values() if s.name == "retry.attempt"].count("error") == 1
+
+    tracer.export_chrome_trace(os.path.join(tmp_path, "trace.json"))
+    tracer.export_otlp_json(os.path.join(tmp_path, "trace.otlp.json"))
+    with open(os.path.join(tmp_path, "trace.json")) as f:
+        assert len(json.load(f)["traceEvents"]) == len(by_id)
+    with open(os.path.join(tmp_path, "trace.otlp.json")) as f:
+        spans = json.load(f)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert sum("parentSpanId" not in s for s in spans) == 1
+
+
+def test_prometheus_exposition_over_http_and_textfile(tmp_path) -> None:
+    registry = MetricsRegistry()
+    obs = AgentObservability(
+        "wf", pipeline=LogPipeline(sinks=[_ListSink()]), registry=registry
+    )
+    obs.log_agent_call("writer", "t", 100, 50, 300.0, True, 0.01, model="m1", step="draft")
+    obs.log_agent_call("writer", "t", 100, 50, 3000.0, False, 0.0, error="x", model="m1", step="draft")
+
+    counter = registry.counter("jobs_total", "Jobs.", ("kind",)).labels("a\"b")
+    threads = [threading.Thread(target=lambda: [counter.inc() for _ in range(10_000)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    server = registry.start_http_server(0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as resp:
+            body = resp.read().decode("utf-8")
+    finally:
+        server.shutdown()
+    base = 'workflow="wf",agent="writer",step="draft",model="m1"'
+    assert f'orchestrator_llm_calls_total{{{base},status="ok"}} 1' in body
+    assert f'orchestrator_llm_calls_total{{{base},status="error"}} 1' in body
+    assert f'orchestrator_tokens_total{{{base},direction="input"}} 200' in body
+    assert f'orchestrator_llm_call_duration_seconds_bucket{{{base},le="0.5"}} 1' in body
+    assert f'orchestrator_llm_call_duration_seconds_bucket{{{base},le="+Inf"}} 2' in body
+    assert f"orchestrator_llm_call_duration_seconds_count{{{base}}} 2" in body
+    assert 'jobs_total{kind="a\\"b"} 40000' in body
+
+    path = os.path.join(tmp_path, "orchestrator.prom")
+    registry.write_textfile(path)
+    with open(path) as f:
+        assert "# TYPE orchestrator_llm_call_duration_seconds histogram" in f.read()
+
+
+def test_summary_is_exact_under_concurrent_recording() -> None:
+    obs = AgentObservability(
+        "concurrent", pipeline=LogPipeline(sinks=[_ListSink()]), registry=MetricsRegistry()
+    )
+
+    def record(worker: int) -> None:
+        for i in range(2000):
+            obs.log_agent_call(f"agent{worker % 2}", "t", 1, 2, float(i % 50 + 1), True, 0.001)
+
+    threads = [threading.Thread(target=record, args=(w,)) for w in range(8)]
+    for t in threads:
+        t.start()
+    obs.get_summary()  # reading while writers run must not raise
+    for t in threads:
+        t.join()
+
+    summary = obs.get_summary()
+    assert summary["total_calls"] == 16_000
+    assert summary["total_tokens"] == 48_000
+    assert summary["agent_breakdown"] == {"agent0": 8000, "agent1": 8000}
+    assert summary["latency_ms"]["count"] == 16_000
+
+
+def test_run_history_flags_significant_regressions(tmp_path) -> None:
+    store = RunHistoryStore(os.path.join(tmp_path, "runs.db"))
+    rng = random.Random(3)
+    run_ids = []
+    for i in range(10):
+        slow = i >= 5
+        obs = AgentObservability(
+            "prd_generator", pipeline=LogPipeline(sinks=[_ListSink()]), registry=MetricsRegistry()
+        )
+        latency = (150.0 if slow else 100.0) + rng.uniform(-5, 5)
+        obs.log_agent_call("chain_step:draft", "t", 100, 100, latency, True, 0.01, model="m", step="draft")
+        obs.log_validator_result("draft", passed=True)
+        run_ids.append(store.record_run(obs, started_at=1000.0 + i, finished_at=1010.0 + i))
+
+    assert [r["run_id"] for r in store.list_runs("prd_generator", limit=3)] == run_ids[:-4:-1]
+    by_key = {(c.step, c.metric): c for c in store.compare(run_ids[:5], run_ids[5:])}
+    assert by_key[("draft", "latency_p50_ms")].regression
+    assert by_key[("draft", "latency_p50_ms")].change_pct > 40
+    assert not by_key[("draft", "tokens")].regression
+    assert by_key[("draft", "validator_pass_rate")].candidate_mean == 1.0
+    assert by_key[(RUN_TOTAL, "cost_usd")].p_value == 1.0
+
+    single = store.compare(run_ids[:1], run_ids[-1:])
+    assert all(c.p_value is None and not c.regression for c in single)
+    # t = 2 with 8 degrees of freedom: two-sided p = 0.0805
+    assert abs(welch_t_test([1, 2, 3, 4, 5], [3, 4, 5, 6, 7]) - 0.0805) < 1e-3
@@ -0,0 +1,340 @@
+import asyncio
+import io
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import pytest
+
+from orchestrator.config import ModelConfig, OrchestratorConfig
+from orchestrator.cost import CostRouter
+from orchestrator.log_pipeline import LogPipeline
+from orchestrator.metrics import MetricsRegistry
+from orchestrator.resilience import (
+    CircuitBreakerConfig,
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+    RetryAttempt,
+    RetryBudget,
+    RetryConfig,
+    aexecute_with_retry,
+    execute_with_retry,
+    is_retryable_error,
+    retry_after_seconds,
+)
+
+
+class _StatusError(Exception):
+    # Shaped like the SDK's APIStatusError: status_code plus an HTTP response with headers.
+    def __init__(self, status_code: int, headers=None) -> None:
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+def test_retry_classifies_by_status_and_honors_retry_after() -> None:
+    assert is_retryable_error(_StatusError(429)) and is_retryable_error(_StatusError(529))
+    assert not is_retryable_error(_StatusError(400)) and not is_retryable_error(RuntimeError("rate_limit"))
+    assert retry_after_seconds(_StatusError(429, {"retry-after-ms": "1500"})) == 1.5
+    assert not is_retryable_error(_StatusError(429, {"retry-after": "3600"}))
+
+    errors = [_StatusError(429, {"retry-after": "0.01"}), _StatusError(503)]
+    seen: List[RetryAttempt] = []
+
+    def flaky() -> str:
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    cfg = RetryConfig(base_delay=0.0, jitter=False)
+    assert execute_with_retry(flaky, cfg, on_attempt=seen.append) == "ok"
+    assert [(a.attempt, a.status_code, a.will_retry) for a in seen] == [
+        (1, 429, True), (2, 503, True), (3, None, False)
+    ]
+    assert seen[0].delay == 0.01
+
+    async def bad_request() -> str:
+        raise _StatusError(400)
+
+    seen.clear()
+    with pytest.raises(_StatusError):
+        asyncio.run(aexecute_with_retry(bad_request, cfg, on_attempt=seen.append))
+    assert len(seen) == 1 and not seen[0].will_retry
+
+
+def test_llm_client_retries_transient_errors_and_counts_attempts() -> None:
+    pytest.importorskip("anthropic")
+    from orchestrator.llm_client import LLMClient
+
+    model = ModelConfig(name="m", input_cost_per_1k=0.0, output_cost_per_1k=0.0)
+    registry = MetricsRegistry()
+    client = LLMClient(
+        OrchestratorConfig(anthropic_api_key="dummy", premium_model=model, standard_model=model),
+        retry_config=RetryConfig(base_delay=0.0, jitter=False),
+        registry=registry,
+    )
+    outcomes = [_StatusError(529), None]
+
+    def create(**request):
+        error = outcomes.pop(0)
+        if error is not None:
+            raise error
+        return SimpleNamespace(
+            content=[SimpleNamespace(text="hi")], usage=SimpleNamespace(input_tokens=3, output_tokens=1)
+        )
+
+    client.client = SimpleNamespace(messages=SimpleNamespace(create=create))
+    resp = client.call(model="m", prompt="hello")
+    assert resp.text == "hi" and resp.attempts == 2
+    text = registry.render()
+    assert 'orchestrator_llm_attempts_total{model="m",outcome="retry",status="529"} 1' in text
+    assert 'orchestrator_llm_attempts_total{model="m",outcome="ok",status=""} 1' in text
+
+
+def test_circuit_breaker_opens_probes_and_router_falls_back() -> None:
+    now = [0.0]
+    breakers = CircuitBreakerRegistry(
+        CircuitBreakerConfig(window_s=10.0, min_calls=4, failure_rate_threshold=0.5, open_duration_s=5.0),
+        registry=MetricsRegistry(),
+        pipeline=LogPipeline([]),
+        clock=lambda: now[0],
+    )
+    premium = breakers.get("premium_model")
+    premium.record_success(100.0)
+    premium.record_success(100.0)
+    premium.record_failure()
+    assert premium.state == "closed"
+    premium.record_failure()
+    assert premium.state == "open" and not premium.acquire()
+
+    standard = ModelConfig(name="standard_model", input_cost_per_1k=0.0, output_cost_per_1k=0.0)
+    cfg = OrchestratorConfig(
+        anthropic_api_key="dummy",
+        premium_model=ModelConfig(name="premium_model", input_cost_per_1k=0.0, output_cost_per_1k=0.0),
+        standard_model=standard,
+    )
+    assert CostRouter(cfg, breakers=breakers).select_model("x", "analysis") == standard
+    with pytest.raises(CircuitOpenError) as exc_info:
+        CostRouter(cfg, breakers=breakers, open_circuit_policy="fail_fast").select_model("x", "analysis")
+    assert exc_info.value.retry_in == 5.0
+
+    now[0] = 6.0
+    assert premium.state == "half_open"
+    assert premium.acquire() and not premium.acquire()
+    premium.record_success(100.0)
+    assert premium.state == "closed"
+    assert CostRouter(cfg, breakers=breakers).select_model("x", "analysis").name == "premium_model"
+
+
+def test_llm_client_releases_probe_slot_when_a_probe_has_no_verdict() -> None:
+    pytest.importorskip("anthropic")
+    from orchestrator.llm_client import LLMClient
+
+    now = [0.0]
+    breakers = CircuitBreakerRegistry(
+        CircuitBreakerConfig(min_calls=1, failure_rate_threshold=0.5, open_duration_s=5.0),
+        registry=MetricsRegistry(),
+        pipeline=LogPipeline([]),
+        clock=lambda: now[0],
+    )
+    model = ModelConfig(name="m", input_cost_per_1k=0.0, output_cost_per_1k=0.0)
+    client = LLMClient(
+        OrchestratorConfig(anthropic_api_key="dummy", premium_model=model, standard_model=model),
+        retry_config=RetryConfig(max_attempts=1),
+        registry=MetricsRegistry(),
+        breakers=breakers,
+    )
+    breaker = breakers.get("m")
+    breaker.record_failure()
+    now[0] = 6.0
+    # A malformed response and a rejected request both end the probe without a verdict
+    replies = [SimpleNamespace(content=[SimpleNamespace(text="hi")]), _StatusError(400)]
+
+    def create(**request):
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    client.client = SimpleNamespace(messages=SimpleNamespace(create=create))
+    with pytest.raises(AttributeError):
+        client.call(model="m", prompt="hello")
+    assert breaker.state == "half_open" and breaker.is_available()
+    with pytest.raises(_StatusError):
+        client.call(model="m", prompt="hello")
+    assert breaker.state == "half_open" and breaker.is_available()
+
+
+def test_retry_budget_limits_retries_to_share_of_successes() -> None:
+    now = [100.0]
+    registry = MetricsRegistry()
+    budget = RetryBudget(ratio=0.5, window_s=10, min_retries_per_s=0.1, registry=registry, clock=lambda: now[0])
+    for _ in range(4):
+        budget.record_success("m")
+    # 0.5 * 4 successes + 0.1/s * 10s = 3 retries in the window
+    assert [budget.try_acquire("m") for _ in range(4)] == [True, True, True, False]
+    assert 'orchestrator_retries_denied_total{model="m"} 1' in registry.render()
+
+    seen: List[RetryAttempt] = []
+
+    def overloaded() -> str:
+        raise _StatusError(529)
+
+    with pytest.raises(_StatusError):
+        execute_with_retry(
+            overloaded, RetryConfig(base_delay=0.0, jitter=False), on_attempt=seen.append,
+            retry_budget=budget, budget_key="m",
+        )
+    assert len(seen) == 1 and seen[0].budget_denied and not seen[0].will_retry
+
+    now[0] += 10
+    assert budget.try_acquire("m")
+
+
+def test_llm_client_continues_after_max_tokens_and_combines_usage() -> None:
+    pytest.importorskip("anthropic")
+    from orchestrator.llm_client import LLMClient
+
+    model = ModelConfig(name="m", input_cost_per_1k=0.0, output_cost_per_1k=0.0)
+    client = LLMClient(
+        OrchestratorConfig(anthropic_api_key="dummy", premium_model=model, standard_model=model),
+        registry=MetricsRegistry(),
+    )
+    requests = []
+    replies = [("Once upon a ", "max_tokens", 10), (" time there was", "max_tokens", 10), (" an end.", "end_turn", 4)]
+
+    def create(**request):
+        requests.append(request)
+        text, stop_reason, output_tokens = replies.pop(0)
+        return SimpleNamespace(
+            content=[SimpleNamespace(text=text)] if text is not None else [],
+            stop_reason=stop_reason,
+            usage=SimpleNamespace(input_tokens=5, output_tokens=output_tokens),
+        )
+
+    client.client = SimpleNamespace(messages=SimpleNamespace(create=create))
+    resp = client.call(model="m", prompt="story", max_tokens=10, max_total_tokens=30)
+    assert resp.text == "Once upon a time there was an end."
+    assert (resp.input_tokens, resp.output_tokens, resp.continuations) == (15, 24, 2)
+    assert resp.stop_reason == "end_turn"
+    # Continuations prefill the partial output without trailing whitespace
+    assert requests[1]["messages"][-1] == {"role": "assistant", "content": "Once upon a"}
+    assert requests[2]["max_tokens"] == 10
+
+    # An empty continuation keeps the paid-for output and stops continuing
+    requests.clear()
+    replies.extend([("It ended", "max_tokens", 10), (None, "max_tokens", 0)])
+    resp = client.call(model="m", prompt="story", max_tokens=10, max_total_tokens=30)
+    assert (resp.text, resp.output_tokens, resp.continuations) == ("It ended", 10, 1)
+    assert len(requests) == 2
+
+
+def test_saas_research_retries_failed_sub_queries_and_keeps_partial_findings() -> None:
+    pytest.importorskip("anthropic")
+    from orchestrator.llm_client import LLMResponse
+    from orchestrator.workflows.saas_research import SaaSResearchWorkflow
+
+    model = ModelConfig(name="m", input_cost_per_1k=0.0, output_cost_per_1k=0.0)
+    cfg = OrchestratorConfig(anthropic_api_key="dummy", premium_model=model, standard_model=model)
+    calls: List[str] = []
+
+    def fake_call_llm(prompt: str, task_type: str, max_tokens: int = 2048, temperature: float = 0.7, model_cfg=None):
+        question = next(q for q in ("ok", "flaky", "broken", "invalid") if f"\n{q}\n" in prompt)
+        calls.append(question)
+        # "flaky" fails once, "broken" always fails, "invalid" is not worth retrying
+        if question == "broken" or (question == "flaky" and calls.count("flaky") == 1):
+            raise ConnectionError(question)
+        if question == "invalid":
+            raise _StatusError(400)
+        return LLMResponse(text=f"finding for {question}", input_tokens=1, output_tokens=1, latency_ms=1.0)
+
+    budget = RetryBudget(ratio=0.0, min_retries_per_s=0.3, registry=MetricsRegistry())
+    wf = SaaSResearchWorkflow(cfg, min_research_success_ratio=0.5, sub_query_retries=3)
+    # Workflow re-runs only replace the client's retries, never stack on them
+    wf.llm.retry_config = RetryConfig(max_attempts=1, base_delay=0.0, jitter=False)
+    wf.llm.retry_budget = budget
+    wf.manager._call_llm = fake_call_llm  # type: ignore[assignment]
+    findings = asyncio.run(wf._parallel_research(["ok", "flaky", "broken", "invalid"]))
+    assert list(findings) == ["ok", "flaky"]
+    # Only retryable failures were re-run, until the budget of 3 retries ran out
+    assert sorted(calls) == ["broken", "broken", "broken", "flaky", "flaky", "invalid", "ok"]
+    assert budget.try_acquire("m") is False
+    state = wf.state_mgr.read_state(["findings", "failed_sub_queries"])
+    assert state["findings"] == findings
+    assert sorted(state["failed_sub_queries"]) == ["broken", "invalid"]
+    assert len(wf.obs.metrics.failures) == 5
+
+    calls.clear()
+    retrying_client = SaaSResearchWorkflow(cfg, min_research_success_ratio=0.25, sub_query_retries=3)
+    retrying_client.manager._call_llm = fake_call_llm  # type: ignore[assignment]
+    assert list(asyncio.run(retrying_client._parallel_research(["ok", "flaky", "broken"]))) == ["ok"]
+    assert sorted(calls) == ["broken", "flaky", "ok"]
+
+    strict = SaaSResearchWorkflow(cfg, min_research_success_ratio=1.0)
+    strict.manager._call_llm = fake_call_llm  # type: ignore[assignment]
+    with pytest.raises(RuntimeError, match="2 of 3"):
+        asyncio.run(strict._parallel_research(["ok", "flaky", "broken"]))
+    assert strict.state_mgr.read_state(["partial_findings"])["partial_findings"] == {
+        "ok": "finding for ok", "flaky": "finding for flaky"
+    }
+
+
+def test_saas_research_resumes_only_with_a_state_dir(tmp_path) -> None:
+    pytest.importorskip("anthropic")
+    from orchestrator.llm_client import LLMResponse
+    from orchestrator.workflows.saas_research import SaaSResearchWorkflow
+
+    model = ModelConfig(name="m", input_cost_per_1k=0.0, output_cost_per_1k=0.0)
+    cfg = OrchestratorConfig(anthropic_api_key="dummy", premium_model=model, standard_model=model)
+    decompositions: List[str] = []
+
+    def fake_call_llm(prompt: str, task_type: str, max_tokens: int = 2048, temperature: float = 0.7, model_cfg=None):
+        text = "done"
+        if "JSON array" in prompt:
+            decompositions.append(prompt)
+            text = '["a", "b"]'
+        return LLMResponse(text=text, input_tokens=1, output_tokens=1, latency_ms=1.0)
+
+    in_memory = SaaSResearchWorkflow(cfg)
+    in_memory.manager._call_llm = fake_call_llm  # type: ignore[assignment]
+    asyncio.run(in_memory.run("q"))
+    asyncio.run(in_memory.run("q"))
+    assert len(decompositions) == 2
+
+    durable = SaaSResearchWorkflow(cfg, state_dir=str(tmp_path))
+    durable.manager._call_llm = fake_call_llm  # type: ignore[assignment]
+    asyncio.run(durable.run("q"))
+    result = asyncio.run(durable.run("q"))
+    assert len(decompositions) == 3
+    assert result.sub_queries == ["a", "b"] and result.final_report == "done"
+
+
+def test_saas_research_reports_stage_progress() -> None:
+    pytest.importorskip("anthropic")
+    from orchestrator.llm_client import LLMResponse
+    from orchestrator.progress import ProgressDisplay
+    from orchestrator.workflows.saas_research import SaaSResearchWorkflow
+
+    model = ModelConfig(name="m", input_cost_per_1k=0.0, output_cost_per_1k=0.0)
+    cfg = OrchestratorConfig(anthropic_api_key="dummy", premium_model=model, standard_model=model)
+
+    def fake_call_llm(prompt: str, task_type: str, max_tokens: int = 2048, temperature: float = 0.7, model_cfg=None):
+        text = '["a", "b"]' if "JSON array" in prompt else "done"
+        return LLMResponse(text=text, input_tokens=1, output_tokens=1, latency_ms=1.0)
+
+    wf = SaaSResearchWorkflow(cfg)
+    wf.manager._call_llm = fake_call_llm  # type: ignore[assignment]
+    events: List[Dict[str, Any]] = []
+    wf.obs.add_listener(events.append)
+    out = io.StringIO()
+    display = ProgressDisplay(stream=out, tty=False).attach(wf.obs)
+    asyncio.run(wf.run("q"))
+    display.finish()
+    steps = [(e["event"], e["step"], e["index"], e["total"]) for e in events if e["event"].startswith("step_")]
+    assert steps == [
+        (kind, name, index, 4)
+        for index, name in enumerate(["decompose", "research", "analyze", "report"])
+        for kind in ("step_start", "step_end")
+    ]
+    last = json.loads(out.getvalue().splitlines()[-1])["progress"]
+    assert last["completed"] == 4 and last["total"] == 4
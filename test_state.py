@@ -0,0 +1,291 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from orchestrator.blobs import BlobRef, BlobStore, BlobStoreFullError
+from orchestrator.state import CentralizedStateManager, HistoryPolicy, StateConflictError
+from orchestrator.state_sqlite import SQLiteStateManager
+from orchestrator.wal import WriteAheadLog
+
+
+def test_snapshots_are_consistent_and_shared_between_versions() -> None:
+    mgr = CentralizedStateManager()
+    report = "x" * 10_000
+    v1 = mgr.update_state("writer", {"final_report": report, "status": "draft"})
+    snap = mgr.snapshot()
+    mgr.update_state("writer", {"status": "final"})
+    # Old snapshot is unaffected by later writes, and large values are shared, not copied
+    assert snap.version == v1 and snap.get("status") == "draft"
+    assert mgr.snapshot().get("final_report") is report
+    assert mgr.read_state(["status"]) == {"status": "final"}
+
+
+def test_checkpoint_retains_version_and_restores() -> None:
+    mgr = CentralizedStateManager()
+    mgr.update_state("a", {"k": 1})
+    cp = mgr.create_checkpoint("after_k")
+    mgr.update_state("a", {"k": 2, "j": 3})
+    assert mgr.restore_checkpoint(cp)
+    assert mgr.read_state() == {"k": 1}
+    assert mgr.snapshot().version == cp
+    assert not mgr.restore_checkpoint(999)
+
+
+def test_bounded_history_spills_and_rebuilds_versions(tmp_path) -> None:
+    spill = tmp_path / "history.jsonl"
+    mgr = CentralizedStateManager(
+        HistoryPolicy(max_entries=3, spill_path=str(spill), keyframe_interval=2)
+    )
+    for i in range(1, 9):
+        mgr.update_state(f"agent_{i % 2}", {"step": i, f"key_{i}": i})
+        if i % 2 == 0:
+            mgr.create_checkpoint(f"cp_{i}")
+    assert [u.version for u in mgr.get_history()] == [6, 7, 8]
+    assert len(spill.read_text().splitlines()) == 5
+    assert [u.version for u in mgr.get_history(agent_id="agent_1")] == [7]
+    assert [u.version for u in mgr.get_history(since_version=6)] == [7, 8]
+    assert mgr.get_agent_contributions() == {"agent_1": 4, "agent_0": 4}
+    # Retained history and checkpoints can both be rebuilt
+    assert mgr.state_at(7)["step"] == 7 and "key_8" not in mgr.state_at(7)
+    assert mgr.state_at(2) == {"step": 2, "key_1": 1, "key_2": 2}
+    assert mgr.state_at(3) is None
+    assert mgr.restore_checkpoint(4)
+    assert mgr.read_state()["step"] == 4 and mgr.get_history() == []
+    # Counts drop the abandoned updates, including the evicted ones
+    assert mgr.get_agent_contributions() == {"agent_1": 2, "agent_0": 2}
+    assert mgr.update_state("agent_0", {"step": 5}) == 5
+
+
+def test_write_ahead_log_recovers_state_after_restart(tmp_path) -> None:
+    wal_dir = str(tmp_path / "wal")
+    mgr = CentralizedStateManager(wal=WriteAheadLog(wal_dir, compact_every=3))
+    mgr.update_state("manager", {"sub_queries": ["a", "b"]}, update_type="decomposition")
+    cp = mgr.create_checkpoint("decomposed")
+    mgr.update_state("research_agent", {"findings": {"a": "x", "b": "y"}})
+    mgr.update_state("analysis_agent", {"analysis": "deep"})
+    mgr.close()
+    # Simulate a torn write from a crash
+    with open(f"{wal_dir}/{WriteAheadLog.LOG_FILE}", "a") as f:
+        f.write('{"seq": 99, "op": "upd')
+
+    recovered = CentralizedStateManager(wal=WriteAheadLog(wal_dir))
+    assert recovered.read_state() == mgr.read_state()
+    assert recovered.snapshot().version == 3
+    assert [u.update_type for u in recovered.get_history()][0] == "decomposition"
+    assert recovered.get_agent_contributions() == mgr.get_agent_contributions()
+    assert recovered.update_state("writing_agent", {"final_report": "done"}) == 4
+    assert recovered.restore_checkpoint(cp)
+    assert recovered.get_agent_contributions() == {"manager": 1}
+    recovered.close()
+    again = CentralizedStateManager(wal=WriteAheadLog(wal_dir))
+    assert again.read_state() == {"sub_queries": ["a", "b"]}
+    again.close()
+
+
+def test_watch_wakes_on_matching_keys_and_reports_missed_updates() -> None:
+    mgr = CentralizedStateManager()
+    mgr.update_state("manager", {"sub_queries": ["a"]})
+    since = mgr.snapshot().version
+
+    def produce() -> None:
+        time.sleep(0.05)
+        mgr.update_state("noise", {"unrelated": 1})
+        mgr.update_state("research_agent", {"findings": {"a": "x"}})
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    updates = mgr.watch(keys=["findings"], since_version=since, timeout=5)
+    producer.join()
+    assert [u.agent_id for u in updates] == ["research_agent"]
+    # Already-missed updates are returned immediately; nothing new times out
+    assert len(mgr.watch(since_version=since, timeout=5)) == 2
+    assert mgr.watch(keys=["analysis"], timeout=0.01) == []
+
+
+def test_awatch_resolves_when_version_passes() -> None:
+    mgr = CentralizedStateManager()
+
+    async def scenario() -> list:
+        waiter = asyncio.ensure_future(mgr.awatch(since_version=0, timeout=5))
+        await asyncio.sleep(0.01)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, lambda: mgr.update_state("a", {"k": 1}))
+        return await waiter
+
+    updates = asyncio.run(scenario())
+    assert [u.version for u in updates] == [1]
+
+
+def test_compare_and_set_detects_conflicts_and_retries() -> None:
+    mgr = CentralizedStateManager()
+    mgr.update_state("a", {"findings": {}, "analysis": ""})
+    snap = mgr.snapshot()
+    seen = snap.version
+    mgr.update_state("b", {"analysis": "newer"})
+    with pytest.raises(StateConflictError) as exc:
+        mgr.update_state("a", {"analysis": "stale"}, expected_version=seen)
+    assert exc.value.actual_version == seen + 1
+    # Per-key checks only fail for keys that actually changed
+    mgr.update_state("a", {"findings": {"q": "r"}}, expected_key_revisions={"findings": snap.revision})
+    with pytest.raises(StateConflictError, match="since revision") as exc:
+        mgr.update_state("a", {"x": 1}, expected_key_revisions={"analysis": snap.revision})
+    assert exc.value.conflicting_keys == ["analysis"]
+
+    def add_worker(i: int) -> None:
+        for _ in range(25):
+            mgr.update_with_retry(
+                f"worker_{i}",
+                lambda snap: {"counter": (snap.get("counter") or 0) + 1},
+                read_keys=["counter"],
+                max_attempts=1000,
+            )
+
+    threads = [threading.Thread(target=add_worker, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert mgr.read_state(["counter"]) == {"counter": 100}
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_compare_and_set_rejects_stale_snapshots_after_restore(tmp_path, backend) -> None:
+    if backend == "memory":
+        mgr = CentralizedStateManager(wal=WriteAheadLog(str(tmp_path / "wal")))
+    else:
+        mgr = SQLiteStateManager(str(tmp_path / "state.db"))
+    mgr.update_state("a", {"draft": "v1", "notes": "n"})
+    cp = mgr.create_checkpoint("first")
+    mgr.update_state("a", {"draft": "v2", "extra": 1})
+    stale = mgr.snapshot()
+    assert mgr.restore_checkpoint(cp)
+    mgr.update_state("b", {"draft": "v3"})
+    # The version number is reused, but the snapshot it came from is gone
+    assert mgr.snapshot().version == stale.version
+    with pytest.raises(StateConflictError):
+        mgr.update_state("a", {"draft": "lost"}, expected_revision=stale.revision)
+    with pytest.raises(StateConflictError):
+        mgr.update_state("a", {"x": 1}, expected_key_revisions={"notes": stale.revision})
+    # Keys dropped by the restore count as modified too
+    with pytest.raises(StateConflictError):
+        mgr.update_state("a", {"x": 1}, expected_key_revisions={"extra": stale.revision})
+    if backend == "memory":
+        mgr.close()
+        mgr = CentralizedStateManager(wal=WriteAheadLog(str(tmp_path / "wal")))
+        mgr.compact()
+        mgr.close()
+        mgr = CentralizedStateManager(wal=WriteAheadLog(str(tmp_path / "wal")))
+    fresh = mgr.snapshot()
+    assert fresh.revision > stale.revision
+    mgr.update_state("a", {"x": 1}, expected_key_revisions={"notes": fresh.revision})
+    fresh = mgr.snapshot()
+    mgr.update_state("a", {"draft": "v4"}, expected_revision=fresh.revision)
+    assert mgr.read_state(["draft"]) == {"draft": "v4"}
+
+
+def _sqlite_increment(mgr: SQLiteStateManager, worker: str, times: int) -> None:
+    for _ in range(times):
+        mgr.update_with_retry(
+            worker,
+            lambda snap: {"counter": (snap.get("counter") or 0) + 1},
+            read_keys=["counter"],
+            max_attempts=1000,
+        )
+
+
+def test_sqlite_backend_shares_state_across_processes(tmp_path) -> None:
+    mgr = SQLiteStateManager(str(tmp_path / "state.db"))
+    mgr.update_state("manager", {"sub_queries": ["a", "b"]}, update_type="decomposition")
+    cp = mgr.create_checkpoint("decomposed")
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        futures = [pool.submit(_sqlite_increment, mgr, f"worker_{i}", 10) for i in range(2)]
+        for future in futures:
+            future.result()
+    assert mgr.read_state(["counter"]) == {"counter": 20}
+    assert mgr.snapshot().version == 21
+    assert mgr.get_agent_contributions() == {"manager": 1, "worker_0": 10, "worker_1": 10}
+    assert len(mgr.get_history(agent_id="worker_0")) == 10
+    assert mgr.restore_checkpoint(cp)
+    assert mgr.read_state() == {"sub_queries": ["a", "b"]}
+    assert mgr.get_history(since_version=cp) == []
+
+
+def test_large_values_are_offloaded_and_deduplicated(tmp_path) -> None:
+    blobs = BlobStore(str(tmp_path / "blobs"), max_memory_bytes=1)
+    wal_dir = str(tmp_path / "wal")
+    mgr = CentralizedStateManager(
+        wal=WriteAheadLog(wal_dir), blob_store=blobs, offload_threshold=100
+    )
+    report = "finding " * 1000
+    mgr.update_state("research_agent", {"findings": {"q1": report, "q2": "short"}})
+    mgr.update_state("writing_agent", {"final_report": report})
+    stored = mgr.snapshot().data
+    assert isinstance(stored["final_report"], BlobRef)
+    assert stored["findings"]["q1"] == stored["final_report"]
+    assert stored["findings"]["q2"] == "short"
+    assert len(os.listdir(tmp_path / "blobs")) == 1
+    # Reads, history and snapshots resolve values transparently
+    assert mgr.read_state(["final_report"]) == {"final_report": report}
+    assert mgr.snapshot().get("findings") == {"q1": report, "q2": "short"}
+    assert mgr.get_history(agent_id="writing_agent")[0].data["final_report"] == report
+    mgr.close()
+    # The WAL logs digests only and recovery resolves them from disk
+    assert report not in open(os.path.join(wal_dir, WriteAheadLog.LOG_FILE)).read()
+    recovered = CentralizedStateManager(
+        wal=WriteAheadLog(wal_dir), blob_store=BlobStore(str(tmp_path / "blobs"))
+    )
+    assert recovered.read_state()["findings"]["q1"] == report
+    recovered.close()
+
+
+def test_unreferenced_blobs_are_swept(tmp_path) -> None:
+    # Memory-only: a full store sweeps blobs dropped from history, then keeps values inline
+    blobs = BlobStore(max_memory_bytes=4000)
+    mgr = CentralizedStateManager(
+        history_policy=HistoryPolicy(max_entries=1), blob_store=blobs, offload_threshold=100
+    )
+    mgr.update_state("a", {"draft": "a" * 1000})
+    cp = mgr.create_checkpoint("first draft")
+    for fill in "bcde":
+        mgr.update_state("a", {"draft": fill * 1000})
+    assert blobs.stats() == {"memory_blobs": 4, "memory_bytes": 4000}
+    assert mgr.state_at(cp) == {"draft": "a" * 1000}
+    mgr.update_state("a", {"draft": "e" * 1000, "notes": "n" * 2500})
+    assert mgr.snapshot().data["notes"] == "n" * 2500
+    with pytest.raises(BlobStoreFullError):
+        blobs.put("f" * 2000)
+
+    # Snapshots held by readers keep their blobs alive
+    mgr = CentralizedStateManager(
+        history_policy=HistoryPolicy(max_entries=2, keyframe_interval=1),
+        blob_store=BlobStore(), offload_threshold=100,
+    )
+    mgr.update_state("a", {"k": "x" * 200})
+    snap = mgr.snapshot()
+    for fill in "yzw":
+        mgr.update_state("a", {"k": fill * 200})
+    assert mgr.collect_blobs() == 0
+    assert snap.get("k") == "x" * 200
+    del snap
+    assert mgr.collect_blobs() == 1
+
+    # On disk: a restore removes blobs only the dropped branch used
+    blob_dir = tmp_path / "blobs"
+    mgr = CentralizedStateManager(
+        wal=WriteAheadLog(str(tmp_path / "wal")), blob_store=BlobStore(str(blob_dir)),
+        offload_threshold=100,
+    )
+    mgr.update_state("a", {"draft": "a" * 1000})
+    cp = mgr.create_checkpoint("first draft")
+    mgr.update_state("a", {"draft": "b" * 1000})
+    assert len(os.listdir(blob_dir)) == 2
+    assert mgr.restore_checkpoint(cp)
+    assert len(os.listdir(blob_dir)) == 1
+    mgr.update_state("a", {"draft": "c" * 1000})
+    mgr.update_state("a", {"draft": "d" * 1000})
+    assert mgr.collect_blobs() == 0
+    mgr.close()
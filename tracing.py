@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+
+@dataclass
+class Span:
+    """
+    A timed operation in a trace (workflow, step, agent run, LLM call, attempt).
+
+    Attributes:
+        name: Operation name, e.g. "chain.step" or "llm.call".
+        trace_id: 128-bit trace identifier as 32 hex characters.
+        span_id: 64-bit span identifier as 16 hex characters.
+        parent_id: span_id of the enclosing span, if any.
+        start_ns: Start time in nanoseconds since the epoch.
+        end_ns: End time in nanoseconds since the epoch, or None while open.
+        attributes: Free-form key/value attributes.
+        status: "ok" or "error".
+        thread_id: Identifier of the thread the span was started on.
+    """
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"
+    thread_id: int = 0
+    tracer: Optional["Tracer"] = field(default=None, repr=False, compare=False)
+
+    def set(self, **attributes: Any) -> None:
+        """
+        Add or overwrite attributes on the span.
+        """
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "orchestrator_current_span", default=None
+)
+
+
+class Tracer:
+    """
+    Records hierarchical spans and exports them for offline viewing.
+
+    The active span is tracked in a context variable, so nesting follows the
+    call stack and is inherited by asyncio tasks. Work handed to a thread
+    pool must be wrapped with wrap() to keep its parent. A disabled tracer
+    hands out no spans and costs one attribute check per span() call.
+
+    Attributes:
+        service_name: Service name reported in OTLP exports.
+        enabled: Whether spans are recorded.
+        max_spans: Maximum number of finished spans kept; older ones are dropped.
+    """
+
+    def __init__(
+        self,
+        service_name: str = "orchestrator",
+        enabled: bool = True,
+        max_spans: int = 100_000,
+    ) -> None:
+        self.service_name = service_name
+        self.enabled = enabled
+        self.max_spans = max_spans
+        self.dropped = 0
+        self._spans: List[Span] = []
+        self._lock = Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """
+        Open a child of the current span for the duration of the block.
+
+        Yields None when the tracer is disabled. Exceptions mark the span
+        as failed and propagate unchanged.
+        """
+        if not self.enabled:
+            yield None
+            return
+        parent = _current_span.get()
+        current = Span(
+            name=name,
+            trace_id=parent.trace_id if parent is not None else os.urandom(16).hex(),
+            span_id=os.urandom(8).hex(),
+            parent_id=parent.span_id if parent is not None else None,
+            start_ns=time.time_ns(),
+            attributes=attributes,
+            thread_id=threading.get_ident(),
+            tracer=self,
+        )
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.status = "error"
+            current.attributes["error"] = f"{type(e).__name__}: {e}"[:500]
+            raise
+        finally:
+            current.end_ns = time.time_ns()
+            _current_span.reset(token)
+            self._finish(current)
+
+    def spans(self) -> List[Span]:
+        """
+        Return the finished spans, oldest first.
+        """
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+            self.dropped = 0
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """
+        Return spans as Chrome trace-event JSON (chrome://tracing, Perfetto).
+        """
+        pid = os.getpid()
+        events: List[Dict[str, Any]] = []
+        for s in self.spans():
+            events.append(
+                {
+                    "name": s.name,
+                    "cat": s.name.split(".", 1)[0],
+                    "ph": "X",
+                    "ts": s.start_ns / 1000.0,
+                    "dur": ((s.end_ns or s.start_ns) - s.start_ns) / 1000.0,
+                    "pid": pid,
+                    "tid": s.thread_id,
+                    "args": {
+                        **s.attributes,
+                        "status": s.status,
+                        "span_id": s.span_id,
+                        "parent_id": s.parent_id,
+                    },
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def to_otlp_json(self) -> Dict[str, Any]:
+        """
+        Return spans as an OTLP/JSON ExportTraceServiceRequest.
+        """
+        otlp_spans: List[Dict[str, Any]] = []
+        for s in self.spans():
+            span_json: Dict[str, Any] = {
+                "traceId": s.trace_id,
+                "spanId": s.span_id,
+                "name": s.name,
+                "kind": 1,
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                "attributes": [_otlp_attribute(k, v) for k, v in s.attributes.items()],
+                "status": {"code": 2 if s.status == "error" else 1},
+            }
+            if s.parent_id is not None:
+                span_json["parentSpanId"] = s.parent_id
+            otlp_spans.append(span_json)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [_otlp_attribute("service.name", self.service_name)]
+                    },
+                    "scopeSpans": [{"scope": {"name": "orchestrator"}, "spans": otlp_spans}],
+                }
+            ]
+        }
+
+    def export_chrome_trace(self, path: str) -> None:
+        _write_json(path, self.to_chrome_trace())
+
+    def export_otlp_json(self, path: str) -> None:
+        _write_json(path, self.to_otlp_json())
+
+    def _finish(self, finished: Span) -> None:
+        with self._lock:
+            self._spans.append(finished)
+            if len(self._spans) > self.max_spans:
+                excess = len(self._spans) - self.max_spans
+                del self._spans[:excess]
+                self.dropped += excess
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed: Dict[str, Any] = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, default=str)
+
+
+_default_tracer = Tracer(enabled=False)
+
+
+def get_default_tracer() -> Tracer:
+    """
+    Return the process-wide tracer. It is disabled until enabled explicitly.
+    """
+    return _default_tracer
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def span(name: str, **attributes: Any) -> Any:
+    """
+    Open a span on the tracer of the current span, or on the default tracer.
+
+    Lets code without a tracer handle (LLM client, retry helpers) add child
+    spans to whatever trace it is running under.
+    """
+    parent = _current_span.get()
+    tracer = parent.tracer if parent is not None and parent.tracer is not None else _default_tracer
+    return tracer.span(name, **attributes)
+
+
+def wrap(func: Callable[..., T]) -> Callable[..., T]:
+    """
+    Bind ``func`` to the caller's context so spans opened in it, e.g. on a
+    thread pool via run_in_executor, are parented to the caller's span.
+    """
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def _run(*args: Any, **kwargs: Any) -> T:
+        # Copy per call: one Context cannot be entered by two threads at once
+        return ctx.copy().run(func, *args, **kwargs)
+
+    return _run
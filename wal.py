@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import json
+import os
+from threading import Event, Lock, Thread
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class WriteAheadLog:
+    """
+    Append-only JSONL log of state mutations with batched fsync and compaction.
+
+    Every record is written and flushed to the OS before the mutation it
+    describes is applied, so a crashed process loses nothing. fsync calls are
+    batched (group commit): the log is synced once ``sync_every`` records are
+    pending, or by a background flusher at most ``sync_interval_s`` after the
+    first unsynced write. Compaction writes a snapshot file and truncates the
+    log so recovery time stays bounded.
+
+    Attributes:
+        directory: Directory holding the log and snapshot files.
+        sync_every: Number of pending records that forces an fsync.
+        sync_interval_s: Maximum delay before pending records are fsynced.
+        compact_every: Number of log records after which the owner should compact.
+    """
+
+    LOG_FILE = "state.wal.jsonl"
+    SNAPSHOT_FILE = "state.snapshot.json"
+
+    def __init__(
+        self,
+        directory: str,
+        sync_every: int = 32,
+        sync_interval_s: float = 0.05,
+        compact_every: Optional[int] = 10_000,
+    ) -> None:
+        self.directory = directory
+        self.sync_every = sync_every
+        self.sync_interval_s = sync_interval_s
+        self.compact_every = compact_every
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, self.LOG_FILE)
+        self.snapshot_path = os.path.join(directory, self.SNAPSHOT_FILE)
+        self.records_since_compaction = 0
+        self._pending = 0
+        self._lock = Lock()
+        self._file = open(self.log_path, "a", encoding="utf-8")
+        self._stop = Event()
+        self._flusher = Thread(target=self._flush_loop, name="wal-flusher", daemon=True)
+        self._flusher.start()
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """
+        Append a record to the log.
+
+        Raises TypeError if the record is not JSON-serializable; nothing is
+        written in that case.
+        """
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._pending += 1
+            self.records_since_compaction += 1
+            if self._pending >= self.sync_every:
+                self._sync_locked()
+
+    def sync(self) -> None:
+        """
+        Force pending records to stable storage.
+        """
+        with self._lock:
+            self._sync_locked()
+
+    def recover(self) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Return the latest snapshot (or None) and the log records written after it.
+
+        A torn final line left by a crash mid-write is ignored.
+        """
+        snapshot: Optional[Dict[str, Any]] = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        records: List[Dict[str, Any]] = []
+        with self._lock:
+            self._file.flush()
+            valid_bytes = 0
+            with open(self.log_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break
+                    valid_bytes += len(line)
+            # Cut off a torn tail so later appends start on a clean line
+            if valid_bytes < os.path.getsize(self.log_path):
+                self._file.truncate(valid_bytes)
+            self.records_since_compaction = len(records)
+        return snapshot, records
+
+    def compact(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Atomically replace the snapshot file and truncate the log.
+
+        The caller must ensure no records are appended concurrently, and that
+        the snapshot reflects every record currently in the log.
+        """
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        with self._lock:
+            self._file.close()
+            self._file = open(self.log_path, "w", encoding="utf-8")
+            os.fsync(self._file.fileno())
+            self._pending = 0
+            self.records_since_compaction = 0
+        self._sync_directory()
+
+    def needs_compaction(self) -> bool:
+        return (
+            self.compact_every is not None
+            and self.records_since_compaction >= self.compact_every
+        )
+
+    def close(self) -> None:
+        """
+        Stop the background flusher, sync and close the log file.
+        """
+        self._stop.set()
+        self._flusher.join()
+        with self._lock:
+            if not self._file.closed:
+                self._sync_locked()
+                self._file.close()
+
+    def _sync_locked(self) -> None:
+        if self._pending:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def _sync_directory(self) -> None:
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.sync_interval_s):
+            with self._lock:
+                if self._pending and not self._file.closed:
+                    self._sync_locked()
@@ -296,6 +296,7 @@ class ContentBlogWorkflow:
                 output_key="blog_final_article",
                 task_type="writing",
                 max_tokens=4096,
+                max_total_tokens=12288,
                 temperature=0.7,
                 importance="high",
                 tags=["final"],
@@ -542,6 +542,7 @@ class PRDGeneratorWorkflow:
                 output_key="full_document",
                 task_type="writing",
                 max_tokens=1024,
+                max_total_tokens=8192,
                 temperature=0.5,
                 importance="high",
                 tags=["prd", "final"],
@@ -1,41 +1,81 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Dict, List
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 import asyncio
 import json
+import time
 
 from ..config import OrchestratorConfig
 from ..llm_client import LLMClient
+from ..resilience import CircuitOpenError, backoff_delay, is_retryable_error
 from ..observability import AgentObservability
 from ..cost import CostRouter
 from ..state import CentralizedStateManager
+from ..wal import WriteAheadLog
 from ..agents import WorkerAgent, ManagerAgent
+from ..tracing import wrap
+
+
+_STAGES = ("decompose", "research", "analyze", "report")
 
 
 @dataclass
 class SaaSResearchResult:
     """
     Result of a SaaS research workflow run.
+
+    ``failed_sub_queries`` maps sub-queries that could not be researched to
+    their last error; ``findings`` covers only the successful ones.
     """
     query: str
     sub_queries: List[str]
     findings: Dict[str, str]
     analysis: str
     final_report: str
+    failed_sub_queries: Dict[str, str] = field(default_factory=dict)
 
 
 class SaaSResearchWorkflow:
     """
     Multi-agent workflow specialized for SaaS opportunity research.
+
+    When ``state_dir`` is given, shared state is backed by a write-ahead log
+    in that directory and a rerun of the same query resumes after the last
+    completed stage instead of paying for it again. Without it, every run
+    starts from scratch.
+
+    Research sub-queries fail independently: failed ones are retried up to
+    ``sub_query_retries`` times, with backoff between rounds. These re-runs
+    stand in for the LLM client's own retries, so they only happen when the
+    client makes a single attempt per call; otherwise it has already retried
+    the error and a re-run would multiply its attempts. Like the client's
+    retries, only retryable errors are re-run, never while the model's
+    circuit is open, and each re-run spends the client's retry budget for
+    its model. The analysis proceeds with the findings
+    available as long as at least ``min_research_success_ratio`` of the
+    sub-queries succeeded. Failures are recorded under
+    ``failed_sub_queries`` in state and as failed research_agent calls in
+    the metrics. Below the threshold the run raises, keeping the findings
+    it has so a rerun only researches the missing sub-queries.
     """
 
-    def __init__(self, config: OrchestratorConfig) -> None:
+    def __init__(
+        self,
+        config: OrchestratorConfig,
+        state_dir: Optional[str] = None,
+        min_research_success_ratio: float = 0.5,
+        sub_query_retries: int = 0,
+    ) -> None:
         self.config = config
+        self.min_research_success_ratio = min_research_success_ratio
+        self.sub_query_retries = sub_query_retries
         self.llm = LLMClient(config)
         self.obs = AgentObservability("saas_research")
         self.cost_router = CostRouter(config)
-        self.state_mgr = CentralizedStateManager()
+        self.state_mgr = CentralizedStateManager(
+            wal=WriteAheadLog(state_dir) if state_dir else None
+        )
 
         # Register workers
         research_worker = WorkerAgent(
@@ -80,13 +120,45 @@ class SaaSResearchWorkflow:
         """
         Execute the SaaS research workflow.
         """
+        with self.obs.tracer.span("workflow.saas_research", query=query[:200]):
+            return await self._run(query)
+
+    async def _run(self, query: str) -> SaaSResearchResult:
         self.obs.log_workflow_step(
             step_name="start", step_type="workflow_start", metadata={"query": query}
         )
-        sub_queries = await self._decompose_query(query)
-        findings = await self._parallel_research(sub_queries)
-        analysis = await self._analyze_findings(query, findings)
-        report = await self._generate_report(query, findings, analysis)
+        saved = self.state_mgr.read_state(
+            ["query", "sub_queries", "findings", "analysis", "final_report"]
+        )
+        # Only a write-ahead log makes saved stages worth resuming from
+        if self.state_mgr.wal is not None and saved["query"] == query:
+            self.obs.log_workflow_step(
+                step_name="start",
+                step_type="workflow_resume",
+                metadata={"version": self.state_mgr.snapshot().version},
+            )
+        else:
+            saved = {"sub_queries": None, "findings": None, "analysis": None, "final_report": None}
+            self.state_mgr.update_state(
+                agent_id="manager",
+                updates={"query": query, "partial_findings": None, "failed_sub_queries": None, **saved},
+                update_type="workflow_start",
+            )
+        sub_queries = await self._run_stage(
+            "decompose", saved["sub_queries"], lambda: self._decompose_query(query)
+        )
+        findings = await self._run_stage(
+            "research", saved["findings"], lambda: self._parallel_research(sub_queries)
+        )
+        analysis = await self._run_stage(
+            "analyze", saved["analysis"], lambda: self._analyze_findings(query, findings)
+        )
+        report = await self._run_stage(
+            "report",
+            saved["final_report"],
+            lambda: self._generate_report(query, findings, analysis),
+        )
+        failed = self.state_mgr.read_state(["failed_sub_queries"])["failed_sub_queries"] or {}
         self.obs.log_workflow_step(
             step_name="complete",
             step_type="workflow_end",
@@ -98,7 +170,21 @@ class SaaSResearchWorkflow:
             findings=findings,
             analysis=analysis,
             final_report=report,
+            failed_sub_queries=failed,
+        )
+
+    async def _run_stage(
+        self, name: str, saved: Any, produce: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        # Stages restored from state still report progress, finishing at once
+        index = _STAGES.index(name)
+        self.obs.step_started(name, index, len(_STAGES))
+        start = time.perf_counter()
+        result = saved or await produce()
+        self.obs.step_finished(
+            name, index, len(_STAGES), (time.perf_counter() - start) * 1000.0
         )
+        return result
 
     async def _decompose_query(self, query: str) -> List[str]:
         prompt = f"""
@@ -135,6 +221,9 @@ Return ONLY a JSON array of strings, e.g.:
         return sub_queries
 
     async def _parallel_research(self, sub_queries: List[str]) -> Dict[str, str]:
+        # Model each sub-query last ran on, to charge its retry budget
+        models: Dict[str, str] = {}
+
         async def run_one(idx: int, q: str) -> str:
             prompt = f"""
 You are a SaaS market research agent.
@@ -154,20 +243,99 @@ Focus on:
 Respond with a structured summary using headings and bullet points.
 """
             loop = asyncio.get_running_loop()
-            resp = await loop.run_in_executor(
-                None,
-                lambda: self.manager._call_llm(
-                    prompt, task_type="analysis", max_tokens=2048
-                ),
-            )
+            start = time.perf_counter()
+            try:
+                model_cfg = self.cost_router.select_model(
+                    prompt, "analysis", route=self.manager.agent_id, max_output_tokens=2048
+                )
+                models[q] = model_cfg.name
+                with self.obs.tracer.span("research.sub_query", index=idx, question=q[:200]):
+                    resp = await loop.run_in_executor(
+                        None,
+                        wrap(
+                            lambda: self.manager._call_llm(
+                                prompt, task_type="analysis", max_tokens=2048, model_cfg=model_cfg
+                            )
+                        ),
+                    )
+            except Exception as e:  # noqa: BLE001
+                self.obs.log_agent_call(
+                    agent_id="research_agent",
+                    task=q,
+                    input_tokens=0,
+                    output_tokens=0,
+                    latency_ms=(time.perf_counter() - start) * 1000.0,
+                    success=False,
+                    cost_usd=0.0,
+                    error=f"{type(e).__name__}: {e}",
+                    step="research",
+                )
+                raise
             return resp.text
 
-        tasks = [run_one(i, q) for i, q in enumerate(sub_queries)]
-        results_list = await asyncio.gather(*tasks)
-        findings = {q: r for q, r in zip(sub_queries, results_list)}
+        # Findings paid for by an earlier, incomplete run of the same query
+        partial = self.state_mgr.read_state(["partial_findings"])["partial_findings"]
+        findings: Dict[str, str] = dict(partial or {})
+        pending = [(i, q) for i, q in enumerate(sub_queries) if q not in findings]
+        failed: Dict[str, str] = {}
+        for round_ in range(self.sub_query_retries + 1):
+            if round_:
+                # Like LLMClient retries, every re-run spends its model's retry budget
+                pending = [
+                    (i, q) for i, q in pending if self.llm.retry_budget.try_acquire(models[q])
+                ]
+            if not pending:
+                break
+            if round_:
+                self.obs.log_workflow_step(
+                    step_name="research",
+                    step_type="sub_query_retry",
+                    metadata={"round": round_, "sub_queries": [q for _, q in pending]},
+                )
+                await asyncio.sleep(backoff_delay(self.llm.retry_config, round_ - 1))
+            results = await asyncio.gather(
+                *(run_one(i, q) for i, q in pending), return_exceptions=True
+            )
+            still_pending = []
+            for (i, q), result in zip(pending, results):
+                if isinstance(result, BaseException):
+                    if not isinstance(result, Exception):
+                        raise result
+                    failed[q] = f"{type(result).__name__}: {result}"
+                    retryable = not isinstance(result, CircuitOpenError) and is_retryable_error(
+                        result, self.llm.retry_config
+                    )
+                    # A client that retries has already exhausted its attempts on this error
+                    client_retried = self.llm.retry_config.max_attempts > 1
+                    if retryable and not client_retried and q in models:
+                        still_pending.append((i, q))
+                else:
+                    findings[q] = result
+                    failed.pop(q, None)
+            pending = still_pending
+
+        # Keep the caller's sub-query order
+        findings = {q: findings[q] for q in sub_queries if q in findings}
+        success_ratio = len(findings) / len(sub_queries) if sub_queries else 1.0
+        if failed:
+            self.obs.log_workflow_step(
+                step_name="research",
+                step_type="sub_query_failures",
+                metadata={"failed": failed, "success_ratio": round(success_ratio, 3)},
+            )
+        if success_ratio < self.min_research_success_ratio:
+            self.state_mgr.update_state(
+                agent_id="research_agent",
+                updates={"partial_findings": findings, "failed_sub_queries": failed},
+                update_type="research_incomplete",
+            )
+            raise RuntimeError(
+                f"Only {len(findings)} of {len(sub_queries)} research sub-queries succeeded "
+                f"(minimum ratio {self.min_research_success_ratio:.0%}); failed: {sorted(failed)}"
+            )
         self.state_mgr.update_state(
             agent_id="research_agent",
-            updates={"findings": findings},
+            updates={"findings": findings, "failed_sub_queries": failed, "partial_findings": None},
             update_type="research",
         )
         return findings
@@ -203,8 +371,10 @@ Write a structured analysis with:
         loop = asyncio.get_running_loop()
         resp = await loop.run_in_executor(
             None,
-            lambda: self.manager._call_llm(
-                prompt, task_type="analysis", max_tokens=3072
+            wrap(
+                lambda: self.manager._call_llm(
+                    prompt, task_type="analysis", max_tokens=3072
+                )
             ),
         )
         analysis = resp.text
@@ -240,8 +410,10 @@ Conclusion
         loop = asyncio.get_running_loop()
         resp = await loop.run_in_executor(
             None,
-            lambda: self.manager._call_llm(
-                prompt, task_type="writing", max_tokens=4096
+            wrap(
+                lambda: self.manager._call_llm(
+                    prompt, task_type="writing", max_tokens=4096
+                )
             ),
         )
         report = resp.text